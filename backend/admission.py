@@ -0,0 +1,114 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from metrics import Counters
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `burst` tokens"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Seconds until `amount` tokens can be taken (0 if they can be now).
+        A request larger than the burst is let through once the bucket is full
+        and leaves it in debt, so oversized batches are slowed, not refused.
+        """
+        amount = min(amount, self.burst)
+        if amount <= self.tokens:
+            return 0.0
+        return (amount - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+class AdmissionController:
+    """
+    Global and per-session token buckets for ingest, charged one token per event.
+
+    A batch is admitted only if the global bucket and the bucket of every session
+    in it can pay for their events; otherwise nothing is charged and the caller
+    gets the number of seconds to wait. Per-session buckets are kept in an LRU
+    bounded by max_sessions. A rate of 0 disables that limit.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, session_rate: float,
+                 session_burst: float, max_sessions: int = 100000):
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_sessions = max_sessions
+        self._global = TokenBucket(global_rate, global_burst) if global_rate > 0 else None
+        self._sessions: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def admit(self, session_counts: Dict[str, int]) -> Optional[float]:
+        """
+        Charge a batch given as {session_id: event count}.
+        Returns None if admitted, else the seconds to wait before retrying.
+        """
+        total = sum(session_counts.values())
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self._global is not None:
+                self._global.refill(now)
+                wait = self._global.wait_time(total)
+                if wait:
+                    self.counters.incr('rejected_global')
+
+            buckets = []
+            if self.session_rate > 0:
+                for session_id, count in session_counts.items():
+                    bucket = self._session_bucket(session_id, now)
+                    session_wait = bucket.wait_time(count)
+                    if session_wait:
+                        self.counters.incr('rejected_session')
+                        wait = max(wait, session_wait)
+                    buckets.append((bucket, count))
+
+            if wait:
+                self.counters.incr('rejected_batches')
+                self.counters.incr('rejected_events', total)
+                return wait
+
+            if self._global is not None:
+                self._global.tokens -= total
+            for bucket, count in buckets:
+                bucket.tokens -= count
+
+        self.counters.incr('admitted_batches')
+        self.counters.incr('admitted_events', total)
+        return None
+
+    def _session_bucket(self, session_id: str, now: float) -> TokenBucket:
+        bucket = self._sessions.get(session_id)
+        if bucket is None:
+            bucket = self._sessions[session_id] = TokenBucket(self.session_rate, self.session_burst)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        bucket.refill(now)
+        return bucket
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        with self._lock:
+            stats.update({
+                'global_rate': self._global.rate if self._global else 0,
+                'global_burst': self._global.burst if self._global else 0,
+                'global_tokens': self._global.tokens if self._global else None,
+                'session_rate': self.session_rate,
+                'session_burst': self.session_burst,
+                'tracked_sessions': len(self._sessions)
+            })
+        return stats
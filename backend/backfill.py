@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Offline feature backfill: recompute and store features for every session in
+the events table.
+
+Sessions are read in session_id order, chunk_sessions at a time: a keyset page
+of session ids after the last one read, then their events in (session_id, ts)
+order through event_fetch.fetch_event_arrays (a server-side cursor on
+PostgreSQL). The feature kernel runs on the chunks in a pool of spawned
+processes (by default one per core, less the one reading and writing) while
+the next chunk is read, and results are upserted in chunk order with
+feature_extractor.store_features (features and feature store rows). After
+each stored chunk the last session id is written to the checkpoint file, so
+an interrupted run resumes after it.
+
+Features are the exact kernel values. The sessions' quantile sketches are left
+empty; the online extractor fills them on the session's next ingest.
+
+With --feature-store, nothing is recomputed: feature store rows missing or
+older than FEATURE_STORE_VERSION are rebuilt from the stored feature documents
+(DBFeatures.f). Run this once after a deploy that changes FEATURE_NAMES.
+
+Usage: python backfill.py [--workers N] [--chunk-sessions N] [--checkpoint PATH] [--restart]
+       python backfill.py --feature-store
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from config import BACKFILL_CHECKPOINT_PATH, BACKFILL_CHUNK_SESSIONS
+from event_fetch import fetch_event_arrays
+from feature_extractor import store_features
+from feature_kernel import compute_features
+from feature_store import backfill_feature_store
+from models import DBEvent, SessionLocal
+
+def compute_chunk(arrays: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    return {session_id: compute_features(events) for session_id, events in arrays.items()}
+
+def read_checkpoint(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return json.load(f)['after']
+    except FileNotFoundError:
+        return None
+
+def write_checkpoint(path: str, after: str, sessions: int, events: int):
+    # Write a new file and rename it over the old one, so a crash never leaves a partial checkpoint
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'after': after,
+            'sessions': sessions,
+            'events': events,
+            'updated_at': datetime.utcnow().isoformat()
+        }, f)
+    os.replace(tmp_path, path)
+
+def default_workers() -> int:
+    # One core reads and writes; on a single core computing inline is fastest
+    return max(0, (os.cpu_count() or 1) - 1)
+
+def next_session_ids(db, after: Optional[str], limit: int) -> List[str]:
+    query = select(DBEvent.session_id).group_by(DBEvent.session_id).order_by(DBEvent.session_id).limit(limit)
+    if after is not None:
+        query = query.where(DBEvent.session_id > after)
+    return list(db.execute(query).scalars())
+
+class Backfill:
+    def __init__(self, workers: Optional[int] = None, chunk_sessions: int = BACKFILL_CHUNK_SESSIONS,
+                 checkpoint_path: str = BACKFILL_CHECKPOINT_PATH):
+        self.workers = default_workers() if workers is None else workers
+        self.chunk_sessions = chunk_sessions
+        self.checkpoint_path = checkpoint_path
+        self.sessions = 0
+        self.events = 0
+
+    def run(self, restart: bool = False):
+        after = None if restart else read_checkpoint(self.checkpoint_path)
+        if after is not None:
+            print(f"Resuming after session {after}")
+        executor = None
+        if self.workers > 0:
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        # Chunks being computed, in read order; at most two per worker
+        inflight: deque = deque()
+        start = time.perf_counter()
+        db = SessionLocal()
+        try:
+            while True:
+                session_ids = next_session_ids(db, after, self.chunk_sessions)
+                if not session_ids:
+                    break
+                arrays = fetch_event_arrays(db, session_ids)
+                # End the read transaction so SQLite lets the writes through
+                db.commit()
+                after = session_ids[-1]
+                event_count = sum(len(events) for events in arrays.values())
+                if executor is None:
+                    result = Future()
+                    result.set_result(compute_chunk(arrays))
+                else:
+                    result = executor.submit(compute_chunk, arrays)
+                inflight.append((result, after, event_count))
+                while len(inflight) > max(1, 2 * self.workers):
+                    self._store(db, *inflight.popleft(), start)
+            while inflight:
+                self._store(db, *inflight.popleft(), start)
+        finally:
+            db.close()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        elapsed = time.perf_counter() - start
+        print(f"Done: {self.sessions} sessions, {self.events} events in {elapsed:.1f}s "
+              f"({self._rates(elapsed)})")
+
+    def _store(self, db, result: Future, last_session_id: str, event_count: int, start: float):
+        features = {session_id: f for session_id, f in result.result().items() if f}
+        if features:
+            store_features(db, features)
+        self.sessions += len(features)
+        self.events += event_count
+        write_checkpoint(self.checkpoint_path, last_session_id, self.sessions, self.events)
+        print(f"Stored through {last_session_id}: {self.sessions} sessions, {self.events} events "
+              f"({self._rates(time.perf_counter() - start)})")
+
+    def _rates(self, elapsed: float) -> str:
+        elapsed = max(elapsed, 1e-9)
+        return f"{self.sessions / elapsed:.0f} sessions/s, {self.events / elapsed:.0f} events/s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute and store features for all sessions")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="feature kernel processes (default: cores - 1); 0 computes in this process")
+    parser.add_argument("--chunk-sessions", type=int, default=BACKFILL_CHUNK_SESSIONS,
+                        help="sessions read, computed and stored together")
+    parser.add_argument("--checkpoint", default=BACKFILL_CHECKPOINT_PATH,
+                        help="file recording the last stored session")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--feature-store", action="store_true",
+                        help="only rebuild stale feature store rows from the stored feature documents")
+    args = parser.parse_args()
+    if args.feature_store:
+        start = time.perf_counter()
+        written = backfill_feature_store()
+        print(f"Rebuilt {written} feature store rows in {time.perf_counter() - start:.1f}s")
+        return
+    Backfill(args.workers, args.chunk_sessions, args.checkpoint).run(restart=args.restart)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Benchmark scripts for the telemetry backend.
+Run from the backend directory, e.g. `python -m benchmarks.bench_ingest`.
+"""
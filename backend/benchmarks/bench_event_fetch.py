@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Loading a long session for feature extraction: full DBEvent ORM instances
+(the previous approach, including meta) converted to an array, against the
+column-projected streaming fetch. Reports best-of latency and peak Python
+memory (tracemalloc) per session length, and checks both arrays are equal.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, timed
+
+use_benchmark_database()
+
+import math
+import sys
+import tracemalloc
+
+import numpy as np
+
+from event_fetch import fetch_event_array
+from event_writer import bulk_insert_events, event_to_row
+from feature_kernel import events_to_array
+from main import TelemetryEvent
+from models import Base, DBEvent, SessionLocal, engine, migrate_schema
+
+SESSION_SIZES = [1000, 10000, 100000]
+REPEATS = 3
+
+def orm_fetch(db, session_id):
+    events = db.query(DBEvent).filter(DBEvent.session_id == session_id).order_by(DBEvent.ts).all()
+    array = events_to_array(events)
+    db.expunge_all()
+    return array
+
+def projected_fetch(db, session_id):
+    return fetch_event_array(db, session_id)
+
+def seed(session_id: str, count: int):
+    db = SessionLocal()
+    try:
+        events = make_events(count, seed=count)
+        for event in events:
+            event["session_id"] = session_id
+            event["meta"] = {"screen_height": 844, "orientation": "portrait", "app_version": "1.4.2"}
+        for i in range(0, count, 10000):
+            bulk_insert_events(db, [event_to_row(TelemetryEvent(**e)) for e in events[i:i + 10000]])
+        db.commit()
+    finally:
+        db.close()
+
+def measure(fetch, session_id):
+    best = math.inf
+    for _ in range(REPEATS):
+        db = SessionLocal()
+        try:
+            result, elapsed = timed(fetch, db, session_id)
+        finally:
+            db.close()
+        best = min(best, elapsed)
+
+    db = SessionLocal()
+    try:
+        tracemalloc.start()
+        fetch(db, session_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        db.close()
+    return result, best, peak
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    failures = 0
+    print(f"{'events':>8} {'orm ms':>9} {'proj ms':>9} {'orm peak MB':>12} {'proj peak MB':>13}")
+    for size in SESSION_SIZES:
+        session_id = f"fetch_session_{size}"
+        seed(session_id, size)
+        orm_array, orm_time, orm_peak = measure(orm_fetch, session_id)
+        projected_array, projected_time, projected_peak = measure(projected_fetch, session_id)
+
+        same = all(
+            np.array_equal(orm_array[field], projected_array[field], equal_nan=field not in ('ts', 'etype'))
+            for field in orm_array.dtype.names
+        )
+        if not same:
+            failures += 1
+            print(f"mismatch at {size} events")
+        print(f"{size:>8} {orm_time * 1000:>9.1f} {projected_time * 1000:>9.1f} "
+              f"{orm_peak / 2**20:>12.1f} {projected_peak / 2**20:>13.1f}")
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Repeated feature reads for sessions that rarely change, as /v1/state and
+/v1/score polling does: POLLS reads per session between ingest batches, with
+and without the feature cache. Batches go through main.write_event_rows, so
+the cache is invalidated the way it is in the service; after every batch the
+cached results must equal freshly computed ones.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import gc
+import sys
+import time
+from datetime import datetime
+
+from event_writer import event_to_row
+from feature_cache import feature_cache
+from feature_extractor import FeatureExtractor
+from main import TelemetryEvent, write_event_rows
+from ml_model import score_features
+from models import Base, SessionLocal, engine, migrate_schema
+
+SESSIONS = 50
+ROUNDS = 5
+POLLS = 20
+EVENTS_PER_BATCH = 20
+WINDOW_MINUTES = 2
+
+def session_batches():
+    start_ms = int(datetime.now().timestamp() * 1000) - 60_000
+    batches = [[] for _ in range(ROUNDS)]
+    for i in range(SESSIONS):
+        events = make_events(ROUNDS * EVENTS_PER_BATCH, seed=i, start_ms=start_ms)
+        for e in events:
+            e["session_id"] = f"cache_{i}"
+        for r in range(ROUNDS):
+            chunk = events[r * EVENTS_PER_BATCH:(r + 1) * EVENTS_PER_BATCH]
+            batches[r].append([event_to_row(TelemetryEvent(**e)) for e in chunk])
+    return batches
+
+def poll(extractor: FeatureExtractor, session_ids):
+    # One /v1/state and one /v1/score style read per session
+    for session_id in session_ids:
+        extractor.extract_realtime_features(session_id, WINDOW_MINUTES)
+        features = extractor.extract_session_features(session_id)
+        score_features(features, session_id)
+
+def timed_polls(extractor, session_ids) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(POLLS):
+        poll(extractor, session_ids)
+    return time.perf_counter() - start
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    batches = session_batches()
+    session_ids = [rows[0]["session_id"] for rows in batches[0]]
+    cached, uncached = FeatureExtractor(), FeatureExtractor(use_cache=False)
+    failures = 0
+    totals = [0.0, 0.0]
+    reads = ROUNDS * POLLS * SESSIONS * 2
+    print(f"{SESSIONS} sessions, {POLLS} polls between each of {ROUNDS} ingest batches")
+    for round_batches in batches:
+        db = SessionLocal()
+        try:
+            for rows in round_batches:
+                write_event_rows(db, rows)
+        finally:
+            db.close()
+
+        totals[0] += timed_polls(uncached, session_ids)
+        totals[1] += timed_polls(cached, session_ids)
+        for session_id in session_ids:
+            fresh = (uncached.extract_realtime_features(session_id, WINDOW_MINUTES),
+                     uncached.extract_session_features(session_id))
+            seen = (cached.extract_realtime_features(session_id, WINDOW_MINUTES),
+                    cached.extract_session_features(session_id))
+            if fresh != seen:
+                failures += 1
+                print(f"stale features for {session_id}")
+
+    print(f"uncached: {totals[0] / reads * 1e6:>8.1f} us per read")
+    print(f"  cached: {totals[1] / reads * 1e6:>8.1f} us per read")
+    print(f"feature cache: {feature_cache.stats()}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+NumPy feature kernel against the pandas reference extractor, on in-memory
+sessions of 10 to 100k events. Checks that both produce the same keys and
+values, then reports the best-of time for the pandas path (DataFrame build +
+extraction), the kernel including array build, and the kernel alone.
+Exits non-zero on any mismatch.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, timed
+
+use_benchmark_database()
+
+import math
+import random
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+from feature_extractor import FeatureExtractor, convert_numpy_types
+from feature_kernel import compute_features, events_to_array
+
+SESSION_SIZES = [10, 100, 1000, 10000, 100000]
+REPEATS = 3
+RTOL = 1e-9
+
+def session_events(count: int, seed: int):
+    """DBEvent-like objects in ts order, with ~10% of measurements missing"""
+    rng = random.Random(seed)
+    events = []
+    for event in make_events(count, seed=seed):
+        event = {column: event.get(column) for column in (
+            'ts', 'etype', 'duration_ms', 'delta', 'velocity', 'accel', 'input_len',
+            'backspaces', 'screen', 'component_id'
+        )}
+        for column in ('velocity', 'delta', 'input_len', 'duration_ms'):
+            if event[column] is not None and rng.random() < 0.1:
+                event[column] = None
+        event['ts'] = datetime.fromtimestamp(event['ts'] / 1000)
+        events.append(SimpleNamespace(**event))
+    return events
+
+def same(a, b) -> bool:
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return math.isclose(a, b, rel_tol=RTOL, abs_tol=1e-12)
+
+def mismatches(reference, kernel):
+    problems = []
+    if reference.keys() != kernel.keys():
+        problems.append(f"keys differ: {sorted(reference.keys() ^ kernel.keys())}")
+    for key in sorted(reference.keys() & kernel.keys()):
+        if not same(reference[key], kernel[key]):
+            problems.append(f"{key}: pandas={reference[key]!r} kernel={kernel[key]!r}")
+    return problems
+
+def best_of(fn, *args):
+    best = math.inf
+    for _ in range(REPEATS):
+        result, elapsed = timed(fn, *args)
+        best = min(best, elapsed)
+    return result, best
+
+def main():
+    reference = FeatureExtractor(use_kernel=False)
+    failures = 0
+    print(f"{'events':>8} {'pandas ms':>10} {'kernel+build ms':>16} {'kernel ms':>10} {'speedup':>8}")
+    for size in SESSION_SIZES:
+        events = session_events(size, seed=size)
+        expected, pandas_time = best_of(reference._features_from_events, events)
+        _, build_time = best_of(lambda: compute_features(events_to_array(events)))
+        array = events_to_array(events)
+        actual, kernel_time = best_of(compute_features, array)
+
+        problems = mismatches(convert_numpy_types(expected), actual)
+        if problems:
+            failures += 1
+            print(f"mismatch at {size} events:")
+            for problem in problems:
+                print(f"  {problem}")
+        print(f"{size:>8} {pandas_time * 1000:>10.2f} {build_time * 1000:>16.2f} "
+              f"{kernel_time * 1000:>10.2f} {pandas_time / kernel_time:>7.0f}x")
+
+    if failures:
+        print(f"FAILED: {failures} session sizes differ from the pandas reference")
+        sys.exit(1)
+    print("parity OK")
+
+if __name__ == "__main__":
+    main()
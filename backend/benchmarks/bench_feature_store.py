@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Feature reads from the JSON document (DBFeatures.f) versus the typed feature
+store (feature_store.py). Features rows are written the old way, then
+backfill_feature_store fills the store; every migrated vector must equal the
+model input built from the JSON document. Compares reading all vectors, a
+subset of sessions, and filtering on one feature.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, timed
+
+use_benchmark_database()
+
+import random
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from event_writer import event_to_row
+from feature_kernel import FEATURE_NAMES, compute_features, rows_to_array
+from feature_store import backfill_feature_store, load_feature_vectors
+from main import TelemetryEvent
+from ml_model import InterestScoreModel
+from models import Base, DBFeatures, DBFeatureVector, SessionLocal, engine
+
+SESSIONS = 20000
+TEMPLATES = 20
+SUBSET = 200
+REPEATS = 3
+
+def feature_documents():
+    """Realistic feature dicts: a few computed ones, jittered per session"""
+    templates = []
+    for i in range(TEMPLATES):
+        events = make_events(500, seed=i)
+        templates.append(compute_features(rows_to_array([event_to_row(TelemetryEvent(**e)) for e in events])))
+    rng = random.Random(1)
+    documents = {}
+    for i in range(SESSIONS):
+        template = templates[i % TEMPLATES]
+        documents[f"store_{i}"] = {
+            name: value * rng.uniform(0.5, 1.5) if isinstance(value, float) else value
+            for name, value in template.items()
+        }
+    return documents
+
+def json_vectors(db, session_ids=None):
+    """The JSON path: decode every document and build model inputs"""
+    query = db.query(DBFeatures.session_id, DBFeatures.f)
+    if session_ids is not None:
+        query = query.filter(DBFeatures.session_id.in_(session_ids))
+    model = InterestScoreModel()
+    rows = query.all()
+    return [row[0] for row in rows], np.vstack([model.prepare_features(row[1]) for row in rows])
+
+def best(fn, *args):
+    results = [timed(fn, *args) for _ in range(REPEATS)]
+    return results[0][0], min(elapsed for _, elapsed in results)
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    documents = feature_documents()
+    computed_at = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(DBFeatures.__table__.insert(), [
+            {'session_id': session_id, 'computed_at': computed_at, 'f': f}
+            for session_id, f in documents.items()
+        ])
+    _, migrate_seconds = timed(backfill_feature_store)
+    print(f"{SESSIONS} sessions, {len(FEATURE_NAMES)} model features; backfill took {migrate_seconds:.2f}s")
+
+    db = SessionLocal()
+    failures = 0
+    try:
+        (json_ids, json_matrix), json_seconds = best(json_vectors, db)
+        (store_ids, store_matrix), store_seconds = best(load_feature_vectors, db)
+        order = {session_id: i for i, session_id in enumerate(store_ids)}
+        aligned = store_matrix[[order[session_id] for session_id in json_ids]]
+        if len(store_ids) != SESSIONS or not np.array_equal(np.nan_to_num(aligned, nan=0.0), json_matrix):
+            failures += 1
+            print("migrated vectors differ from the JSON documents")
+
+        subset = random.Random(2).sample(list(documents), SUBSET)
+        _, json_subset = best(json_vectors, db, subset)
+        _, store_subset = best(load_feature_vectors, db, subset)
+
+        threshold = float(np.median(json_matrix[:, FEATURE_NAMES.index('tap_count')]))
+        def json_filter():
+            ids, matrix = json_vectors(db)
+            return [ids[i] for i in np.flatnonzero(matrix[:, FEATURE_NAMES.index('tap_count')] > threshold)]
+        json_matches, json_filter_seconds = best(json_filter)
+        (store_matches, _), store_filter_seconds = best(
+            load_feature_vectors, db, None, DBFeatureVector.tap_count > threshold
+        )
+        if sorted(json_matches) != sorted(store_matches):
+            failures += 1
+            print("filtered sessions differ")
+    finally:
+        db.close()
+
+    print(f"{'read':>22} {'json ms':>9} {'store ms':>9}")
+    print(f"{'all vectors':>22} {json_seconds * 1000:>9.1f} {store_seconds * 1000:>9.1f}")
+    print(f"{f'{SUBSET} sessions':>22} {json_subset * 1000:>9.1f} {store_subset * 1000:>9.1f}")
+    print(f"{'tap_count > median':>22} {json_filter_seconds * 1000:>9.1f} {store_filter_seconds * 1000:>9.1f}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of predict_many with tree-variance confidence computed from
+one forest.apply() pass and a flat leaf-value table, versus the previous code:
+forest.predict plus tree.predict for each estimator in a Python loop.
+Confidences must be identical and scores equal to forest.predict up to
+floating-point rounding.
+"""
+
+from benchmarks.common import use_benchmark_database
+
+use_benchmark_database()
+
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_predict_many import feature_dicts, trained_model
+
+BATCH_SIZES = (1, 64, 4096)
+MIN_SECONDS = 1.0
+
+def reference_predict(model, X: np.ndarray):
+    """predict_many as it was: forest.predict, then one predict per tree for the variance"""
+    X_scaled = model.scaler.transform(X)
+    scores = np.clip(model.model.predict(X_scaled), 0, 100)
+    tree_predictions = np.array([tree.predict(X_scaled) for tree in model.model.estimators_])
+    variance = np.var(tree_predictions, axis=0)
+    confidences = np.maximum(1.0 - np.minimum(variance / 400, 1.0), 0.3)
+    return scores, confidences
+
+def latency(fn) -> float:
+    """Mean seconds per call, repeating fn for at least MIN_SECONDS"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return elapsed / calls
+
+def main():
+    model = trained_model(predictor="sklearn")
+    batch = model.prepare_features_many(feature_dicts(max(BATCH_SIZES), seed=3))
+    failures = 0
+    print(f"{len(model.model.estimators_)} trees")
+    print(f"{'batch':>6} {'per-tree loop ms':>17} {'apply() ms':>11} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        X = batch[:size]
+        reference_scores, reference_confidences = reference_predict(model, X)
+        scores, confidences = model.predict_many(X)
+        if not np.array_equal(confidences, reference_confidences):
+            failures += 1
+            print(f"batch {size}: confidences differ")
+        if not np.allclose(scores, reference_scores, rtol=1e-12, atol=1e-9):
+            failures += 1
+            print(f"batch {size}: scores differ")
+
+        before = latency(lambda: reference_predict(model, X))
+        after = latency(lambda: model.predict_many(X))
+        print(f"{size:>6} {before * 1000:>17.2f} {after * 1000:>11.2f} {before / after:>7.1f}x")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
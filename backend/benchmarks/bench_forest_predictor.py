@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Single-row scoring latency (p50/p99 of predict_score, as on the realtime
+path) with the forest exported to flat NumPy arrays (forest_predictor.py)
+versus sklearn, plus batch throughput. Scores and confidences must be
+identical.
+"""
+
+from benchmarks.common import use_benchmark_database, percentile
+
+use_benchmark_database()
+
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_predict_many import feature_dicts, trained_model
+
+SINGLE_CALLS = 2000
+BATCH = 4096
+
+def latencies(model, rows):
+    samples = []
+    for features in rows:
+        start = time.perf_counter()
+        model.predict_score(features)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    models = {"sklearn": trained_model(predictor="sklearn"), "flat": trained_model(predictor="flat")}
+    rows = feature_dicts(BATCH, seed=3)
+    failures = 0
+    if models["flat"]._flat_forest is None:
+        print("forest was not exported")
+        sys.exit(1)
+
+    reference = models["sklearn"].predict_many(rows)
+    flat = models["flat"].predict_many(rows)
+    if not (np.array_equal(reference[0], flat[0]) and np.array_equal(reference[1], flat[1])):
+        failures += 1
+        print("flat forest scores differ from sklearn")
+
+    print(f"{'predictor':>10} {'p50 us':>9} {'p99 us':>9} {f'batch {BATCH} ms':>14}")
+    for name, model in models.items():
+        samples = latencies(model, rows[:SINGLE_CALLS])
+        start = time.perf_counter()
+        model.predict_many(rows)
+        batch_seconds = time.perf_counter() - start
+        print(f"{name:>10} {percentile(samples, 50) * 1e6:>9.0f} {percentile(samples, 99) * 1e6:>9.0f} "
+              f"{batch_seconds * 1000:>14.1f}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the ORM-per-event ingest path with the bulk write path.
+Reports events/sec for 100, 1k and 10k event batches.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, timed
+
+use_benchmark_database()
+
+from datetime import datetime
+
+from sqlalchemy import text
+
+from event_writer import event_to_row, bulk_insert_events
+from main import EventBatch
+from models import DBEvent, SessionLocal
+
+BATCH_SIZES = [100, 1000, 10000]
+REPEATS = 3
+
+def orm_path(batch: EventBatch):
+    """The original ingest loop: one ORM object and db.add per event"""
+    db = SessionLocal()
+    try:
+        for event in batch.events:
+            db.add(DBEvent(
+                ts=datetime.fromtimestamp(event.ts / 1000),
+                session_id=event.session_id,
+                user_hash=event.user_hash,
+                screen=event.screen,
+                component_id=event.component_id,
+                etype=event.etype,
+                duration_ms=event.duration_ms,
+                delta=event.delta,
+                velocity=event.velocity,
+                accel=event.accel,
+                key_code=event.key_code,
+                input_len=event.input_len,
+                backspaces=event.backspaces,
+                meta=event.meta
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+def bulk_path(batch: EventBatch):
+    db = SessionLocal()
+    try:
+        bulk_insert_events(db, [event_to_row(event) for event in batch.events])
+        db.commit()
+    finally:
+        db.close()
+
+def clear_events():
+    db = SessionLocal()
+    try:
+        db.execute(text("DELETE FROM events"))
+        db.commit()
+    finally:
+        db.close()
+
+def main():
+    print(f"{'batch':>8} {'orm ev/s':>12} {'bulk ev/s':>12} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        batch = EventBatch(events=make_events(size, sessions=max(1, size // 100)))
+        results = {}
+        for name, fn in (("orm", orm_path), ("bulk", bulk_path)):
+            best = float("inf")
+            for _ in range(REPEATS):
+                clear_events()
+                _, elapsed = timed(fn, batch)
+                best = min(best, elapsed)
+            results[name] = size / best
+        print(f"{size:>8} {results['orm']:>12.0f} {results['bulk']:>12.0f} "
+              f"{results['bulk'] / results['orm']:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Request latency (p50/p99) under different logging setups:
+a synchronous file handler at DEBUG (every record written on the request
+thread), the queued/rate-limited setup at DEBUG, and the queued setup at INFO.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, percentile
+
+use_benchmark_database()
+
+import logging
+import os
+import tempfile
+import time
+
+from fastapi.testclient import TestClient
+
+import logging_setup
+from main import app
+
+REQUESTS = 300
+USERS = 50
+
+def sync_debug(path: str):
+    logging_setup.shutdown_logging()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+def queued(level: str):
+    def configure(path: str):
+        logging_setup.configure_logging(level, handler=logging.FileHandler(path))
+    return configure
+
+SETUPS = [
+    ("sync handler, DEBUG", sync_debug),
+    ("queued, DEBUG", queued("DEBUG")),
+    ("queued, INFO", queued("INFO")),
+]
+
+def seed_users(client: TestClient):
+    for i in range(USERS):
+        client.post("/api/v1/auth/signup", json={
+            "email": f"bench{i}@example.com", "password": "benchmark", "name": f"Bench {i}"
+        })
+
+def measure(client: TestClient):
+    latencies = {"discover": [], "ingest": []}
+    events = make_events(REQUESTS * 10, sessions=10)
+    for i in range(REQUESTS):
+        start = time.perf_counter()
+        client.get(f"/api/v1/discover/bench_user_{i % USERS}")
+        latencies["discover"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        client.post("/v1/ingest/events", json={"events": events[i * 10:(i + 1) * 10]})
+        latencies["ingest"].append(time.perf_counter() - start)
+    return latencies
+
+def main():
+    log_dir = tempfile.mkdtemp(prefix="thrizll_bench_logs_")
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # the test client logs every request
+    print(f"{REQUESTS} requests per endpoint")
+    print(f"{'setup':<22} {'endpoint':<10} {'p50 ms':>8} {'p99 ms':>8}")
+    with TestClient(app) as client:
+        seed_users(client)
+        for name, configure in SETUPS:
+            configure(os.path.join(log_dir, name.replace(", ", "_").replace(" ", "_") + ".log"))
+            for endpoint, values in measure(client).items():
+                print(f"{name:<22} {endpoint:<10} "
+                      f"{percentile(values, 50) * 1000:>8.2f} {percentile(values, 99) * 1000:>8.2f}")
+    logging_setup.shutdown_logging()
+    print(f"logging counters: {logging_setup.stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag while async handlers compute features and scores for long
+sessions. "inline" is the previous handler code: extraction and predict_score
+called directly in the coroutine. "pool" is the current code: events loaded in
+a thread, the kernel and scoring run in a ComputePool. Lag is sampled by
+LoopLagMonitor, as exported under "event_loop" in /v1/metrics; it delays
+every other request and WebSocket on the worker by the same amount.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import asyncio
+import time
+
+from compute_pool import ComputePool
+from event_writer import bulk_insert_events, event_to_row
+from feature_extractor import FeatureExtractor
+from loop_monitor import LoopLagMonitor
+from main import TelemetryEvent
+from ml_model import score_features
+from models import Base, SessionLocal, engine, migrate_schema
+
+SESSIONS = 8
+EVENTS_PER_SESSION = 20000
+REQUESTS = 48
+CONCURRENCY = 4
+POOL_WORKERS = 2
+
+def seed():
+    session_ids = []
+    db = SessionLocal()
+    try:
+        for i in range(SESSIONS):
+            session_id = f"lag_session_{i}"
+            events = make_events(EVENTS_PER_SESSION, seed=i)
+            for e in events:
+                e["session_id"] = session_id
+            bulk_insert_events(db, [event_to_row(TelemetryEvent(**e)) for e in events])
+            session_ids.append(session_id)
+        db.commit()
+    finally:
+        db.close()
+    return session_ids
+
+async def inline_request(extractor: FeatureExtractor, pool: ComputePool, session_id: str):
+    features = extractor.extract_session_features(session_id)
+    return score_features(features)
+
+async def pool_request(extractor: FeatureExtractor, pool: ComputePool, session_id: str):
+    features = (await extractor.extract_features_many_async([session_id], pool=pool))[session_id]
+    scores, _ = await pool.scores_async({session_id: features})
+    return scores[session_id]
+
+async def run(handler, session_ids, pool):
+    # The cache would turn repeated requests into hits; every request computes here
+    extractor = FeatureExtractor(use_cache=False)
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            await handler(extractor, pool, session_ids[i % len(session_ids)])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    elapsed = time.perf_counter() - start
+    # Inline handlers never yield; let the monitor record the stall they caused
+    await asyncio.sleep(monitor.interval * 2)
+    monitor.stop()
+    return elapsed, monitor.stats()
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    session_ids = seed()
+    pool = ComputePool(workers=POOL_WORKERS)
+    pool.start()
+    try:
+        # Warm up the workers (model load) and statement caches
+        asyncio.run(run(pool_request, session_ids[:1], pool))
+        print(f"{REQUESTS} requests, {CONCURRENCY} concurrent, {EVENTS_PER_SESSION} events per session")
+        print(f"{'mode':>7} {'total s':>8} {'samples':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+        for name, handler in (("inline", inline_request), ("pool", pool_request)):
+            elapsed, lag = asyncio.run(run(handler, session_ids, pool))
+            print(f"{name:>7} {elapsed:>8.2f} {lag['samples']:>8} {lag['lag_ms_p50']:>11.1f} "
+                  f"{lag['lag_ms_p99']:>11.1f} {lag['lag_ms_max']:>11.1f}")
+        print(f"compute pool: {pool.stats()}")
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory and first-request latency when WORKERS processes load the
+same saved model: unpickling the joblib file (each worker gets a private copy
+of the forest) versus memory-mapping the flat export saved next to it (one
+copy in the page cache, shared). Workers stay alive together so PSS shows the
+sharing. "lazy first score" is the first request's scoring cost when the
+model is loaded inside it, as before MODEL_LOAD; "eager" is the cost once the
+model was loaded at startup.
+"""
+
+from benchmarks.common import use_benchmark_database
+
+use_benchmark_database()
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_predict_many import feature_dicts, trained_model
+from metrics import process_memory
+from ml_model import InterestScoreModel, flat_export_dir
+
+WORKERS = 4
+TRAINING_ROWS = 20000
+
+def worker(path: str, predictor: str, features, barrier, results):
+    before = process_memory()
+    start = time.perf_counter()
+    model = InterestScoreModel(predictor)
+    model.load_model(path)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    model.predict_score(features)
+    first_seconds = time.perf_counter() - start
+    barrier.wait()
+    after = process_memory()
+    barrier.wait()
+    results.put({
+        'flat': model._flat_forest is not None,
+        'rss': after['rss_bytes'] - before['rss_bytes'],
+        'pss': after.get('pss_bytes', 0) - before.get('pss_bytes', 0),
+        'load': load_seconds,
+        'first': first_seconds
+    })
+
+def run(path: str, predictor: str, features):
+    context = multiprocessing.get_context("spawn")
+    barrier, results = context.Barrier(WORKERS), context.Queue()
+    processes = [context.Process(target=worker, args=(path, predictor, features, barrier, results))
+                 for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return samples
+
+def main():
+    directory = tempfile.mkdtemp(prefix="thrizll_model_")
+    path = os.path.join(directory, "interest_score_model.joblib")
+    model = trained_model(predictor="flat", training_rows=TRAINING_ROWS)
+    model.save_model(path)
+    nodes = len(model._flat_forest.value)
+    export_bytes = sum(os.path.getsize(os.path.join(flat_export_dir(path), name))
+                       for name in os.listdir(flat_export_dir(path)))
+    print(f"{nodes} nodes; joblib {os.path.getsize(path) / 1e6:.1f} MB, flat export {export_bytes / 1e6:.1f} MB; "
+          f"{WORKERS} workers")
+    features = feature_dicts(1, seed=5)[0]
+    failures = 0
+    print(f"{'load':>10} {'RSS MB':>7} {'PSS MB':>7} {'load ms':>8} {'eager first score ms':>21} "
+          f"{'lazy first score ms':>20}")
+    for name, predictor in (("joblib", "sklearn"), ("flat mmap", "flat")):
+        samples = run(path, predictor, features)
+        if any(sample['flat'] != (predictor == "flat") for sample in samples):
+            failures += 1
+            print(f"{name}: unexpected predictor")
+        mean = lambda key: sum(sample[key] for sample in samples) / len(samples)
+        print(f"{name:>10} {mean('rss') / 1e6:>7.1f} {mean('pss') / 1e6:>7.1f} {mean('load') * 1000:>8.1f} "
+              f"{mean('first') * 1000:>21.2f} {(mean('load') + mean('first')) * 1000:>20.1f}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
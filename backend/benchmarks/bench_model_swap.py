@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Hot swap of the served model under concurrent scoring. Two versions are
+published to a throwaway registry; CONCURRENCY request loops score through
+the compute pool (as GET /v1/score does) while version v2 is activated
+through the registry (as POST /admin/model does), then v1 again through the
+ACTIVE file and the watcher (as an activation in another process would).
+No request may fail, every response must match the predictions of the
+version it reports, and request latency should not move while a version loads.
+"""
+
+from benchmarks.common import use_benchmark_database
+
+use_benchmark_database()
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_predict_many import feature_dicts, trained_model
+from compute_pool import ComputePool
+from ml_model import model_registry
+
+CONCURRENCY = 8
+TRAINING_ROWS = 20000
+POLL_SECONDS = 0.2
+PHASE_SECONDS = 2.0
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+async def request_loop(pool: ComputePool, features, stop: asyncio.Event, results):
+    while not stop.is_set():
+        i = len(results) % len(features)
+        start = time.perf_counter()
+        try:
+            scores, version = await pool.scores_async({f"swap_session_{i}": features[i]})
+            results.append((time.perf_counter(), time.perf_counter() - start, i, version, scores[f"swap_session_{i}"]))
+        except Exception as e:
+            results.append((time.perf_counter(), time.perf_counter() - start, i, None, repr(e)))
+
+async def run(pool: ComputePool, features):
+    stop, results, marks = asyncio.Event(), [], {}
+    loops = [asyncio.create_task(request_loop(pool, features, stop, results)) for _ in range(CONCURRENCY)]
+    await asyncio.sleep(PHASE_SECONDS)
+    marks['admin swap'] = time.perf_counter()
+    await asyncio.to_thread(model_registry.activate, "v2")
+    marks['admin swap done'] = time.perf_counter()
+    await asyncio.sleep(PHASE_SECONDS)
+    # Another process activating v1: only the ACTIVE file changes here
+    with open(os.path.join(model_registry.root, "ACTIVE"), 'w') as f:
+        f.write("v1")
+    marks['file swap'] = time.perf_counter()
+    while model_registry.current().model_version != "v1":
+        await asyncio.sleep(0.01)
+    marks['file swap done'] = time.perf_counter()
+    await asyncio.sleep(PHASE_SECONDS)
+    stop.set()
+    await asyncio.gather(*loops)
+    return results, marks
+
+def main():
+    # Run where the configured (relative) registry directory is a throwaway one;
+    # spawned pool workers start in the same directory and read the same registry
+    os.chdir(tempfile.mkdtemp(prefix="thrizll_registry_"))
+    model_registry.poll_seconds = POLL_SECONDS
+    expected = {}
+    features = feature_dicts(64, seed=5)
+    for version, seed_rows in (("v1", TRAINING_ROWS), ("v2", TRAINING_ROWS // 2)):
+        model = trained_model(predictor="flat", training_rows=seed_rows)
+        model_registry.publish(model, version)
+        expected[version] = model.predict_many(features)
+    model_registry.activate("v1")
+    model_registry.start_watching()
+    pool = ComputePool(workers=1)
+    pool.start()
+    try:
+        # Workers load the model before the run, as after startup
+        pool.scores({"warmup": features[0]})
+        results, marks = asyncio.run(run(pool, features))
+    finally:
+        pool.stop()
+        model_registry.stop_watching()
+
+    failures = 0
+    errors = [r for r in results if r[3] is None]
+    if errors:
+        failures += 1
+        print(f"{len(errors)} failed requests, e.g. {errors[0][4]}")
+    mismatched = 0
+    for _, _, i, version, score in results:
+        if version is not None:
+            scores, confidences = expected[version]
+            if not (np.isclose(score[0], scores[i]) and np.isclose(score[1], confidences[i])):
+                mismatched += 1
+    if mismatched:
+        failures += 1
+        print(f"{mismatched} responses differ from the version they report")
+
+    # Latency of requests finishing during each swap versus steady state
+    def window(start, end):
+        return [r[1] for r in results if start <= r[0] <= end and r[3] is not None]
+    steady = window(0, marks['admin swap'])
+    print(f"{len(results)} requests, {CONCURRENCY} concurrent; "
+          f"versions served: {sorted({r[3] for r in results if r[3]})}")
+    print(f"{'phase':>16} {'requests':>9} {'p50 ms':>7} {'p99 ms':>7} {'swap ms':>8}")
+    print(f"{'steady (v1)':>16} {len(steady):>9} {percentile(steady, 50):>7.2f} {percentile(steady, 99):>7.2f}")
+    for name in ('admin swap', 'file swap'):
+        start, end = marks[name], marks[f"{name} done"]
+        during = window(start, end + 0.05)
+        print(f"{name:>16} {len(during):>9} {percentile(during, 50):>7.2f} {percentile(during, 99):>7.2f} "
+              f"{(end - start) * 1000:>8.1f}")
+    after = [r[3] for r in results if r[0] > marks['file swap done'] + 0.5]
+    if set(after) != {"v1"}:
+        failures += 1
+        print(f"after the file swap, served {set(after)}")
+    print(model_registry.stats())
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Query count and wall time of feature extraction for an ingest batch that spans
+N sessions: per-session calls (online session features + realtime features,
+one query each per session) against the batched multi-session API (one query
+each for the whole batch). Also checks both produce the same features.
+Set BENCH_QUERY_RTT_MS to add a simulated network round trip per query, as
+against a remote PostgreSQL server.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import gc
+import os
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import event
+
+from event_writer import bulk_insert_events, event_to_row
+from feature_extractor import FeatureExtractor
+from main import TelemetryEvent
+from models import Base, SessionLocal, engine, migrate_schema
+from online_features import OnlineFeatureExtractor
+
+SESSION_COUNTS = [1, 10, 50, 200]
+EVENTS_PER_SESSION = 200
+WINDOW_MINUTES = 2
+QUERY_RTT = float(os.getenv("BENCH_QUERY_RTT_MS", "0")) / 1000
+
+queries = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    global queries
+    queries += 1
+    if QUERY_RTT:
+        time.sleep(QUERY_RTT)
+
+def seed(prefix: str, sessions: int):
+    now_ms = int(datetime.now().timestamp() * 1000)
+    events = make_events(sessions * EVENTS_PER_SESSION, sessions=sessions, start_ms=now_ms - 60_000)
+    for e in events:
+        e["session_id"] = f"{prefix}_{e['session_id']}"
+    db = SessionLocal()
+    try:
+        bulk_insert_events(db, [event_to_row(TelemetryEvent(**e)) for e in events])
+        db.commit()
+    finally:
+        db.close()
+    return sorted({e["session_id"] for e in events})
+
+def per_session(session_ids):
+    online, extractor = OnlineFeatureExtractor(), FeatureExtractor(use_cache=False)
+    return {
+        session_id: (online.session_features(session_id),
+                     extractor.extract_realtime_features(session_id, WINDOW_MINUTES))
+        for session_id in session_ids
+    }
+
+def batched(session_ids):
+    online, extractor = OnlineFeatureExtractor(), FeatureExtractor(use_cache=False)
+    session = online.session_features_many(session_ids)
+    realtime = extractor.extract_features_many(session_ids, window_minutes=WINDOW_MINUTES)
+    return {session_id: (session[session_id], realtime[session_id]) for session_id in session_ids}
+
+def run(fn, session_ids):
+    global queries
+    gc.collect()
+    queries = 0
+    start = time.perf_counter()
+    result = fn(session_ids)
+    return result, queries, time.perf_counter() - start
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    mismatches = 0
+    # Warm up statement caches and lazy imports before timing
+    warmup = seed("warmup", 2)
+    per_session(warmup)
+    batched(warmup)
+    print(f"{EVENTS_PER_SESSION} events per session, {QUERY_RTT * 1000:g} ms simulated query RTT")
+    print(f"{'sessions':>8} {'loop queries':>13} {'loop ms':>9} {'batch queries':>14} {'batch ms':>9}")
+    for count in SESSION_COUNTS:
+        session_ids = seed(f"multi{count}", count)
+        loop_result, loop_queries, loop_time = run(per_session, session_ids)
+        batch_result, batch_queries, batch_time = run(batched, session_ids)
+        if loop_result != batch_result:
+            mismatches += 1
+            print(f"features differ for {count} sessions")
+        print(f"{count:>8} {loop_queries:>13} {loop_time * 1000:>9.1f} {batch_queries:>14} {batch_time * 1000:>9.1f}")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Parity and cost of the incremental feature extractor.
+
+Ingests a long session batch by batch and, after every batch, compares the
+online features with FeatureExtractor.extract_session_features (the pandas
+reference) key by key. Also reports the per-batch cost of both as the
+session grows. Exits non-zero on any mismatch. Features backed by quantile
+sketches must match exactly while the sketch is exact and within
+SKETCH_RTOL once the series outgrows it.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import math
+import random
+import sys
+import time
+
+from event_writer import bulk_insert_events, event_to_row
+from feature_extractor import FeatureExtractor, convert_numpy_types
+from models import Base, SessionLocal, engine
+from online_features import OnlineFeatureExtractor
+from main import TelemetryEvent
+
+BATCH_SIZE = 100
+BATCHES = 100
+REPORT_EVERY = 20
+RTOL = 1e-9
+SKETCH_RTOL = 0.05
+SKETCHED = {
+    'scroll_velocity_p95', 'inter_key_interval_median', 'tap_interval_median',
+    'pause_duration_median', 'typing_rhythm_entropy'
+}
+
+def same(a, b, rtol: float = RTOL) -> bool:
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return math.isclose(a, b, rel_tol=rtol, abs_tol=1e-12)
+
+def diff(reference, online):
+    problems = []
+    if reference.keys() != online.keys():
+        problems.append(f"keys differ: reference only {sorted(reference.keys() - online.keys())}, "
+                        f"online only {sorted(online.keys() - reference.keys())}")
+    for key in sorted(reference.keys() & online.keys()):
+        if not same(reference[key], online[key], SKETCH_RTOL if key in SKETCHED else RTOL):
+            problems.append(f"{key}: reference={reference[key]!r} online={online[key]!r}")
+    return problems
+
+def sparse_events(count: int, seed: int):
+    """make_events with some measurements missing, to exercise NULL handling"""
+    rng = random.Random(seed)
+    events = make_events(count, seed=seed)
+    for event in events:
+        for column in ("velocity", "delta", "input_len", "duration_ms"):
+            if column in event and rng.random() < 0.1:
+                event[column] = None
+    return events
+
+def store(rows):
+    db = SessionLocal()
+    try:
+        bulk_insert_events(db, rows)
+        db.commit()
+    finally:
+        db.close()
+
+def run_session(session_id: str, events, reference: FeatureExtractor, online: OnlineFeatureExtractor):
+    failures = 0
+    for event in events:
+        event["session_id"] = session_id
+    print(f"{session_id}: {'events':>8} {'pandas ms':>10} {'online ms':>10}")
+    for i in range(0, len(events), BATCH_SIZE):
+        store([event_to_row(TelemetryEvent(**event)) for event in events[i:i + BATCH_SIZE]])
+
+        start = time.perf_counter()
+        expected = convert_numpy_types(reference.extract_session_features(session_id))
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = online.session_features(session_id)
+        online_time = time.perf_counter() - start
+
+        problems = diff(expected, actual)
+        if problems:
+            failures += 1
+            print(f"  mismatch after {i + BATCH_SIZE} events:")
+            for problem in problems:
+                print(f"    {problem}")
+        batch = i // BATCH_SIZE + 1
+        if batch % REPORT_EVERY == 0:
+            print(f"{'':>{len(session_id) + 1}} {i + BATCH_SIZE:>8} "
+                  f"{reference_time * 1000:>10.2f} {online_time * 1000:>10.2f}")
+    return failures
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    reference = FeatureExtractor(use_kernel=False, use_cache=False)
+    # One writer, so ids commit in order; the whole run fits in the default lag window
+    online = OnlineFeatureExtractor(commit_lag_seconds=0)
+    count = BATCH_SIZE * BATCHES
+
+    failures = run_session("parity_dense", make_events(count, seed=1), reference, online)
+    failures += run_session("parity_sparse", sparse_events(count, seed=2), reference, online)
+
+    # A late batch (older timestamps) forces a rebuild of the session state
+    late = make_events(BATCH_SIZE, start_ms=0, seed=3)
+    failures += run_session("parity_dense", late, reference, online)
+
+    print(f"online extractor: {online.stats()}")
+    if failures:
+        print(f"FAILED: {failures} batches differ from the pandas reference")
+        sys.exit(1)
+    print("parity OK")
+
+if __name__ == "__main__":
+    main()
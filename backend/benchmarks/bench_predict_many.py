@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Scoring throughput of InterestScoreModel.predict_score called once per
+feature dict versus predict_many on the whole batch, for a model trained on
+synthetic data. Both must return the same scores and confidences.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from event_writer import event_to_row
+from feature_kernel import FEATURE_NAMES, compute_features, rows_to_array
+from main import TelemetryEvent
+from ml_model import InterestScoreModel
+
+BATCH_SIZES = (1, 64, 4096)
+TEMPLATES = 20
+TRAINING_ROWS = 2000
+MIN_SECONDS = 1.0
+
+def feature_dicts(count: int, seed: int):
+    templates = []
+    for i in range(TEMPLATES):
+        events = make_events(300, seed=i)
+        templates.append(compute_features(rows_to_array([event_to_row(TelemetryEvent(**e)) for e in events])))
+    rng = np.random.default_rng(seed)
+    return [
+        {name: value * rng.uniform(0.5, 1.5) for name, value in templates[i % TEMPLATES].items()}
+        for i in range(count)
+    ]
+
+def trained_model(predictor: str = "flat", training_rows: int = TRAINING_ROWS) -> InterestScoreModel:
+    model = InterestScoreModel(predictor)
+    rows = feature_dicts(training_rows, seed=1)
+    features_df = pd.DataFrame(rows).reindex(columns=FEATURE_NAMES)
+    rng = np.random.default_rng(2)
+    scores = np.clip(40 + features_df['events_per_second'].fillna(0) * 5 + rng.normal(0, 10, len(rows)), 0, 100)
+    model.train_model(features_df, scores.values)
+    return model
+
+def rate(fn, rows: int) -> float:
+    """Rows scored per second, repeating fn for at least MIN_SECONDS"""
+    calls, start = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            return calls * rows / elapsed
+
+def main():
+    model = trained_model()
+    batch = feature_dicts(max(BATCH_SIZES), seed=3)
+    failures = 0
+    print(f"{'batch':>6} {'per-dict rows/s':>16} {'predict_many rows/s':>20} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        rows = batch[:size]
+        singles = np.array([model.predict_score(features) for features in rows])
+        scores, confidences = model.predict_many(rows)
+        if not (np.allclose(singles[:, 0], scores) and np.allclose(singles[:, 1], confidences)):
+            failures += 1
+            print(f"batch {size}: predict_many differs from predict_score")
+        # A prebuilt matrix (feature store rows) scores the same as the dicts
+        matrix_scores, _ = model.predict_many(model.prepare_features_many(rows))
+        if not np.allclose(matrix_scores, scores):
+            failures += 1
+            print(f"batch {size}: matrix input differs from dict input")
+
+        single_rate = rate(lambda: [model.predict_score(features) for features in rows], size)
+        many_rate = rate(lambda: model.predict_many(rows), size)
+        print(f"{size:>6} {single_rate:>16.0f} {many_rate:>20.0f} {many_rate / single_rate:>7.1f}x")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Accuracy and speed of KLLSketch against pandas Series.quantile for the
+distributions behind the percentile features (scroll velocities, inter-event
+intervals, pause durations). Accuracy is the normalized rank error of the
+sketch's answer (how far its true rank is from q * n); the sketch must be
+exact up to k values and within MAX_RANK_ERROR beyond. Also checks that
+merging serialized sketches of the parts of a stream is as accurate as
+sketching the whole stream.
+"""
+
+import json
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from quantile_sketch import DEFAULT_K, KLLSketch
+
+SIZES = [100, 1000, 10000, 100000, 1000000]
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+MERGE_PARTS = 16
+MAX_RANK_ERROR = 0.02
+
+DISTRIBUTIONS = {
+    "velocity": lambda rng, n: rng.uniform(0, 3000, n),
+    "interval": lambda rng, n: rng.lognormal(-1.5, 1.0, n),
+    "pause": lambda rng, n: rng.integers(300, 5000, n).astype(float),
+}
+
+def rank_error(ordered: np.ndarray, value: float, q: float) -> float:
+    # Distance from q to the closest normalized rank value could have (ties span a range)
+    n = len(ordered)
+    low = np.searchsorted(ordered, value, side='left') / n
+    high = np.searchsorted(ordered, value, side='right') / n
+    return 0.0 if low <= q <= high else min(abs(q - low), abs(q - high))
+
+def sketch_of(values: np.ndarray, k: int) -> KLLSketch:
+    sketch = KLLSketch(k)
+    sketch.update(values)
+    return sketch
+
+def merged_sketch(values: np.ndarray, k: int) -> KLLSketch:
+    # Each part goes through JSON, as sketches stored with the features would
+    merged = KLLSketch(k)
+    for part in np.array_split(values, MERGE_PARTS):
+        merged.merge(KLLSketch.from_dict(json.loads(json.dumps(sketch_of(part, k).to_dict()))))
+    return merged
+
+def main():
+    rng = np.random.default_rng(11)
+    failures = 0
+    k = DEFAULT_K
+    print(f"k={k}; rank errors are the max over q in {QUANTILES}")
+    print(f"{'dist':>9} {'n':>8} {'pandas ms':>10} {'sketch ms':>10} {'retained':>9} "
+          f"{'rank err':>9} {'merged err':>11} {'p95 rel err':>12}")
+    for name, generate in DISTRIBUTIONS.items():
+        for n in SIZES:
+            values = generate(rng, n)
+            series = pd.Series(values)
+
+            start = time.perf_counter()
+            expected = [float(series.quantile(q)) for q in QUANTILES]
+            pandas_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            sketch = sketch_of(values, k)
+            actual = [sketch.quantile(q) for q in QUANTILES]
+            sketch_time = time.perf_counter() - start
+
+            ordered = np.sort(values)
+            merged = merged_sketch(values, k)
+            error = max(rank_error(ordered, value, q) for value, q in zip(actual, QUANTILES))
+            merged_error = max(rank_error(ordered, merged.quantile(q), q) for q in QUANTILES)
+            p95 = QUANTILES.index(0.95)
+            p95_error = abs(actual[p95] - expected[p95]) / abs(expected[p95])
+            retained = sum(len(level) for level in sketch.levels)
+
+            if n <= k and actual != expected:
+                failures += 1
+                print(f"  {name} n={n}: sketch should be exact")
+            if max(error, merged_error) > MAX_RANK_ERROR:
+                failures += 1
+                print(f"  {name} n={n}: rank error above {MAX_RANK_ERROR}")
+            print(f"{name:>9} {n:>8} {pandas_time * 1000:>10.2f} {sketch_time * 1000:>10.2f} {retained:>9} "
+                  f"{error:>9.4f} {merged_error:>11.4f} {p95_error:>12.5f}")
+
+    # Single-value adds, as the online extractor feeds it
+    values = DISTRIBUTIONS["interval"](rng, 100000)
+    sketch = KLLSketch(k)
+    start = time.perf_counter()
+    for value in values.tolist():
+        sketch.add(value)
+    per_add = (time.perf_counter() - start) / len(values)
+    print(f"add(): {per_add * 1e6:.2f} us per value")
+
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Realtime window features while events stream in: reading each session's
+window through the in-memory recent event buffers against querying the events
+table every time. Batches go through main.write_event_rows so the buffers see
+ingest exactly as in the service. Reports per-round latency, query counts and
+the buffer hit rate, then repeats the stream with concurrent readers and
+checks buffered windows equal the database's.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import gc
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import event
+
+from event_fetch import fetch_event_arrays
+from event_writer import event_to_row
+from feature_extractor import recent_events
+from feature_kernel import compute_features
+from main import TelemetryEvent, write_event_rows
+from models import Base, SessionLocal, engine, migrate_schema
+
+SESSIONS = 200
+ROUNDS = 20
+EVENTS_PER_BATCH = 10
+WINDOW = timedelta(minutes=2)
+
+queries = 0
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    global queries
+    queries += 1
+
+def session_batches(prefix: str):
+    """ROUNDS batches of row dicts per session, spread over the last minute"""
+    start_ms = int(datetime.now().timestamp() * 1000) - 60_000
+    batches = [[] for _ in range(ROUNDS)]
+    for i in range(SESSIONS):
+        events = make_events(ROUNDS * EVENTS_PER_BATCH, seed=i, start_ms=start_ms)
+        for e in events:
+            e["session_id"] = f"{prefix}_{i}"
+        for r in range(ROUNDS):
+            chunk = events[r * EVENTS_PER_BATCH:(r + 1) * EVENTS_PER_BATCH]
+            batches[r].append([event_to_row(TelemetryEvent(**e)) for e in chunk])
+    return batches
+
+def write(batches):
+    db = SessionLocal()
+    try:
+        for rows in batches:
+            write_event_rows(db, rows)
+    finally:
+        db.close()
+
+def from_database(session_ids, since):
+    db = SessionLocal()
+    try:
+        return fetch_event_arrays(db, session_ids, since=since)
+    finally:
+        db.close()
+
+def from_buffers(session_ids, since):
+    return recent_events.windows(session_ids, since, lambda missing: from_database(missing, since))
+
+def features(read, session_ids, since):
+    global queries
+    gc.collect()
+    queries = 0
+    start = time.perf_counter()
+    result = {session_id: compute_features(events) for session_id, events in read(session_ids, since).items()}
+    return result, queries, time.perf_counter() - start
+
+def same_windows(session_ids, since) -> bool:
+    buffered, stored = from_buffers(session_ids, since), from_database(session_ids, since)
+    return all(
+        np.array_equal(buffered[s][field], stored[s][field], equal_nan=field not in ('ts', 'etype'))
+        for s in session_ids for field in stored[s].dtype.names
+    )
+
+def streaming():
+    batches = session_batches("stream")
+    session_ids = [rows[0]["session_id"] for rows in batches[0]]
+    mismatches = 0
+    totals = {"db": [0, 0.0], "buffered": [0, 0.0]}
+    print(f"{SESSIONS} sessions, {ROUNDS} rounds of {EVENTS_PER_BATCH} events per session")
+    print(f"{'round':>5} {'db queries':>11} {'db ms':>8} {'buf queries':>12} {'buf ms':>8}")
+    for r, round_batches in enumerate(batches):
+        write(round_batches)
+        since = datetime.utcnow() - WINDOW
+        db_result, db_queries, db_time = features(from_database, session_ids, since)
+        buf_result, buf_queries, buf_time = features(from_buffers, session_ids, since)
+        if db_result != buf_result:
+            mismatches += 1
+            print(f"features differ in round {r}")
+        totals["db"][0] += db_queries
+        totals["db"][1] += db_time
+        totals["buffered"][0] += buf_queries
+        totals["buffered"][1] += buf_time
+        if r in (0, 1, ROUNDS - 1):
+            print(f"{r:>5} {db_queries:>11} {db_time * 1000:>8.1f} {buf_queries:>12} {buf_time * 1000:>8.1f}")
+    for name, (total_queries, total_time) in totals.items():
+        print(f"{name:>9}: {total_queries} queries, {total_time / ROUNDS * 1000:.1f} ms per round")
+    return mismatches
+
+def concurrent():
+    """Writers and readers interleave; buffered windows must still match the database"""
+    batches = session_batches("concurrent")
+    session_ids = [rows[0]["session_id"] for rows in batches[0]]
+    done = threading.Event()
+
+    def writer(part):
+        for round_batches in batches:
+            write(round_batches[part::2])
+        done.set()
+
+    def reader():
+        while not done.is_set():
+            from_buffers(session_ids, datetime.utcnow() - WINDOW)
+
+    threads = [threading.Thread(target=writer, args=(part,)) for part in range(2)]
+    threads += [threading.Thread(target=reader) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ok = same_windows(session_ids, datetime.utcnow() - WINDOW)
+    print(f"concurrent ingest and reads: buffered windows {'match' if ok else 'DIFFER from'} the database")
+    return 0 if ok else 1
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    mismatches = streaming() + concurrent()
+    stats = recent_events.stats()
+    print(f"hit rate {stats['hit_rate']:.3f}, seeds {stats.get('seeds', 0):g}, "
+          f"skipped seeds {stats.get('seeds_skipped', 0):g}, {stats['events']} events in {stats['bytes'] / 2**20:.1f} MB")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Compare the JSON EventBatch format with the columnar wire format.
+Reports payload size (raw and gzipped) and decode time down to row dicts.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events, timed
+
+use_benchmark_database()
+
+import gzip
+import json
+
+from event_writer import event_to_row
+from main import EventBatch
+from wire_format import encode_columnar_batch, decode_columnar_batch
+
+BATCH_SIZES = [100, 1000, 10000]
+REPEATS = 5
+
+def decode_json(payload: bytes):
+    batch = EventBatch(**json.loads(payload))
+    return [event_to_row(event) for event in batch.events]
+
+def best_of(fn, payload):
+    best = float("inf")
+    for _ in range(REPEATS):
+        result, elapsed = timed(fn, payload)
+        best = min(best, elapsed)
+    return result, best
+
+def main():
+    print(f"{'batch':>8} {'json B':>10} {'col B':>10} {'json gz':>9} {'col gz':>9} "
+          f"{'json ms':>9} {'col ms':>9}")
+    for size in BATCH_SIZES:
+        events = make_events(size, sessions=1)
+        json_payload = json.dumps({"events": events}).encode('utf-8')
+        columnar_payload = encode_columnar_batch(events)
+
+        json_rows, json_time = best_of(decode_json, json_payload)
+        columnar_rows, columnar_time = best_of(decode_columnar_batch, columnar_payload)
+        assert json_rows == columnar_rows, "columnar decode does not match JSON decode"
+
+        print(f"{size:>8} {len(json_payload):>10} {len(columnar_payload):>10} "
+              f"{len(gzip.compress(json_payload)):>9} {len(gzip.compress(columnar_payload)):>9} "
+              f"{json_time * 1000:>9.2f} {columnar_time * 1000:>9.2f}")
+
+if __name__ == "__main__":
+    main()
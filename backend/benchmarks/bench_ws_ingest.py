@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Throughput of the telemetry WebSocket channel against one HTTP POST per batch,
+as the number of concurrent client connections grows.
+Starts a local uvicorn server; needs the uvicorn, websockets and httpx packages.
+"""
+
+from benchmarks.common import use_benchmark_database, make_events
+
+use_benchmark_database()
+
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+
+import httpx
+import uvicorn
+import websockets
+
+from main import app
+
+CONNECTION_COUNTS = [1, 10, 50]
+FRAMES_PER_CONNECTION = 50
+EVENTS_PER_FRAME = 10
+
+def start_server() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"127.0.0.1:{port}"
+
+def client_frames(client: int):
+    session_id = f"bench_session_{client}"
+    events = make_events(FRAMES_PER_CONNECTION * EVENTS_PER_FRAME, seed=client)
+    for event in events:
+        event["session_id"] = session_id
+    return session_id, [
+        events[i:i + EVENTS_PER_FRAME] for i in range(0, len(events), EVENTS_PER_FRAME)
+    ]
+
+async def websocket_client(address: str, client: int):
+    session_id, frames = client_frames(client)
+    async with websockets.connect(f"ws://{address}/v1/ingest/ws/{session_id}") as ws:
+        for frame_id, events in enumerate(frames):
+            await ws.send(json.dumps({"type": "events", "frame_id": frame_id, "events": events}))
+        acked = 0
+        while acked < len(frames):
+            message = json.loads(await ws.recv())
+            if message.get("type") == "ack":
+                acked += len(message["frame_ids"])
+
+async def http_client(address: str, client: int):
+    _, frames = client_frames(client)
+    async with httpx.AsyncClient(base_url=f"http://{address}") as http:
+        for events in frames:
+            response = await http.post("/v1/ingest/events", json={"events": events})
+            response.raise_for_status()
+
+async def run(client_fn, address: str, connections: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(client_fn(address, i) for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    return connections * FRAMES_PER_CONNECTION * EVENTS_PER_FRAME / elapsed
+
+def main():
+    logging.disable(logging.INFO)
+    address = start_server()
+    print(f"{FRAMES_PER_CONNECTION} frames x {EVENTS_PER_FRAME} events per connection")
+    print(f"{'conns':>6} {'http ev/s':>12} {'ws ev/s':>12}")
+    for connections in CONNECTION_COUNTS:
+        http_rate = asyncio.run(run(http_client, address, connections))
+        ws_rate = asyncio.run(run(websocket_client, address, connections))
+        print(f"{connections:>6} {http_rate:>12.0f} {ws_rate:>12.0f}")
+
+if __name__ == "__main__":
+    main()
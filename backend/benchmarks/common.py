@@ -0,0 +1,62 @@
+"""Shared helpers for the benchmark scripts"""
+
+import os
+import random
+import tempfile
+import time
+
+ETYPES = ['SCROLL', 'TAP', 'TYPE', 'LONG_PRESS', 'PAUSE', 'FOCUS_CHANGE']
+
+def use_benchmark_database() -> str:
+    """
+    Point models.py at a throwaway database before it is imported.
+    Set BENCH_DATABASE_URL to benchmark against PostgreSQL instead.
+    """
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(prefix="thrizll_bench_"), "bench.db")
+        url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = url
+    return url
+
+def make_events(count: int, sessions: int = 1, start_ms: int = None, seed: int = 7):
+    """Generate realistic-looking TelemetryEvent dicts spread across sessions"""
+    rng = random.Random(seed)
+    ts = start_ms if start_ms is not None else int(time.time() * 1000) - count * 150
+    events = []
+    for i in range(count):
+        ts += rng.randint(20, 300)
+        etype = rng.choice(ETYPES)
+        session = i % sessions
+        event = {
+            "ts": ts,
+            "session_id": f"bench_session_{session}",
+            "user_hash": f"bench_user_{session}",
+            "screen": "ChatScreen",
+            "component_id": "message-input" if etype == 'TYPE' else None,
+            "etype": etype,
+        }
+        if etype == 'SCROLL':
+            event.update(delta=rng.uniform(-200, 200), velocity=rng.uniform(0, 3000), accel=rng.uniform(-50, 50))
+        elif etype == 'TYPE':
+            event.update(input_len=rng.randint(0, 200), backspaces=1 if rng.random() < 0.05 else 0)
+        elif etype == 'PAUSE':
+            event.update(duration_ms=rng.randint(300, 5000))
+        elif etype == 'LONG_PRESS':
+            event.update(duration_ms=rng.randint(500, 1500))
+        events.append(event)
+    return events
+
+def timed(fn, *args, **kwargs):
+    """Run fn once and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
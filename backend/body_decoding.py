@@ -0,0 +1,167 @@
+import logging
+import time
+import zlib
+from typing import AsyncGenerator, Callable
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+
+from config import MAX_DECODED_BODY_BYTES
+from metrics import Counters
+
+try:
+    import zstandard
+except ImportError:  # zstd bodies are rejected with 415 without it
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+counters = Counters()
+
+class _ZlibDecoder:
+    """gzip / deflate decoder with a per-call output cap"""
+
+    def __init__(self, wbits: int):
+        self._decompressor = zlib.decompressobj(wbits)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        # Returns at most max_length bytes; more pending output means over budget
+        return self._decompressor.decompress(data, max_length)
+
+    def flush(self) -> bytes:
+        return self._decompressor.flush()
+
+class _OutputLimitReached(Exception):
+    pass
+
+class _CappedSink:
+    """Collects a zstd stream writer's output and stops it once max_length bytes are out"""
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.max_length = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        if self.size >= self.max_length:
+            raise _OutputLimitReached()
+        return len(data)
+
+    def take(self) -> bytes:
+        output = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return output
+
+class _ZstdDecoder:
+    """
+    zstd decoder with a per-call output cap. zstandard's decompressobj returns
+    all output of its input at once (one 4 KB RLE block can hold 128 MB), so
+    decode through a stream writer instead: it hands output to the sink one
+    DECOMPRESSION_RECOMMENDED_OUTPUT_SIZE buffer at a time, and the sink stops
+    it at the cap.
+    """
+
+    def __init__(self):
+        self._sink = _CappedSink()
+        self._writer = zstandard.ZstdDecompressor().stream_writer(self._sink)
+
+    def decompress(self, data: bytes, max_length: int) -> bytes:
+        # Returns max_length bytes or more (at most one output buffer more) when over budget
+        self._sink.max_length = max_length
+        try:
+            self._writer.write(data)
+        except _OutputLimitReached:
+            pass
+        return self._sink.take()
+
+    def flush(self) -> bytes:
+        return b''
+
+def _make_decoder(encoding: str):
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return _ZlibDecoder(zlib.MAX_WBITS)
+    if encoding == 'zstd' and zstandard is not None:
+        return _ZstdDecoder()
+    counters.incr('rejected_unsupported')
+    raise HTTPException(status_code=415, detail=f"Unsupported Content-Encoding: {encoding}")
+
+def _too_large():
+    counters.incr('rejected_too_large')
+    return HTTPException(
+        status_code=413,
+        detail=f"Decoded request body exceeds {MAX_DECODED_BODY_BYTES} bytes"
+    )
+
+class DecodedRequest(Request):
+    """
+    Request whose body is transparently decoded according to Content-Encoding.
+    Decoding is incremental: each received chunk is inflated as it arrives and
+    the decoded size is capped at MAX_DECODED_BODY_BYTES.
+    """
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        if hasattr(self, "_body"):
+            yield self._body
+            return
+
+        encoding = self.headers.get('content-encoding', 'identity').strip().lower()
+        decoder = None if encoding in ('', 'identity') else _make_decoder(encoding)
+
+        received = 0
+        decoded = 0
+        decode_seconds = 0.0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if decoder is None:
+                decoded += len(chunk)
+                if decoded > MAX_DECODED_BODY_BYTES:
+                    raise _too_large()
+                if chunk:
+                    yield chunk
+                continue
+
+            start = time.perf_counter()
+            try:
+                piece = decoder.decompress(chunk, MAX_DECODED_BODY_BYTES - decoded + 1)
+            except Exception as e:
+                counters.incr('rejected_corrupt')
+                raise HTTPException(status_code=400, detail=f"Invalid {encoding} body: {e}")
+            decode_seconds += time.perf_counter() - start
+
+            decoded += len(piece)
+            if decoded > MAX_DECODED_BODY_BYTES:
+                raise _too_large()
+            if piece:
+                yield piece
+
+        if decoder is not None:
+            tail = decoder.flush()
+            decoded += len(tail)
+            if decoded > MAX_DECODED_BODY_BYTES:
+                raise _too_large()
+            if tail:
+                yield tail
+
+            counters.incr(f'{encoding}_bodies')
+            counters.incr('compressed_bytes', received)
+            counters.incr('decoded_bytes', decoded)
+            counters.observe('compression_ratio', decoded / max(received, 1))
+            counters.observe('decode_seconds', decode_seconds)
+        else:
+            counters.incr('identity_bodies')
+
+class DecodedBodyRoute(APIRoute):
+    """Route class that hands endpoints a DecodedRequest"""
+
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+
+        async def decoded_body_handler(request: Request):
+            return await original_handler(DecodedRequest(request.scope, request.receive))
+
+        return decoded_body_handler
@@ -0,0 +1,187 @@
+"""
+Process pool for CPU-bound feature computation and scoring.
+
+The feature kernel and model prediction hold the GIL for most of their run, so
+running them on the event loop, or in threads of the same process, stalls
+every request and WebSocket served by the worker. ComputePool runs them in a
+ProcessPoolExecutor instead. Tasks carry compact payloads: event windows as
+EVENT_DTYPE arrays (each pickles as one buffer) and feature dicts for
+scoring. Caches, buffers and online state stay in the parent.
+
+Workers are started with the spawn method, so they import only this module's
+dependencies (not the app) when the service runs as `uvicorn main:app`, and
+each loads the model once. Scoring tasks name the model version the parent
+serves, so after a hot swap workers load the new version on their next task
+and requests never mix versions. With workers=0 tasks run in the calling thread, as
+before the pool existed. If a worker dies the pool is replaced and the task
+runs in the calling thread.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from feature_cache import feature_cache
+from feature_kernel import compute_features
+from metrics import Counters
+from ml_model import get_model
+
+logger = logging.getLogger(__name__)
+
+Score = Tuple[float, float]
+
+def _compute_features_task(arrays: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+    return {session_id: compute_features(events) for session_id, events in arrays.items()}
+
+def _score_task(payload: Tuple[Optional[str], List[Dict[str, float]]]) -> Tuple[List[Score], Optional[str]]:
+    version, features_list = payload
+    try:
+        model = get_model(version)
+    except Exception as e:
+        # Keep scoring with the version this worker has
+        model = get_model()
+        logger.error(f"Error loading model version {version}; scored with {model.model_version}: {e}")
+    scores, confidences = model.predict_many(features_list)
+    return list(zip(scores.tolist(), confidences.tolist())), model.model_version
+
+def _init_worker():
+    # Load the model before the first task instead of during it
+    get_model()
+
+class ComputePool:
+    def __init__(self, workers: int = 2, start_method: str = "spawn"):
+        self.workers = workers
+        self.start_method = start_method
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def start(self):
+        with self._lock:
+            if self.workers > 0 and self._executor is None:
+                self._executor = self._new_executor()
+                logger.info(f"Compute pool started with {self.workers} {self.start_method} workers")
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker
+        )
+
+    def features(self, arrays: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+        """compute_features for each session's event array; blocks the calling thread"""
+        return self._run(_compute_features_task, arrays, _payload_bytes(arrays))
+
+    async def features_async(self, arrays: Dict[str, np.ndarray]) -> Dict[str, Dict[str, float]]:
+        return await self._run_async(_compute_features_task, arrays, _payload_bytes(arrays))
+
+    def scores(self, features_by_session: Dict[str, Dict[str, float]],
+               window_minutes: Optional[int] = None) -> Tuple[Dict[str, Score], Optional[str]]:
+        """
+        (score, confidence) per session, reusing scores cached with identical
+        features, and the version of the model that computed them. Workers score
+        with the version this process serves, switching to it if they have not yet.
+        """
+        version, scores, missing = self._cached_scores(features_by_session, window_minutes)
+        if missing:
+            computed, version = self._run(_score_task, (version, [features_by_session[s] for s in missing]), 0)
+            scores.update(self._store_scores(missing, computed, version, features_by_session, window_minutes))
+        return scores, version
+
+    async def scores_async(self, features_by_session: Dict[str, Dict[str, float]],
+                           window_minutes: Optional[int] = None) -> Tuple[Dict[str, Score], Optional[str]]:
+        version, scores, missing = self._cached_scores(features_by_session, window_minutes)
+        if missing:
+            computed, version = await self._run_async(
+                _score_task, (version, [features_by_session[s] for s in missing]), 0
+            )
+            scores.update(self._store_scores(missing, computed, version, features_by_session, window_minutes))
+        return scores, version
+
+    def _cached_scores(self, features_by_session, window_minutes) -> Tuple[Optional[str], Dict[str, Score], List[str]]:
+        version = get_model().model_version
+        scores, missing = {}, []
+        for session_id, features in features_by_session.items():
+            cached = feature_cache.score(session_id, window_minutes, features, version)
+            if cached is None:
+                missing.append(session_id)
+            else:
+                scores[session_id] = cached
+        return version, scores, missing
+
+    def _store_scores(self, session_ids, computed, version, features_by_session, window_minutes) -> Dict[str, Score]:
+        for session_id, score in zip(session_ids, computed):
+            feature_cache.store_score(session_id, window_minutes, features_by_session[session_id], score, version)
+        return dict(zip(session_ids, computed))
+
+    def _submit(self, fn: Callable, payload: Any) -> Optional[Future]:
+        with self._lock:
+            if self._executor is None:
+                return None
+            try:
+                return self._executor.submit(fn, payload)
+            except BrokenProcessPool:
+                self._replace_executor()
+                return None
+
+    def _replace_executor(self):
+        # Called with the lock held
+        logger.error("Compute pool worker died; replacing the pool")
+        self.counters.incr('restarts')
+        broken, self._executor = self._executor, self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn: Callable, payload: Any, payload_bytes: int) -> Any:
+        start = time.perf_counter()
+        future = self._submit(fn, payload)
+        try:
+            result = future.result() if future is not None else fn(payload)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is not None:
+                    self._replace_executor()
+            result = fn(payload)
+        self._record(future is not None, start, payload_bytes)
+        return result
+
+    async def _run_async(self, fn: Callable, payload: Any, payload_bytes: int) -> Any:
+        start = time.perf_counter()
+        future = self._submit(fn, payload)
+        try:
+            # With workers=0 this runs on the event loop, as before the pool existed
+            result = await asyncio.wrap_future(future) if future is not None else fn(payload)
+        except BrokenProcessPool:
+            with self._lock:
+                if self._executor is not None:
+                    self._replace_executor()
+            result = fn(payload)
+        self._record(future is not None, start, payload_bytes)
+        return result
+
+    def _record(self, offloaded: bool, start: float, payload_bytes: int):
+        self.counters.incr('offloaded_tasks' if offloaded else 'inline_tasks')
+        self.counters.observe('task_seconds', time.perf_counter() - start)
+        if payload_bytes:
+            self.counters.observe('payload_bytes', payload_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        stats['workers'] = self.workers if self._executor is not None else 0
+        return stats
+
+def _payload_bytes(arrays: Dict[str, np.ndarray]) -> int:
+    return sum(events.nbytes for events in arrays.values())
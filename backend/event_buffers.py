@@ -0,0 +1,262 @@
+"""
+In-memory sliding windows of recent events per session.
+
+Ingest appends every committed batch to its sessions' ring buffers, so
+realtime features can be computed without querying the events table. A buffer
+only answers a window query when it is known to hold every event of the
+session from the window start onwards (complete_from). That is established by
+seeding the buffer from the database on the first miss, and is pushed forward
+when events are evicted to respect the per-session cap.
+
+Seeding must not race with ingest: a batch committed after the seed query but
+appended before the seed is installed would be lost from the buffer. Ingest
+therefore calls begin() before committing and append() or abort() afterwards,
+and a seed is only installed if no batch for the session was in flight when
+the query started and none has started since.
+
+When the total allocated size exceeds max_bytes the least recently used
+sessions are dropped; their next read falls back to the database.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from feature_kernel import EVENT_DTYPE, rows_to_array
+from metrics import Counters
+
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+_INITIAL_CAPACITY = 64
+# Events are kept slightly longer than the window, since readers compute their cutoff before asking
+_RETENTION_SLACK = timedelta(seconds=5)
+
+# load(session_ids) returns each session's ts-ordered EVENT_DTYPE window from the database
+WindowLoader = Callable[[List[str]], Dict[str, np.ndarray]]
+
+def ceil_ms(value: datetime) -> int:
+    """Smallest millisecond timestamp not earlier than value"""
+    return -((_EPOCH - value) // _MILLISECOND)
+
+class SessionRing:
+    """Ring buffer of one session's recent events, in arrival order"""
+
+    __slots__ = ('data', 'start', 'count', 'complete_from', 'generation', 'inflight')
+
+    def __init__(self):
+        self.data = np.empty(_INITIAL_CAPACITY, dtype=EVENT_DTYPE)
+        self.start = 0
+        self.count = 0
+        self.complete_from: Optional[int] = None  # ms; None until seeded from the database
+        self.generation = 0  # last begin() or seed, to detect seeds racing with ingest
+        self.inflight = 0  # batches between begin() and append()/abort()
+
+    def events(self) -> np.ndarray:
+        end = self.start + self.count
+        if end <= len(self.data):
+            return self.data[self.start:end]
+        return np.concatenate((self.data[self.start:], self.data[:end - len(self.data)]))
+
+    def replace(self, events: np.ndarray, capacity: int):
+        """Hold the last capacity of events, which must be complete from complete_from"""
+        self._passed(events[:-capacity])
+        events = events[-capacity:]
+        self._resize(_capacity_for(len(events), capacity), events)
+
+    def push(self, events: np.ndarray, capacity: int) -> int:
+        """Append events, evicting the oldest beyond capacity; returns how many were evicted"""
+        needed = self.count + len(events)
+        if needed > capacity:
+            evicted = needed - capacity
+            merged = np.concatenate((self.events(), events))
+            self._passed(merged[:evicted])
+            self._resize(capacity, merged[evicted:])
+            return evicted
+        if needed > len(self.data):
+            self._resize(_capacity_for(needed, capacity), self.events())
+        end = (self.start + self.count) % len(self.data)
+        first = min(len(events), len(self.data) - end)
+        self.data[end:end + first] = events[:first]
+        self.data[:len(events) - first] = events[first:]
+        self.count = needed
+        return 0
+
+    def expire(self, cutoff_ms: int):
+        """Drop events older than cutoff_ms from the head"""
+        events = self.events()
+        n = int(np.argmax(events['ts'] >= cutoff_ms)) if self.count and events['ts'][-1] >= cutoff_ms else self.count
+        # Late events can leave older ones behind the head; reads filter by ts anyway
+        if n:
+            self.start = (self.start + n) % len(self.data)
+            self.count -= n
+        if self.complete_from is not None:
+            self.complete_from = max(self.complete_from, cutoff_ms)
+
+    def _resize(self, size: int, events: np.ndarray):
+        self.data = np.empty(size, dtype=EVENT_DTYPE)
+        self.data[:len(events)] = events
+        self.start, self.count = 0, len(events)
+
+    def _passed(self, evicted: np.ndarray):
+        # The buffer is no longer complete for the evicted events' time range
+        if len(evicted) and self.complete_from is not None:
+            self.complete_from = max(self.complete_from, int(evicted['ts'].max()) + 1)
+
+def _capacity_for(count: int, limit: int) -> int:
+    # Double from the initial size so growing sessions are copied O(log n) times
+    size = _INITIAL_CAPACITY
+    while size < count:
+        size *= 2
+    return min(size, max(limit, 1))
+
+class RecentEventBuffers:
+    """Per-session ring buffers of the last window_minutes of events, in an LRU"""
+
+    def __init__(self, window_minutes: float, max_events_per_session: int, max_bytes: int):
+        self.retention = timedelta(minutes=window_minutes) + _RETENTION_SLACK
+        self.max_events_per_session = max_events_per_session
+        self.max_bytes = max_bytes
+        self._rings: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._generation = 0  # global, so a ring recreated after eviction never reuses a value
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def begin(self, session_ids: Iterable[str]):
+        """A batch with events for these sessions is about to be committed"""
+        with self._lock:
+            for session_id in set(session_ids):
+                ring = self._ring(session_id)
+                ring.inflight += 1
+                ring.generation = self._next_generation()
+
+    def abort(self, session_ids: Iterable[str]):
+        """The batch announced with begin() was not committed"""
+        with self._lock:
+            for session_id in set(session_ids):
+                ring = self._rings.get(session_id)
+                if ring is not None:
+                    ring.inflight = max(0, ring.inflight - 1)
+
+    def append(self, session_ids: Iterable[str], rows: List[Dict[str, Any]]):
+        """
+        The batch announced with begin(session_ids) was committed; rows
+        (event_writer row dicts) are the events actually written.
+        """
+        by_session: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_session.setdefault(row['session_id'], []).append(row)
+        arrays = {session_id: rows_to_array(session_rows) for session_id, session_rows in by_session.items()}
+        cutoff_ms = ceil_ms(datetime.utcnow() - self.retention)
+
+        with self._lock:
+            for session_id in set(session_ids):
+                ring = self._ring(session_id)
+                ring.inflight = max(0, ring.inflight - 1)
+                events = arrays.get(session_id)
+                if events is None:
+                    continue
+                before = ring.data.nbytes
+                ring.expire(cutoff_ms)
+                events = events[events['ts'] >= cutoff_ms]
+                evicted = ring.push(events, self.max_events_per_session)
+                self._bytes += ring.data.nbytes - before
+                self.counters.incr('events_appended', len(events))
+                if evicted:
+                    self.counters.incr('events_evicted', evicted)
+            self._enforce_memory_cap()
+
+    def windows(self, session_ids: Iterable[str], since: datetime, load: WindowLoader) -> Dict[str, np.ndarray]:
+        """
+        Events with ts >= since of each session: from its buffer when the buffer
+        is complete from since, otherwise from load(), whose result seeds the
+        buffer. Windows reaching further back than window_minutes bypass the
+        buffers.
+        """
+        session_ids = list(dict.fromkeys(session_ids))
+        since_ms = ceil_ms(since)
+        if since_ms < ceil_ms(datetime.utcnow() - self.retention):
+            self.counters.incr('bypassed', len(session_ids))
+            return load(session_ids)
+
+        result: Dict[str, np.ndarray] = {}
+        seed_generations: Dict[str, Optional[int]] = {}
+        with self._lock:
+            for session_id in session_ids:
+                ring = self._rings.get(session_id)
+                if ring is not None and ring.complete_from is not None and ring.complete_from <= since_ms:
+                    self._rings.move_to_end(session_id)
+                    events = ring.events()
+                    # Fancy indexing copies, so appends cannot change the result
+                    result[session_id] = events[events['ts'] >= since_ms]
+                    continue
+                # A batch in flight may commit before or after the load; don't seed from it
+                if ring is None:
+                    seed_generations[session_id] = 0
+                else:
+                    seed_generations[session_id] = None if ring.inflight else ring.generation
+            self.counters.incr('hits', len(result))
+            self.counters.incr('misses', len(seed_generations))
+
+        if not seed_generations:
+            return result
+        loaded = load(list(seed_generations))
+        result.update(loaded)
+
+        with self._lock:
+            for session_id, generation in seed_generations.items():
+                ring = self._rings.get(session_id)
+                current = 0 if ring is None else ring.generation
+                if generation is None or generation != current or session_id not in loaded:
+                    self.counters.incr('seeds_skipped')
+                    continue
+                ring = self._ring(session_id)
+                before = ring.data.nbytes
+                ring.complete_from = since_ms
+                ring.replace(loaded[session_id], self.max_events_per_session)
+                ring.generation = self._next_generation()
+                self._bytes += ring.data.nbytes - before
+                self.counters.incr('seeds')
+            self._enforce_memory_cap()
+        return result
+
+    def _next_generation(self) -> int:
+        self._generation += 1
+        return self._generation
+
+    def _ring(self, session_id: str) -> SessionRing:
+        ring = self._rings.get(session_id)
+        if ring is None:
+            ring = self._rings[session_id] = SessionRing()
+            self._bytes += ring.data.nbytes
+        else:
+            self._rings.move_to_end(session_id)
+        return ring
+
+    def _enforce_memory_cap(self):
+        for session_id in list(self._rings):
+            if self._bytes <= self.max_bytes:
+                return
+            ring = self._rings[session_id]
+            if ring.inflight:
+                # Dropping it would lose the begin() bookkeeping of a pending batch
+                continue
+            del self._rings[session_id]
+            self._bytes -= ring.data.nbytes
+            self.counters.incr('sessions_evicted')
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        with self._lock:
+            stats.update({
+                'sessions': len(self._rings),
+                'events': sum(ring.count for ring in self._rings.values()),
+                'bytes': self._bytes,
+                'occupancy': self._bytes / self.max_bytes if self.max_bytes else 0.0,
+                'hit_rate': stats.get('hits', 0) / lookups if lookups else 0.0
+            })
+        return stats
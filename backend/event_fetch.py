@@ -0,0 +1,86 @@
+"""
+Column-projected event fetch for feature extraction.
+
+fetch_event_array selects only the columns the feature kernel reads, streams
+them in chunks (a server-side cursor on PostgreSQL) and writes each chunk
+straight into a preallocated EVENT_DTYPE array, so no ORM instances, identity
+map entries or per-row dicts are created. fetch_event_arrays does the same for
+many sessions with a single query.
+"""
+
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from feature_kernel import EVENT_DTYPE, ETYPE_CODES, UNKNOWN_ETYPE, timestamps_to_ms
+from models import DBEvent
+
+FETCH_CHUNK_ROWS = 5000
+
+# Same order as EVENT_DTYPE
+_COLUMNS = (
+    DBEvent.ts, DBEvent.etype, DBEvent.duration_ms, DBEvent.delta,
+    DBEvent.velocity, DBEvent.accel, DBEvent.input_len, DBEvent.backspaces
+)
+_FLOAT_FIELDS = EVENT_DTYPE.names[2:]
+
+def fetch_event_array(db: Session, session_id: str, since: Optional[datetime] = None,
+                      chunk_rows: int = FETCH_CHUNK_ROWS) -> np.ndarray:
+    """Events of one session (optionally with ts >= since) as a ts-ordered EVENT_DTYPE array"""
+    query = select(*_COLUMNS).where(DBEvent.session_id == session_id)
+    if since is not None:
+        query = query.where(DBEvent.ts >= since)
+    events, _ = _stream(db, query.order_by(DBEvent.ts), chunk_rows)
+    return events
+
+def fetch_event_arrays(db: Session, session_ids: Iterable[str], since: Optional[datetime] = None,
+                       chunk_rows: int = FETCH_CHUNK_ROWS) -> Dict[str, np.ndarray]:
+    """
+    Events of several sessions in one IN query ordered by (session_id, ts),
+    split into one ts-ordered array per session. Sessions without events map to
+    an empty array.
+    """
+    session_ids = list(dict.fromkeys(session_ids))
+    if not session_ids:
+        return {}
+    query = select(DBEvent.session_id, *_COLUMNS).where(DBEvent.session_id.in_(session_ids))
+    if since is not None:
+        query = query.where(DBEvent.ts >= since)
+    events, owners = _stream(db, query.order_by(DBEvent.session_id, DBEvent.ts), chunk_rows, with_owner=True)
+
+    arrays = {session_id: events[:0] for session_id in session_ids}
+    start = 0
+    for session_id, group in groupby(owners):
+        end = start + sum(1 for _ in group)
+        arrays[session_id] = events[start:end]
+        start = end
+    return arrays
+
+def _stream(db: Session, query, chunk_rows: int, with_owner: bool = False) -> Tuple[np.ndarray, List[str]]:
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_rows))
+    events = np.empty(chunk_rows, dtype=EVENT_DTYPE)
+    owners: List[str] = []
+    size = 0
+    for chunk in result.partitions():
+        end = size + len(chunk)
+        if end > len(events):
+            # Grow geometrically so long sessions are copied O(log n) times
+            events = np.resize(events, max(end, 2 * len(events)))
+        columns = list(zip(*chunk))
+        if with_owner:
+            owners.extend(columns.pop(0))
+        _fill(events[size:end], columns)
+        size = end
+    return events[:size], owners
+
+def _fill(target: np.ndarray, columns: List[tuple]):
+    target['ts'] = timestamps_to_ms(columns[0], len(target))
+    codes = ETYPE_CODES
+    target['etype'] = [codes.get(etype, UNKNOWN_ETYPE) for etype in columns[1]]
+    for field, values in zip(_FLOAT_FIELDS, columns[2:]):
+        # None becomes NaN
+        target[field] = np.array(values, dtype=np.float64)
@@ -0,0 +1,80 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from models import DBEvent
+
+logger = logging.getLogger(__name__)
+
+# Column order used by the COPY path (must match the events table)
+EVENT_COLUMNS = (
+    'ts', 'session_id', 'user_hash', 'screen', 'component_id', 'etype',
+    'duration_ms', 'delta', 'velocity', 'accel', 'key_code', 'input_len',
+    'backspaces', 'meta', 'seq'
+)
+
+def event_to_row(event) -> Dict[str, Any]:
+    """Convert a TelemetryEvent into a plain row dict for the events table"""
+    return {
+        'ts': datetime.fromtimestamp(event.ts / 1000),
+        'session_id': event.session_id,
+        'user_hash': event.user_hash,
+        'screen': event.screen,
+        'component_id': event.component_id,
+        'etype': event.etype,
+        'duration_ms': event.duration_ms,
+        'delta': event.delta,
+        'velocity': event.velocity,
+        'accel': event.accel,
+        'key_code': event.key_code,
+        'input_len': event.input_len,
+        'backspaces': event.backspaces,
+        'meta': event.meta,
+        'seq': event.seq
+    }
+
+def bulk_insert_events(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Write a batch of event rows in a single round trip.
+    Uses COPY on PostgreSQL and an executemany INSERT everywhere else.
+    The caller owns the transaction and must commit.
+    """
+    if not rows:
+        return 0
+
+    if db.get_bind().dialect.name == 'postgresql':
+        _copy_events(db, rows)
+    else:
+        # Core insert against the table keeps this one executemany; the ORM
+        # bulk path would split rows into groups by which columns are NULL
+        db.execute(DBEvent.__table__.insert(), rows)
+
+    return len(rows)
+
+def _copy_events(db: Session, rows: List[Dict[str, Any]]):
+    """
+    Stream rows into the events table with psycopg COPY. Driver errors are
+    raised as the sqlalchemy.exc types execute() would raise (IntegrityError
+    for a seq conflict, OperationalError for a lost connection...), so callers
+    handle them the same way on every backend.
+    """
+    # Borrow the session's connection so COPY joins the current transaction
+    raw_connection = db.connection().connection.driver_connection
+    dialect = db.get_bind().dialect
+    statement = f"COPY events ({', '.join(EVENT_COLUMNS)}) FROM STDIN"
+
+    try:
+        with raw_connection.cursor() as cursor:
+            with cursor.copy(statement) as copy:
+                for row in rows:
+                    meta = row.get('meta')
+                    copy.write_row(tuple(
+                        json.dumps(meta) if column == 'meta' and meta is not None else row.get(column)
+                        for column in EVENT_COLUMNS
+                    ))
+    except dialect.loaded_dbapi.Error as e:
+        raise DBAPIError.instance(statement, None, e, dialect.loaded_dbapi.Error, dialect=dialect) from e
@@ -0,0 +1,156 @@
+"""
+Cache of computed feature dicts (and their scores) per session.
+A score is reused only for the model version that computed it, so a hot swap
+(model_registry.py) takes effect on cached sessions too.
+
+Entries are keyed by (session_id, window_minutes, watermark), where the
+watermark is a per-session ingest version: ingest calls invalidate() after
+committing new events for a session, which drops its entries and moves its
+watermark forward. Inserts go through bulk inserts and COPY, so the ids of new
+events are never read back; the watermark stands in for the session's last
+event id.
+
+A reader takes the watermark when it misses and hands it back with the
+computed features. If ingest invalidated the session in between, the result
+may predate the new events and is not stored. Entries also expire after
+ttl_seconds, because a realtime window changes as events age out of it, and
+because another process may have ingested events this one never saw. The
+cache is an LRU of at most max_entries.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from config import FEATURE_CACHE_MAX_ENTRIES, FEATURE_CACHE_TTL_SECONDS
+from metrics import Counters
+
+Key = Tuple[str, Optional[float]]
+
+class _Entry:
+    __slots__ = ('watermark', 'features', 'score', 'model_version', 'expires_at')
+
+    def __init__(self, watermark: int, features: Dict[str, float], expires_at: float):
+        self.watermark = watermark
+        self.features = features
+        self.score: Optional[Tuple[float, float]] = None
+        self.model_version: Optional[str] = None  # model that computed score
+        self.expires_at = expires_at
+
+class FeatureCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()  # (session_id, window) -> _Entry
+        self._windows: Dict[str, set] = {}  # session_id -> windows with an entry
+        # Watermarks of recently invalidated sessions; sessions not listed are at _floor
+        self._watermarks: OrderedDict = OrderedDict()
+        self._floor = 0
+        self._version = 0
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def lookup(self, session_ids: Iterable[str],
+               window_minutes: Optional[float] = None) -> Tuple[Dict[str, Dict[str, float]], Dict[str, int]]:
+        """Cached features for the sessions that hit, and the watermark of each miss to pass to store()"""
+        hits: Dict[str, Dict[str, float]] = {}
+        misses: Dict[str, int] = {}
+        now = time.monotonic()
+        with self._lock:
+            for session_id in dict.fromkeys(session_ids):
+                entry = self._get((session_id, window_minutes), now)
+                if entry is None:
+                    misses[session_id] = self._watermark(session_id)
+                else:
+                    hits[session_id] = entry.features
+        self.counters.incr('hits', len(hits))
+        self.counters.incr('misses', len(misses))
+        return hits, misses
+
+    def store(self, features_by_session: Dict[str, Dict[str, float]], watermarks: Dict[str, int],
+              window_minutes: Optional[float] = None):
+        """Cache features computed after lookup() returned these watermarks"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for session_id, features in features_by_session.items():
+                if watermarks.get(session_id) != self._watermark(session_id):
+                    # Invalidated while computing; the result may miss the new events
+                    self.counters.incr('stale_stores')
+                    continue
+                key = (session_id, window_minutes)
+                self._entries[key] = _Entry(watermarks[session_id], features, expires_at)
+                self._entries.move_to_end(key)
+                self._windows.setdefault(session_id, set()).add(window_minutes)
+            while len(self._entries) > self.max_entries:
+                key, _ = self._entries.popitem(last=False)
+                self._forget_window(key)
+                self.counters.incr('evictions')
+
+    def score(self, session_id: str, window_minutes: Optional[float],
+              features: Dict[str, float], model_version: Optional[str]) -> Optional[Tuple[float, float]]:
+        """The score stored for exactly these cached features by this model version, if any"""
+        with self._lock:
+            entry = self._get((session_id, window_minutes), time.monotonic())
+            if (entry is None or entry.score is None or entry.features != features
+                    or entry.model_version != model_version):
+                self.counters.incr('score_misses')
+                return None
+        self.counters.incr('score_hits')
+        return entry.score
+
+    def store_score(self, session_id: str, window_minutes: Optional[float],
+                    features: Dict[str, float], score: Tuple[float, float], model_version: Optional[str]):
+        with self._lock:
+            entry = self._entries.get((session_id, window_minutes))
+            if entry is not None and entry.features == features:
+                entry.score = score
+                entry.model_version = model_version
+
+    def invalidate(self, session_ids: Iterable[str]):
+        """New events were committed for these sessions"""
+        with self._lock:
+            for session_id in set(session_ids):
+                for window in self._windows.pop(session_id, ()):
+                    del self._entries[(session_id, window)]
+                    self.counters.incr('invalidations')
+                self._version += 1
+                self._watermarks[session_id] = self._version
+                self._watermarks.move_to_end(session_id)
+            while len(self._watermarks) > self.max_entries:
+                # A forgotten session falls back to the floor, which is past every watermark handed out for it
+                _, watermark = self._watermarks.popitem(last=False)
+                self._floor = max(self._floor, watermark)
+
+    def _watermark(self, session_id: str) -> int:
+        return self._watermarks.get(session_id, self._floor)
+
+    def _get(self, key: Key, now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= now or entry.watermark != self._watermark(key[0]):
+            del self._entries[key]
+            self._forget_window(key)
+            self.counters.incr('expirations')
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _forget_window(self, key: Key):
+        windows = self._windows.get(key[0])
+        if windows is not None:
+            windows.discard(key[1])
+            if not windows:
+                del self._windows[key[0]]
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        lookups = stats.get('hits', 0) + stats.get('misses', 0)
+        stats['hit_rate'] = stats.get('hits', 0) / lookups if lookups else 0.0
+        with self._lock:
+            stats['entries'] = len(self._entries)
+        return stats
+
+# Shared by FeatureExtractor, score_features and ingest (which invalidates)
+feature_cache = FeatureCache(max_entries=FEATURE_CACHE_MAX_ENTRIES, ttl_seconds=FEATURE_CACHE_TTL_SECONDS)
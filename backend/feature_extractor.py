@@ -1,10 +1,23 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime, timedelta
 from models import DBEvent, DBFeatures, SessionLocal
+from online_features import OnlineFeatureExtractor
+from feature_kernel import compute_features, events_to_array
+from event_fetch import fetch_event_array, fetch_event_arrays
+from event_buffers import RecentEventBuffers
+from feature_cache import feature_cache
+from feature_store import upsert_feature_vectors
+from compute_pool import ComputePool
+from config import (
+    FEATURE_WINDOW_MINUTES, ONLINE_FEATURE_COMMIT_LAG_SECONDS, ONLINE_FEATURE_MAX_SESSIONS, QUANTILE_SKETCH_K,
+    RECENT_EVENTS_MAX_BYTES, RECENT_EVENTS_MAX_PER_SESSION
+)
+import asyncio
 import uuid
 import logging
 
@@ -28,45 +41,95 @@ def convert_numpy_types(obj):
 class FeatureExtractor:
     """Extract behavioral features from telemetry events"""
     
-    def __init__(self):
+    def __init__(self, use_kernel: bool = True, use_cache: bool = True):
         self.window_size_minutes = 5  # Feature extraction window
+        # The NumPy kernel (feature_kernel.py) by default; the pandas path is the reference
+        self.use_kernel = use_kernel
+        # Results are shared through feature_cache until ingest invalidates the session
+        self.use_cache = use_cache
         
     def extract_session_features(self, session_id: str) -> Dict[str, float]:
         """Extract features for a complete session"""
+        return self._cached([session_id], None, self._compute_session_features)[session_id]
+    
+    def extract_realtime_features(self, session_id: str, window_minutes: int = 2) -> Dict[str, float]:
+        """Extract features for recent activity in a session"""
+        return self._cached(
+            [session_id], window_minutes,
+            lambda missing: {missing[0]: self._compute_realtime_features(missing[0], window_minutes)}
+        )[session_id]
+    
+    def extract_features_many(self, session_ids: List[str], window_minutes: Optional[int] = None,
+                              pool: Optional[ComputePool] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Features for several sessions from a single query ordered by (session_id, ts).
+        With window_minutes only recent activity counts, as in extract_realtime_features.
+        With a ComputePool the kernel runs in its worker processes.
+        """
+        return self._cached(
+            session_ids, window_minutes, lambda missing: self._compute_many(missing, window_minutes, pool)
+        )
+    
+    async def extract_features_many_async(self, session_ids: List[str], window_minutes: Optional[int] = None,
+                                          pool: Optional[ComputePool] = None) -> Dict[str, Dict[str, float]]:
+        """
+        extract_features_many for async handlers: events are loaded in a thread
+        and the kernel runs in the pool, so the event loop is not blocked.
+        """
+        if self.use_cache:
+            features, watermarks = feature_cache.lookup(session_ids, window_minutes)
+            missing = list(watermarks)
+        else:
+            features, watermarks, missing = {}, {}, list(session_ids)
+        if not missing:
+            return features
+        
+        if self.use_kernel and pool is not None:
+            arrays = await asyncio.to_thread(self._load_arrays, missing, window_minutes)
+            computed = await pool.features_async(arrays)
+        else:
+            computed = await asyncio.to_thread(self._compute_many, missing, window_minutes)
+        if self.use_cache:
+            feature_cache.store(computed, watermarks, window_minutes)
+        features.update(computed)
+        return features
+    
+    def _cached(self, session_ids: List[str], window_minutes: Optional[int],
+                compute: Callable[[List[str]], Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+        """Features from feature_cache, computing and caching the sessions that miss"""
+        if not self.use_cache:
+            return compute(list(session_ids))
+        features, watermarks = feature_cache.lookup(session_ids, window_minutes)
+        if watermarks:
+            computed = compute(list(watermarks))
+            feature_cache.store(computed, watermarks, window_minutes)
+            features.update(computed)
+        return features
+    
+    def _compute_session_features(self, session_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        session_id = session_ids[0]
         db = SessionLocal()
         try:
+            if self.use_kernel:
+                return {session_id: compute_features(fetch_event_array(db, session_id))}
+            
             events = db.query(DBEvent).filter(
                 DBEvent.session_id == session_id
             ).order_by(DBEvent.ts).all()
             
-            if not events:
-                return {}
-            
-            # Convert to DataFrame for easier processing
-            df = pd.DataFrame([{
-                'ts': event.ts,
-                'etype': event.etype,
-                'duration_ms': event.duration_ms,
-                'delta': event.delta,
-                'velocity': event.velocity,
-                'accel': event.accel,
-                'input_len': event.input_len,
-                'backspaces': event.backspaces,
-                'screen': event.screen,
-                'component_id': event.component_id
-            } for event in events])
-            
-            return self._extract_features_from_df(df)
+            return {session_id: self._features_from_events(events)}
             
         finally:
             db.close()
     
-    def extract_realtime_features(self, session_id: str, window_minutes: int = 2) -> Dict[str, float]:
-        """Extract features for recent activity in a session"""
+    def _compute_realtime_features(self, session_id: str, window_minutes: int) -> Dict[str, float]:
         db = SessionLocal()
         try:
             cutoff_time = datetime.utcnow() - timedelta(minutes=window_minutes)
             
+            if self.use_kernel:
+                return compute_features(self._recent_windows(db, [session_id], cutoff_time)[session_id])
+            
             events = db.query(DBEvent).filter(
                 and_(
                     DBEvent.session_id == session_id,
@@ -74,28 +137,67 @@ class FeatureExtractor:
                 )
             ).order_by(DBEvent.ts).all()
             
-            if not events:
-                return {}
-            
-            # Convert to DataFrame
-            df = pd.DataFrame([{
-                'ts': event.ts,
-                'etype': event.etype,
-                'duration_ms': event.duration_ms,
-                'delta': event.delta,
-                'velocity': event.velocity,
-                'accel': event.accel,
-                'input_len': event.input_len,
-                'backspaces': event.backspaces,
-                'screen': event.screen,
-                'component_id': event.component_id
-            } for event in events])
-            
-            return self._extract_features_from_df(df)
+            return self._features_from_events(events)
             
         finally:
             db.close()
     
+    def _compute_many(self, session_ids: List[str], window_minutes: Optional[int],
+                      pool: Optional[ComputePool] = None) -> Dict[str, Dict[str, float]]:
+        if not self.use_kernel:
+            if window_minutes is None:
+                return {
+                    session_id: self._compute_session_features([session_id])[session_id]
+                    for session_id in session_ids
+                }
+            return {
+                session_id: self._compute_realtime_features(session_id, window_minutes)
+                for session_id in session_ids
+            }
+        
+        arrays = self._load_arrays(session_ids, window_minutes)
+        if pool is not None:
+            return pool.features(arrays)
+        return {session_id: compute_features(events) for session_id, events in arrays.items()}
+    
+    def _load_arrays(self, session_ids: List[str], window_minutes: Optional[int]) -> Dict[str, np.ndarray]:
+        since = datetime.utcnow() - timedelta(minutes=window_minutes) if window_minutes is not None else None
+        db = SessionLocal()
+        try:
+            if since is None:
+                return fetch_event_arrays(db, session_ids)
+            return self._recent_windows(db, session_ids, since)
+        finally:
+            db.close()
+    
+    def _recent_windows(self, db: Session, session_ids: List[str], since: datetime) -> Dict[str, np.ndarray]:
+        """Event arrays since a recent cutoff, from the in-memory buffers where they are complete"""
+        return recent_events.windows(session_ids, since, lambda missing: fetch_event_arrays(db, missing, since=since))
+    
+    def _features_from_events(self, events: List[DBEvent]) -> Dict[str, float]:
+        """Compute features for ts-ordered events with the kernel or the pandas path"""
+        if not events:
+            return {}
+        
+        if self.use_kernel:
+            return compute_features(events_to_array(events))
+        
+        # Convert to DataFrame for easier processing
+        df = pd.DataFrame([{
+            'ts': event.ts,
+            'etype': event.etype,
+            'duration_ms': event.duration_ms,
+            'delta': event.delta,
+            'velocity': event.velocity,
+            'accel': event.accel,
+            'input_len': event.input_len,
+            'backspaces': event.backspaces,
+            'screen': event.screen,
+            'component_id': event.component_id
+        } for event in events])
+        
+        return self._extract_features_from_df(df)
+    
     def _extract_features_from_df(self, df: pd.DataFrame) -> Dict[str, float]:
         """Extract features from event DataFrame"""
         if df.empty:
@@ -329,50 +431,106 @@ class FeatureExtractor:
         
         return features
 
+# Running per-session aggregates, so each batch only reads the session's new events
+# Medians and p95 come from bounded-memory quantile sketches (quantile_sketch.py)
+online_extractor = OnlineFeatureExtractor(
+    max_sessions=ONLINE_FEATURE_MAX_SESSIONS, sketch_k=QUANTILE_SKETCH_K,
+    commit_lag_seconds=ONLINE_FEATURE_COMMIT_LAG_SECONDS
+)
+
+# Recent events per session, appended by ingest, so realtime windows rarely hit the database
+recent_events = RecentEventBuffers(
+    window_minutes=FEATURE_WINDOW_MINUTES,
+    max_events_per_session=RECENT_EVENTS_MAX_PER_SESSION,
+    max_bytes=RECENT_EVENTS_MAX_BYTES
+)
+
 def compute_and_store_features(session_id: str) -> bool:
     """Compute features for a session and store in database"""
+    return session_id in compute_and_store_features_many([session_id])
+
+def store_features(db: Session, features_by_session: Dict[str, Dict[str, float]],
+                   sketches_by_session: Optional[Dict[str, Dict[str, Any]]] = None):
+    """
+    Upsert features rows and their feature store rows for several sessions
+    and commit. Serialized quantile sketches, when given, are stored alongside
+    so percentiles can be merged across windows or sessions later
+    (KLLSketch.from_dict / merge).
+    """
+    for attempt in range(2):
+        try:
+            _store_features(db, features_by_session, sketches_by_session or {})
+            return
+        except IntegrityError:
+            # Another worker inserted one of these sessions first; retry as an update
+            db.rollback()
+            if attempt:
+                raise
+
+def _store_features(db: Session, features_by_session: Dict[str, Dict[str, float]],
+                    sketches_by_session: Dict[str, Dict[str, Any]]):
+    # Check which sessions already have features
+    existing = {
+        row.session_id: row for row in
+        db.query(DBFeatures).filter(DBFeatures.session_id.in_(list(features_by_session))).all()
+    }
+    computed_at = datetime.utcnow()
+    
+    for session_id, features in features_by_session.items():
+        # Convert numpy types to JSON-serializable types
+        json_features = convert_numpy_types(features)
+        if session_id in existing:
+            # Update existing features
+            existing[session_id].f = json_features
+            existing[session_id].computed_at = computed_at
+            existing[session_id].sketches = sketches_by_session.get(session_id)
+        else:
+            # Create new features record
+            db.add(DBFeatures(
+                session_id=session_id,
+                computed_at=computed_at,
+                f=json_features,
+                sketches=sketches_by_session.get(session_id)
+            ))
+    upsert_feature_vectors(db, features_by_session, computed_at)
+    
+    db.commit()
+
+def compute_and_store_features_many(session_ids: List[str]) -> List[str]:
+    """
+    Compute features for several sessions with one event query and store them
+    in one transaction. Returns the sessions whose features were stored.
+    """
     try:
-        extractor = FeatureExtractor()
-        features = extractor.extract_session_features(session_id)
+        summaries = online_extractor.session_summaries_many(session_ids)
+        features_by_session = {session_id: features for session_id, (features, _) in summaries.items()}
         
-        if not features:
-            logger.warning(f"No features extracted for session {session_id}")
-            return False
+        stored = []
+        for session_id, features in features_by_session.items():
+            if features:
+                stored.append(session_id)
+            else:
+                logger.warning(f"No features extracted for session {session_id}")
+        if not stored:
+            return []
         
         # Store features in database
         db = SessionLocal()
         try:
-            # Convert numpy types to JSON-serializable types
-            json_features = convert_numpy_types(features)
-            
-            # Check if features already exist
-            existing = db.query(DBFeatures).filter(
-                DBFeatures.session_id == session_id
-            ).first()
-            
-            if existing:
-                # Update existing features
-                existing.f = json_features
-                existing.computed_at = datetime.utcnow()
-            else:
-                # Create new features record
-                db_features = DBFeatures(
-                    session_id=session_id,
-                    computed_at=datetime.utcnow(),
-                    f=json_features
-                )
-                db.add(db_features)
-            
-            db.commit()
-            logger.info(f"Features computed and stored for session {session_id}")
-            return True
+            store_features(
+                db,
+                {session_id: features_by_session[session_id] for session_id in stored},
+                {session_id: summaries[session_id][1] for session_id in stored}
+            )
+            logger.debug("Features computed and stored for %d sessions", len(stored))
+            return stored
             
         finally:
             db.close()
             
     except Exception as e:
-        logger.error(f"Error computing features for session {session_id}: {e}")
-        return False
+        logger.error(f"Error computing features for sessions {session_ids}: {e}")
+        return []
 
 if __name__ == "__main__":
     # Test feature extraction
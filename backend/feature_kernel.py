@@ -0,0 +1,277 @@
+"""
+Vectorized feature kernel.
+
+compute_features takes a session's events as one structured NumPy array
+(EVENT_DTYPE: ts as int64 milliseconds, etype as an int8 code, numeric columns
+as float64 with NaN for missing values) and computes the same feature dict as
+FeatureExtractor._extract_features_from_df with per-type masks and np.diff,
+without building a DataFrame. The pandas implementation is kept as the
+reference; benchmarks/bench_feature_kernel.py checks parity and speed.
+"""
+
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+ETYPES = ['SCROLL', 'TAP', 'TYPE', 'LONG_PRESS', 'PAUSE', 'FOCUS_CHANGE']
+ETYPE_CODES = {etype: code for code, etype in enumerate(ETYPES)}
+UNKNOWN_ETYPE = -1
+
+SCROLL, TAP, TYPE, PAUSE = (ETYPE_CODES[etype] for etype in ('SCROLL', 'TAP', 'TYPE', 'PAUSE'))
+
+# Model input columns, in order: a subset of compute_features' keys. The model
+# (ml_model.py) and the feature store (models.DBFeatureVector, one typed column
+# per name) both use this list.
+FEATURE_NAMES = [
+    'scroll_count', 'tap_count', 'type_count', 'long_press_count', 'pause_count',
+    'scroll_ratio', 'tap_ratio', 'type_ratio', 'pause_ratio',
+    'total_events', 'session_duration_seconds', 'events_per_second',
+    'scroll_velocity_mean', 'scroll_velocity_std', 'scroll_velocity_max',
+    'scroll_accel_mean', 'scroll_accel_std', 'scroll_direction_changes',
+    'scroll_burst_count', 'typing_speed_chars_per_min', 'backspace_ratio',
+    'typing_burst_count', 'inter_key_interval_mean', 'inter_key_interval_std',
+    'typing_rhythm_entropy', 'tap_frequency', 'tap_interval_mean',
+    'tap_interval_std', 'rapid_tap_sequences', 'temporal_regularity',
+    'activity_density', 'pause_duration_mean', 'pause_duration_max',
+    'long_pause_count'
+]
+
+# Thresholds shared with FeatureExtractor
+SCROLL_BURST_SECONDS = 0.1
+TYPING_BURST_SECONDS = 0.2
+RAPID_TAP_SECONDS = 0.5
+LONG_PAUSE_MS = 2000
+
+EVENT_DTYPE = np.dtype([
+    ('ts', 'i8'),
+    ('etype', 'i1'),
+    ('duration_ms', 'f8'),
+    ('delta', 'f8'),
+    ('velocity', 'f8'),
+    ('accel', 'f8'),
+    ('input_len', 'f8'),
+    ('backspaces', 'f8'),
+])
+
+# ts values are naive datetimes; only differences between them matter
+_EPOCH = datetime(1970, 1, 1)
+_MILLISECOND = timedelta(milliseconds=1)
+
+def timestamps_to_ms(values, count: int = -1) -> np.ndarray:
+    """int64 milliseconds for an iterable of naive datetimes"""
+    return np.fromiter(((ts - _EPOCH) // _MILLISECOND for ts in values), dtype=np.int64, count=count)
+
+def events_to_array(events: Iterable[Any]) -> np.ndarray:
+    """Build an EVENT_DTYPE array from objects with DBEvent attribute names"""
+    nan = math.nan
+    codes = ETYPE_CODES
+    return np.array([(
+        (event.ts - _EPOCH) // _MILLISECOND,
+        codes.get(event.etype, UNKNOWN_ETYPE),
+        nan if event.duration_ms is None else event.duration_ms,
+        nan if event.delta is None else event.delta,
+        nan if event.velocity is None else event.velocity,
+        nan if event.accel is None else event.accel,
+        nan if event.input_len is None else event.input_len,
+        nan if event.backspaces is None else event.backspaces
+    ) for event in events], dtype=EVENT_DTYPE)
+
+def rows_to_array(rows: Iterable[Dict[str, Any]]) -> np.ndarray:
+    """Build an EVENT_DTYPE array from event row dicts (event_writer.event_to_row)"""
+    nan = math.nan
+    codes = ETYPE_CODES
+    return np.array([(
+        (row['ts'] - _EPOCH) // _MILLISECOND,
+        codes.get(row['etype'], UNKNOWN_ETYPE),
+        nan if row.get('duration_ms') is None else row['duration_ms'],
+        nan if row.get('delta') is None else row['delta'],
+        nan if row.get('velocity') is None else row['velocity'],
+        nan if row.get('accel') is None else row['accel'],
+        nan if row.get('input_len') is None else row['input_len'],
+        nan if row.get('backspaces') is None else row['backspaces']
+    ) for row in rows], dtype=EVENT_DTYPE)
+
+def rhythm_edges(mn: float, mx: float, bins: int = 10) -> np.ndarray:
+    """Bin edges pd.cut(values, bins) uses for values spanning [mn, mx]"""
+    if mn == mx:
+        mn -= 0.001 * abs(mn) if mn != 0 else 0.001
+        mx += 0.001 * abs(mx) if mx != 0 else 0.001
+        edges = np.linspace(mn, mx, bins + 1)
+    else:
+        edges = np.linspace(mn, mx, bins + 1)
+        edges[0] -= (mx - mn) * 0.001
+    return np.unique(edges)
+
+def entropy_of_counts(counts: np.ndarray) -> float:
+    probs = counts / counts.sum()
+    return float(-np.sum(probs * np.log2(probs + 1e-10)))
+
+def rhythm_entropy(intervals, bins: int = 10) -> float:
+    """Entropy of intervals binned like pd.cut(intervals, bins=10)"""
+    values = np.asarray(intervals, dtype=float)
+    edges = rhythm_edges(values.min(), values.max(), bins)
+    # Right-closed bins: (edges[i-1], edges[i]]
+    ids = np.searchsorted(edges, values, side='left')
+    counts = np.bincount(ids[(ids > 0) & (ids < len(edges))] - 1, minlength=len(edges) - 1)
+    return entropy_of_counts(counts)
+
+def _std(values: np.ndarray) -> float:
+    # Sample standard deviation; NaN below two values, like pandas
+    return float(values.std(ddof=1)) if len(values) > 1 else math.nan
+
+def _present(values: np.ndarray) -> np.ndarray:
+    return values[~np.isnan(values)]
+
+def compute_features(events: np.ndarray) -> Dict[str, float]:
+    """Feature dict for one session's EVENT_DTYPE array"""
+    if len(events) == 0:
+        return {}
+    ts = events['ts']
+    if np.any(ts[1:] < ts[:-1]):
+        events = events[np.argsort(ts, kind='stable')]
+        ts = events['ts']
+    etype = events['etype']
+    masks = {code: etype == code for code in (SCROLL, TAP, TYPE, PAUSE)}
+
+    features = {}
+    features.update(_basic_features(ts, etype))
+    features.update(_scroll_features(events[masks[SCROLL]]))
+    features.update(_typing_features(events[masks[TYPE]]))
+    features.update(_tap_features(ts[masks[TAP]]))
+    features.update(_temporal_features(ts))
+    features.update(_pause_features(events['duration_ms'][masks[PAUSE]], int(masks[PAUSE].sum())))
+    return features
+
+def _basic_features(ts: np.ndarray, etype: np.ndarray) -> Dict[str, float]:
+    features = {}
+    total_events = len(ts)
+    counts = np.bincount(etype[etype >= 0], minlength=len(ETYPES))
+    for code, name in enumerate(ETYPES):
+        features[f'{name.lower()}_count'] = int(counts[code])
+        features[f'{name.lower()}_ratio'] = int(counts[code]) / max(total_events, 1)
+    features['total_events'] = total_events
+    if total_events > 1:
+        duration_seconds = (ts[-1] - ts[0]) / 1000
+        features['session_duration_seconds'] = duration_seconds
+        features['events_per_second'] = total_events / max(duration_seconds, 1)
+    else:
+        features['session_duration_seconds'] = 0
+        features['events_per_second'] = 0
+    return features
+
+def _scroll_features(scroll: np.ndarray) -> Dict[str, float]:
+    if len(scroll) == 0:
+        return {
+            'scroll_velocity_mean': 0,
+            'scroll_velocity_std': 0,
+            'scroll_velocity_max': 0,
+            'scroll_accel_mean': 0,
+            'scroll_accel_std': 0,
+            'scroll_direction_changes': 0,
+            'scroll_burst_count': 0
+        }
+    features = {}
+    velocities = _present(scroll['velocity'])
+    if len(velocities):
+        features['scroll_velocity_mean'] = float(velocities.mean())
+        features['scroll_velocity_std'] = _std(velocities)
+        features['scroll_velocity_max'] = float(velocities.max())
+        features['scroll_velocity_p95'] = float(np.quantile(velocities, 0.95))
+    accelerations = _present(scroll['accel'])
+    if len(accelerations):
+        features['scroll_accel_mean'] = float(accelerations.mean())
+        features['scroll_accel_std'] = _std(accelerations)
+        features['scroll_accel_max'] = float(accelerations.max())
+    deltas = _present(scroll['delta'])
+    if len(deltas) > 1:
+        features['scroll_direction_changes'] = int(np.count_nonzero(np.diff(np.sign(deltas))))
+    features['scroll_burst_count'] = int(np.count_nonzero(np.diff(scroll['ts']) / 1000 < SCROLL_BURST_SECONDS))
+    return features
+
+def _typing_features(typing: np.ndarray) -> Dict[str, float]:
+    if len(typing) == 0:
+        return {
+            'typing_speed_chars_per_min': 0,
+            'backspace_ratio': 0,
+            'typing_burst_count': 0,
+            'inter_key_interval_mean': 0,
+            'inter_key_interval_std': 0,
+            'typing_rhythm_entropy': 0
+        }
+    features = {}
+    intervals = np.diff(typing['ts']) / 1000
+    if len(intervals):
+        features['inter_key_interval_mean'] = float(intervals.mean())
+        features['inter_key_interval_std'] = _std(intervals)
+        features['inter_key_interval_median'] = float(np.median(intervals))
+        features['typing_rhythm_entropy'] = rhythm_entropy(intervals)
+
+    input_len = typing['input_len']
+    total_backspaces = float(np.nansum(typing['backspaces']))
+    present_len = _present(input_len)
+    total_chars = float(present_len.max()) if len(present_len) else math.nan
+    features['backspace_ratio'] = total_backspaces / max(total_chars + total_backspaces, 1)
+    features['total_backspaces'] = total_backspaces
+
+    if len(intervals):
+        features['typing_burst_count'] = int(np.count_nonzero(intervals < TYPING_BURST_SECONDS))
+    if len(typing) > 1:
+        duration_minutes = (typing['ts'][-1] - typing['ts'][0]) / 1000 / 60
+        chars_typed = float(np.nansum(np.diff(input_len)))
+        features['typing_speed_chars_per_min'] = chars_typed / max(duration_minutes, 0.01)
+    return features
+
+def _tap_features(tap_ts: np.ndarray) -> Dict[str, float]:
+    if len(tap_ts) == 0:
+        return {
+            'tap_frequency': 0,
+            'tap_interval_mean': 0,
+            'tap_interval_std': 0,
+            'rapid_tap_sequences': 0
+        }
+    features = {}
+    intervals = np.diff(tap_ts) / 1000
+    if len(intervals):
+        features['tap_interval_mean'] = float(intervals.mean())
+        features['tap_interval_std'] = _std(intervals)
+        features['tap_interval_median'] = float(np.median(intervals))
+        features['rapid_tap_sequences'] = int(np.count_nonzero(intervals < RAPID_TAP_SECONDS))
+    if len(tap_ts) > 1:
+        duration_seconds = (tap_ts[-1] - tap_ts[0]) / 1000
+        features['tap_frequency'] = len(tap_ts) / max(duration_seconds, 1)
+    return features
+
+def _temporal_features(ts: np.ndarray) -> Dict[str, float]:
+    if len(ts) < 2:
+        return {'temporal_regularity': 0, 'activity_density': 0}
+    intervals = np.diff(ts) / 1000
+    cv = _std(intervals) / max(float(intervals.mean()), 0.001)
+    total_duration = (ts[-1] - ts[0]) / 1000 / 60
+    return {
+        'temporal_regularity': 1 / (1 + cv),
+        'activity_density': len(ts) / max(total_duration, 0.01)
+    }
+
+def _pause_features(durations: np.ndarray, pause_count: int) -> Dict[str, float]:
+    if pause_count == 0:
+        return {
+            'pause_count': 0,
+            'pause_duration_mean': 0,
+            'pause_duration_max': 0,
+            'long_pause_count': 0
+        }
+    durations = _present(durations)
+    if not len(durations):
+        return {}
+    long_pauses = int(np.count_nonzero(durations > LONG_PAUSE_MS))
+    return {
+        'pause_count': len(durations),
+        'pause_duration_mean': float(durations.mean()),
+        'pause_duration_std': _std(durations),
+        'pause_duration_max': float(durations.max()),
+        'pause_duration_median': float(np.median(durations)),
+        'long_pause_count': long_pauses,
+        'long_pause_ratio': long_pauses / len(durations)
+    }
@@ -0,0 +1,100 @@
+"""
+Typed feature store: one float column per model feature (models.DBFeatureVector).
+
+DBFeatures.f keeps each session's full feature document as JSON, so reading
+model inputs for many sessions means decoding every blob and filtering on a
+feature means scanning them all. The feature store keeps the model's inputs
+in FEATURE_NAMES order as columns that SQL can filter and that load into a
+(sessions x features) float64 array without per-row dicts.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from feature_kernel import FEATURE_NAMES
+from models import DBFeatures, DBFeatureVector, FEATURE_STORE_VERSION, engine, feature_vector_values
+
+_table = DBFeatureVector.__table__
+_value_columns = [_table.c[name] for name in FEATURE_NAMES]
+
+def upsert_feature_vectors(db: Session, features_by_session: Dict[str, Dict[str, Any]],
+                           computed_at: Optional[datetime] = None):
+    """Replace the feature store rows of these sessions; the caller commits"""
+    if not features_by_session:
+        return
+    computed_at = computed_at or datetime.utcnow()
+    db.execute(delete(_table).where(_table.c.session_id.in_(list(features_by_session))))
+    db.execute(insert(_table), [
+        {
+            'session_id': session_id,
+            'schema_version': FEATURE_STORE_VERSION,
+            'computed_at': computed_at,
+            **feature_vector_values(features)
+        }
+        for session_id, features in features_by_session.items()
+    ])
+
+def load_feature_vectors(db: Session, session_ids: Optional[List[str]] = None,
+                         where: Any = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Session ids and their feature vectors as a (len(ids), len(FEATURE_NAMES))
+    float64 array, NaN where a feature is NULL. Restrict to session_ids and/or
+    a SQL condition on the columns, e.g. DBFeatureVector.tap_count > 10.
+    Sessions without a row are left out.
+    """
+    query = select(_table.c.session_id, *_value_columns).where(
+        _table.c.schema_version == FEATURE_STORE_VERSION
+    )
+    if session_ids is not None:
+        query = query.where(_table.c.session_id.in_(list(session_ids)))
+    if where is not None:
+        query = query.where(where)
+    rows = db.execute(query).all()
+    if not rows:
+        return [], np.empty((0, len(FEATURE_NAMES)))
+    ids = [row[0] for row in rows]
+    # None converts to NaN in a float array
+    vectors = np.array([row[1:] for row in rows], dtype=np.float64)
+    return ids, vectors
+
+def backfill_feature_store(chunk_size: int = 1000) -> int:
+    """
+    Fill the feature store from DBFeatures.f for sessions missing there or
+    stored at an older FEATURE_STORE_VERSION; returns the rows written. Run once
+    after a deploy that changes FEATURE_NAMES (python backfill.py --feature-store),
+    not at startup, so workers do not race each other on the same rows.
+    """
+    features = DBFeatures.__table__
+    stale = (
+        select(features.c.session_id, features.c.computed_at, features.c.f)
+        .outerjoin(_table, _table.c.session_id == features.c.session_id)
+        .where(or_(_table.c.session_id.is_(None), _table.c.schema_version < FEATURE_STORE_VERSION))
+        .limit(chunk_size)
+    )
+    written = 0
+    while True:
+        try:
+            with engine.begin() as conn:
+                rows = conn.execute(stale).all()
+                if not rows:
+                    return written
+                conn.execute(delete(_table).where(_table.c.session_id.in_([row.session_id for row in rows])))
+                conn.execute(insert(_table), [
+                    {
+                        'session_id': row.session_id,
+                        'schema_version': FEATURE_STORE_VERSION,
+                        'computed_at': row.computed_at,
+                        **feature_vector_values(row.f or {})
+                    }
+                    for row in rows
+                ])
+        except IntegrityError:
+            # Live ingest upserted some of these sessions meanwhile; they are current
+            # now, so the next query leaves them out
+            continue
+        written += len(rows)
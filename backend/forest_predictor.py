@@ -0,0 +1,127 @@
+"""
+Flattened-array random forest predictor.
+
+RandomForestRegressor.predict validates its input and dispatches the trees to
+a thread pool on every call, which costs milliseconds even for one row.
+FlatForest exports a trained forest (and the StandardScaler in front of it)
+into flat NumPy arrays: every tree's nodes concatenated, with absolute child
+indices, and each tree's root. Prediction walks all trees for all rows at
+once, one vectorized step per level of depth, and returns the mean and
+variance of the trees' predictions (the forest's prediction and the spread
+InterestScoreModel turns into confidence).
+
+Leaves point to themselves, so rows that reach a leaf early stay there while
+deeper trees finish. Features are compared as float32 against float64
+thresholds, exactly as sklearn's trees do, so the result matches sklearn
+bit for bit; InterestScoreModel checks this when it exports a model.
+
+save() writes each array as a .npy file next to a meta.json; load() maps them
+read-only (np.load mmap_mode='r'), so every process serving the same export
+shares one copy of the forest in the page cache instead of unpickling its own.
+"""
+
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots', 'mean', 'scale')
+META_FILE = "meta.json"
+
+class FlatForest:
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 value: np.ndarray, roots: np.ndarray, max_depth: int,
+                 mean: Optional[np.ndarray] = None, scale: Optional[np.ndarray] = None):
+        self.feature = feature      # split feature of each node (0 at leaves)
+        self.threshold = threshold  # go left when x[feature] <= threshold
+        # Absolute left and right child of node i at 2i and 2i + 1, so one
+        # gather picks the child; leaves point to themselves
+        self.children = children
+        self.value = value          # node predictions; only leaves are reached at the end
+        self.roots = roots          # root node of each tree
+        self.max_depth = max_depth
+        self.mean = mean            # StandardScaler parameters applied before the trees
+        self.scale = scale
+
+    @classmethod
+    def from_model(cls, forest, scaler=None) -> "FlatForest":
+        """Export a fitted single-output forest regressor and, optionally, its StandardScaler"""
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        features, thresholds, lefts, rights = [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            nodes = np.arange(tree.node_count)
+            is_leaf = tree.children_left < 0
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, nodes, tree.children_right) + offset)
+        mean = scale = None
+        if scaler is not None:
+            mean = scaler.mean_ if scaler.with_mean else None
+            scale = scaler.scale_ if scaler.with_std else None
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.column_stack([np.concatenate(lefts), np.concatenate(rights)]).ravel().astype(np.intp),
+            value=np.concatenate([tree.value[:, 0, 0] for tree in trees]).astype(np.float64),
+            roots=offsets.astype(np.intp),
+            max_depth=max(tree.max_depth for tree in trees),
+            mean=mean,
+            scale=scale
+        )
+
+    def save(self, directory: str, meta: Optional[Dict[str, Any]] = None):
+        """Write the arrays as .npy files and meta.json (max_depth plus `meta`) to directory"""
+        os.makedirs(directory, exist_ok=True)
+        for name in _ARRAYS:
+            array = getattr(self, name)
+            path = os.path.join(directory, f"{name}.npy")
+            if array is not None:
+                np.save(path, np.ascontiguousarray(array))
+            elif os.path.exists(path):
+                os.remove(path)
+        # meta.json last: its presence marks a complete export
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump({**(meta or {}), 'max_depth': self.max_depth}, f)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> Tuple["FlatForest", Dict[str, Any]]:
+        """Load an export written by save(), memory-mapped by default; returns (forest, meta)"""
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in _ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            # asarray drops the np.memmap subclass (and its per-operation overhead), not the mapping
+            arrays[name] = np.asarray(np.load(path, mmap_mode=mmap_mode)) if os.path.exists(path) else None
+        return cls(max_depth=meta['max_depth'], **arrays), meta
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Apply the exported StandardScaler (same operations as its transform)"""
+        X = np.array(X, dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+    def tree_predictions(self, X: np.ndarray) -> np.ndarray:
+        """Prediction of every tree for every row of unscaled X, shape (n_trees, n_rows)"""
+        X = self.transform(np.atleast_2d(X)).astype(np.float32)
+        n_rows, n_features = X.shape
+        values = X.ravel()
+        # Offset of each row's features in the flattened X
+        row_starts = np.arange(n_rows) * n_features
+        node = np.repeat(self.roots[:, None], n_rows, axis=1)
+        for _ in range(self.max_depth):
+            x = values[row_starts + self.feature[node]]
+            # Not x <= threshold (inputs have no NaN): 0 picks the left child, 1 the right
+            node = self.children[2 * node + (x > self.threshold[node])]
+        return self.value[node]
+
+    def predict(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and variance of the trees' predictions for each row of unscaled X"""
+        tree_predictions = self.tree_predictions(X)
+        return tree_predictions.mean(axis=0), np.var(tree_predictions, axis=0)
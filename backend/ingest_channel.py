@@ -0,0 +1,51 @@
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import Counters
+
+# Shared counters for all telemetry WebSocket connections
+counters = Counters()
+
+class IngestBuffer:
+    """
+    Accumulates events received on one telemetry WebSocket until either
+    max_events rows are buffered or the oldest buffered frame is max_delay
+    seconds old, so many small frames become one bulk write.
+    """
+
+    def __init__(self, max_events: int, max_delay: float):
+        self.max_events = max_events
+        self.max_delay = max_delay
+        self._rows: List[Dict[str, Any]] = []
+        self._frame_ids: List[Any] = []
+        self._first_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, frame_id: Any, rows: List[Dict[str, Any]]):
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._rows.extend(rows)
+        self._frame_ids.append(frame_id)
+
+    def should_flush(self) -> bool:
+        return bool(self._frame_ids) and (
+            len(self._rows) >= self.max_events or self.time_until_flush() <= 0
+        )
+
+    def time_until_flush(self) -> Optional[float]:
+        """Seconds until the age limit is reached, or None when empty"""
+        if self._first_at is None:
+            return None
+        return max(0.0, self._first_at + self.max_delay - time.monotonic())
+
+    def drain(self) -> Tuple[List[Any], List[Dict[str, Any]]]:
+        frame_ids, rows = self._frame_ids, self._rows
+        self._frame_ids, self._rows, self._first_at = [], [], None
+        return frame_ids, rows
+
+def stats() -> Dict[str, Any]:
+    snapshot = counters.snapshot()
+    snapshot['open_connections'] = snapshot.get('connections_opened', 0) - snapshot.get('connections_closed', 0)
+    return snapshot
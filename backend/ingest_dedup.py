@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from metrics import Counters
+from models import DBEvent, DBIngestBatch
+
+class BatchDeduplicator:
+    """
+    Detect replayed ingest batches and events.
+
+    Recent batch ids are kept in a bounded in-memory LRU so most retries are
+    acknowledged without touching the database. The ingest_batches primary key
+    is the source of truth across restarts and workers, and the unique
+    (session_id, seq) index on events catches individual replayed events.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._recent: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def seen_recently(self, batch_id: str) -> bool:
+        with self._lock:
+            if batch_id in self._recent:
+                self._recent.move_to_end(batch_id)
+                return True
+            return False
+
+    def remember(self, batch_id: str):
+        with self._lock:
+            self._recent[batch_id] = True
+            self._recent.move_to_end(batch_id)
+            while len(self._recent) > self.capacity:
+                self._recent.popitem(last=False)
+
+    def claim_batch(self, db: Session, batch_id: str, event_count: int) -> bool:
+        """
+        Record the batch id inside the caller's transaction.
+        Returns False (after rolling back) if the batch was already stored.
+        """
+        db.add(DBIngestBatch(batch_id=batch_id, received_at=datetime.utcnow(), event_count=event_count))
+        try:
+            db.flush()
+        except IntegrityError:
+            db.rollback()
+            return False
+        return True
+
+    def drop_duplicate_events(self, db: Session, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Remove rows whose (session_id, seq) is repeated in the batch or already stored"""
+        sequenced = [row for row in rows if row.get('seq') is not None]
+        if not sequenced:
+            return rows
+
+        seqs = [row['seq'] for row in sequenced]
+        stored = set(db.execute(
+            select(DBEvent.session_id, DBEvent.seq).where(
+                DBEvent.session_id.in_({row['session_id'] for row in sequenced}),
+                DBEvent.seq.between(min(seqs), max(seqs))
+            )
+        ).tuples())
+
+        fresh = []
+        for row in rows:
+            if row.get('seq') is not None:
+                key = (row['session_id'], row['seq'])
+                if key in stored:
+                    continue
+                stored.add(key)
+            fresh.append(row)
+        return fresh
+
+    def record(self, events: int, duplicate_events: int, duplicate_batch: bool = False):
+        self.counters.incr('batches')
+        self.counters.incr('events', events)
+        self.counters.incr('duplicate_events', duplicate_events)
+        if duplicate_batch:
+            self.counters.incr('duplicate_batches')
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        stats['duplicate_rate'] = stats.get('duplicate_events', 0) / max(stats.get('events', 0), 1)
+        stats['duplicate_batch_rate'] = stats.get('duplicate_batches', 0) / max(stats.get('batches', 0), 1)
+        stats['recent_batch_ids'] = len(self._recent)
+        return stats
@@ -0,0 +1,129 @@
+"""
+Non-blocking, rate-limited logging for the API process.
+
+Records are handed to a bounded queue by a QueueHandler and written by a
+QueueListener thread, so request handlers never block on log I/O; when the
+queue is full records are dropped and counted. Below WARNING, every call site
+(file and line) gets its own token bucket, and a call site can additionally ask
+to be sampled with `extra={"sample": 0.1}`. The level can be changed at runtime
+with set_level().
+"""
+
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from metrics import Counters
+
+counters = Counters()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of waiting on a full queue"""
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            counters.incr('dropped')
+
+class CallSiteRateLimiter(logging.Filter):
+    """
+    Token bucket per call site for records below WARNING, plus optional
+    per-record sampling. The next record that passes after a suppression
+    notes how many were suppressed.
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        super().__init__()
+        self.rate = rate_per_second
+        self.burst = burst
+        self._buckets: Dict[tuple, list] = {}  # call site -> [tokens, last refill, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        sample = getattr(record, 'sample', None)
+        if sample is not None and random.random() >= sample:
+            counters.incr('sampled_out')
+            return False
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now, 0]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                counters.incr('rate_limited')
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+
+        if suppressed:
+            record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+        return True
+
+def configure_logging(level: str = "INFO", fmt: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+                      queue_size: int = 10000, rate_per_second: float = 20, burst: int = 50,
+                      handler: Optional[logging.Handler] = None):
+    """
+    Route all logging through a bounded queue and a background writer thread.
+    `handler` is the real destination (stderr by default).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    target = handler or logging.StreamHandler()
+    target.setFormatter(logging.Formatter(fmt))
+
+    queue_handler = _NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    queue_handler.addFilter(CallSiteRateLimiter(rate_per_second, burst))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, target, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the writer thread. Records logged afterwards
+    (e.g. by later shutdown hooks) are written directly to the destination.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, _NonBlockingQueueHandler):
+            root.removeHandler(existing)
+    for target in _listener.handlers:
+        root.addHandler(target)
+    _listener = None
+
+def set_level(level: str, logger_name: Optional[str] = None) -> str:
+    """Change a logger's level (root by default) at runtime; returns the new level name"""
+    logger = logging.getLogger(logger_name)
+    logger.setLevel(level.upper())
+    return logging.getLevelName(logger.level)
+
+def stats() -> Dict[str, Any]:
+    snapshot = counters.snapshot()
+    snapshot['level'] = logging.getLevelName(logging.getLogger().level)
+    return snapshot
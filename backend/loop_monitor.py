@@ -0,0 +1,57 @@
+"""
+Event-loop lag monitor.
+
+A task sleeps for `interval` seconds in a loop and records how much later than
+requested it woke up. Anything that blocks the event loop (CPU-bound work, a
+synchronous call in an async handler) shows up as lag, which delays every
+request and WebSocket on the worker by the same amount.
+"""
+
+import asyncio
+from collections import deque
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, samples: int = 600):
+        self.interval = interval
+        self._lags: deque = deque(maxlen=samples)  # recent samples, for percentiles
+        self._max = 0.0
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - start - self.interval))
+
+    def record(self, lag: float):
+        self._lags.append(lag)
+        self._count += 1
+        if lag > self._max:
+            self._max = lag
+
+    def stats(self) -> Dict[str, Any]:
+        lags = np.array(self._lags)
+        if not len(lags):
+            return {'samples': 0}
+        return {
+            'samples': self._count,
+            'lag_ms_p50': float(np.percentile(lags, 50)) * 1000,
+            'lag_ms_p99': float(np.percentile(lags, 99)) * 1000,
+            'lag_ms_recent_max': float(lags.max()) * 1000,
+            'lag_ms_max': self._max * 1000
+        }
@@ -1,17 +1,20 @@
 # ...existing code...
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Body
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Depends, Body, Request, Header
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy import create_engine, Column, String, Integer, Float, DateTime, Text, Boolean
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import text
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 import uuid
 import json
+import asyncio
 import logging
 import hashlib
+import hmac
+import math
 
 # User discovery models and endpoint (must be after app definition)
 class UserProfile(BaseModel):
@@ -24,12 +27,45 @@ class UserProfile(BaseModel):
 
 # Mock users removed - now using real database users
 
-from feature_extractor import FeatureExtractor, compute_and_store_features
-from ml_model import score_features
-from models import DBSession, DBEvent, DBFeatures, DBUser, DBLike, DBNotification, SessionLocal, Base, engine
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+from feature_cache import feature_cache
+from feature_extractor import FeatureExtractor, online_extractor, recent_events
+from feature_store import upsert_feature_vectors
+from event_writer import event_to_row, bulk_insert_events
+from wire_format import decode_columnar_batch
+from body_decoding import DecodedBodyRoute
+import body_decoding
+from scoring_pipeline import ScoringPipeline
+from compute_pool import ComputePool
+from loop_monitor import LoopLagMonitor
+from ml_model import get_model, model_registry
+from ingest_dedup import BatchDeduplicator
+from ingest_channel import IngestBuffer
+import ingest_channel
+from segment_log import SegmentLog, SegmentLogError, SegmentLogFull
+from admission import AdmissionController
+from config import (
+    SCORING_WORKERS, SCORING_QUEUE_SIZE, DEDUP_RECENT_BATCHES, MAX_EVENTS_PER_BATCH,
+    MAX_NDJSON_LINE_BYTES, INGEST_WS_FLUSH_MS, INGEST_SEGMENT_LOG_ENABLED, INGEST_SEGMENT_DIR,
+    INGEST_SEGMENT_BYTES, INGEST_SEGMENT_MAX_PENDING_BYTES, INGEST_GROUP_COMMIT_MS,
+    INGEST_SEGMENT_FLUSH_INTERVAL_MS, INGEST_DURABLE_TIMEOUT_SECONDS, LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE,
+    LOG_RATE_PER_CALL_SITE, LOG_BURST_PER_CALL_SITE, SCORING_SHED_FRACTION, SCORING_BATCH_SESSIONS,
+    FEATURE_WINDOW_MINUTES,
+    INGEST_GLOBAL_EVENTS_PER_SECOND, INGEST_GLOBAL_BURST_EVENTS, INGEST_SESSION_EVENTS_PER_SECOND,
+    INGEST_SESSION_BURST_EVENTS, INGEST_ADMISSION_MAX_SESSIONS, COMPUTE_POOL_WORKERS, COMPUTE_POOL_START_METHOD,
+    LOOP_LAG_INTERVAL_SECONDS, MODEL_LOAD, MAX_RETRIES, ADMIN_TOKEN
+)
+from sqlalchemy.exc import IntegrityError, OperationalError, InterfaceError
+import metrics
+import logging_setup
+from models import DBSession, DBEvent, DBFeatures, DBUser, DBLike, DBNotification, SessionLocal, Base, engine, migrate_schema
+
+# Configure logging: records go through a bounded queue to a background writer
+logging_setup.configure_logging(
+    LOG_LEVEL, LOG_FORMAT,
+    queue_size=LOG_QUEUE_SIZE,
+    rate_per_second=LOG_RATE_PER_CALL_SITE,
+    burst=LOG_BURST_PER_CALL_SITE
+)
 logger = logging.getLogger(__name__)
 
 # Database dependency
@@ -42,6 +78,7 @@ def get_db():
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+migrate_schema()
 
 # Pydantic Models
 class TelemetryEvent(BaseModel):
@@ -59,6 +96,7 @@ class TelemetryEvent(BaseModel):
     input_len: Optional[int] = None
     backspaces: Optional[int] = None
     meta: Optional[Dict[str, Any]] = None
+    seq: Optional[int] = None  # per-session sequence number used for deduplication
 
 class SessionCreate(BaseModel):
     user_hash: str
@@ -71,12 +109,14 @@ class SessionResponse(BaseModel):
 
 class EventBatch(BaseModel):
     events: List[TelemetryEvent]
+    batch_id: Optional[str] = None  # set by clients so retried uploads are idempotent
 
 class InterestScore(BaseModel):
     score: float
     confidence: float
     timestamp: datetime
     session_id: str
+    model_version: Optional[str] = None  # registry version that computed the score; None for mock scores
 
 class RevealAnswers(BaseModel):
     from_user_hash: str
@@ -169,7 +209,7 @@ async def get_notifications(user_id: Optional[str] = None):
         return {"notifications": notification_list}
         
     except Exception as e:
-        print(f"Error getting notifications: {e}")
+        logger.error(f"Error getting notifications: {e}")
         raise HTTPException(status_code=500, detail="Failed to get notifications")
     finally:
         session.close()
@@ -193,7 +233,7 @@ async def mark_notification_read(notification_id: int):
         
     except Exception as e:
         session.rollback()
-        print(f"Error marking notification as read: {e}")
+        logger.error(f"Error marking notification as read: {e}")
         raise HTTPException(status_code=500, detail="Failed to mark notification as read")
     finally:
         session.close()
@@ -209,14 +249,18 @@ def get_db():
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-# WebSocket connection manager
-class ConnectionManager:
+# WebSocket connection manager for score updates
+class ScoreConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
         self.session_connections: Dict[str, List[WebSocket]] = {}
 
     async def connect(self, websocket: WebSocket, session_id: str):
         await websocket.accept()
+        self.register(websocket, session_id)
+
+    def register(self, websocket: WebSocket, session_id: str):
+        """Subscribe an already-accepted socket to score updates for a session"""
         self.active_connections.append(websocket)
         if session_id not in self.session_connections:
             self.session_connections[session_id] = []
@@ -235,7 +279,114 @@ class ConnectionManager:
                 except:
                     pass
 
-manager = ConnectionManager()
+score_manager = ScoreConnectionManager()
+
+# Background feature/score computation, decoupled from ingest requests
+# CPU-bound feature kernel and scoring run in worker processes, off the event loop
+compute_pool = ComputePool(workers=COMPUTE_POOL_WORKERS, start_method=COMPUTE_POOL_START_METHOD)
+metrics.register_source("compute_pool", compute_pool.stats)
+loop_monitor = LoopLagMonitor(interval=LOOP_LAG_INTERVAL_SECONDS)
+metrics.register_source("event_loop", loop_monitor.stats)
+metrics.register_source("model", model_registry.stats)
+metrics.register_source("process", metrics.process_memory)
+
+if MODEL_LOAD == "import":
+    # Loaded before a pre-forking server forks its workers, which then share the pages
+    get_model()
+
+scoring_pipeline = ScoringPipeline(
+    workers=SCORING_WORKERS, max_queue=SCORING_QUEUE_SIZE, shed_fraction=SCORING_SHED_FRACTION,
+    batch_sessions=SCORING_BATCH_SESSIONS, window_minutes=FEATURE_WINDOW_MINUTES, compute_pool=compute_pool
+)
+metrics.register_source("scoring", scoring_pipeline.stats)
+metrics.register_source("online_features", online_extractor.stats)
+metrics.register_source("recent_events", recent_events.stats)
+metrics.register_source("feature_cache", feature_cache.stats)
+metrics.register_source("ingest_decoding", body_decoding.counters.snapshot)
+
+# Replay detection for retried ingest batches
+deduplicator = BatchDeduplicator(capacity=DEDUP_RECENT_BATCHES)
+metrics.register_source("ingest_dedup", deduplicator.stats)
+metrics.register_source("ingest_ws", ingest_channel.stats)
+
+# Ingest rate limits; over-budget batches get 429 with Retry-After
+admission = AdmissionController(
+    INGEST_GLOBAL_EVENTS_PER_SECOND, INGEST_GLOBAL_BURST_EVENTS,
+    INGEST_SESSION_EVENTS_PER_SECOND, INGEST_SESSION_BURST_EVENTS,
+    max_sessions=INGEST_ADMISSION_MAX_SESSIONS
+)
+metrics.register_source("ingest_admission", admission.stats)
+metrics.register_source("logging", logging_setup.stats)
+
+# Ingest endpoints accept gzip/deflate/zstd request bodies (Content-Encoding)
+ingest_router = APIRouter(route_class=DecodedBodyRoute)
+
+async def push_score_update(session_id: str, score: float, confidence: float, model_version: Optional[str]):
+    """Deliver a pipeline score to WebSocket subscribers of the session"""
+    await score_manager.send_score_to_session(session_id, InterestScore(
+        score=score,
+        confidence=confidence,
+        timestamp=datetime.utcnow(),
+        session_id=session_id,
+        model_version=model_version
+    ))
+
+scoring_pipeline.subscribe(push_score_update)
+
+@app.on_event("startup")
+async def start_scoring_pipeline():
+    if MODEL_LOAD == "startup":
+        # Load before the first request instead of during it
+        get_model()
+    model_registry.start_watching()
+    compute_pool.start()
+    loop_monitor.start()
+    scoring_pipeline.start(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+async def stop_scoring_pipeline():
+    scoring_pipeline.stop()
+    compute_pool.stop()
+    loop_monitor.stop()
+    model_registry.stop_watching()
+
+@app.on_event("shutdown")
+async def stop_logging():
+    logging_setup.shutdown_logging()
+
+def flush_segment_batch(batch_id: str, rows: List[Dict[str, Any]]):
+    """Segment log flusher callback: store one logged batch in the database"""
+    db = SessionLocal()
+    try:
+        write_event_rows(db, rows, batch_id)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+# Write-ahead segment log: ingest acks once a batch is fsynced to local disk and
+# a background flusher moves it into the events table
+segment_log = SegmentLog(
+    INGEST_SEGMENT_DIR,
+    flush_segment_batch,
+    segment_bytes=INGEST_SEGMENT_BYTES,
+    max_pending_bytes=INGEST_SEGMENT_MAX_PENDING_BYTES,
+    group_commit_ms=INGEST_GROUP_COMMIT_MS,
+    flush_interval_ms=INGEST_SEGMENT_FLUSH_INTERVAL_MS,
+    transient_errors=(OperationalError, InterfaceError)
+) if INGEST_SEGMENT_LOG_ENABLED else None
+
+if segment_log is not None:
+    metrics.register_source("segment_log", segment_log.stats)
+
+    @app.on_event("startup")
+    async def start_segment_log():
+        segment_log.start()
+
+    @app.on_event("shutdown")
+    async def stop_segment_log():
+        segment_log.stop()
 
 # Routes
 @app.post("/v1/sessions", response_model=SessionResponse)
@@ -259,65 +410,217 @@ async def create_session(session_data: SessionCreate, db: Session = Depends(get_
         started_at=db_session.started_at
     )
 
-@app.post("/v1/ingest/events")
+def write_event_rows(db: Session, rows: List[Dict[str, Any]], batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write event rows to the database in one round trip and queue their sessions
+    for scoring. A batch_id already in ingest_batches and already-stored
+    (session_id, seq) events are acknowledged without being written or rescored.
+    """
+    for attempt in range(MAX_RETRIES):
+        if batch_id and not deduplicator.claim_batch(db, batch_id, len(rows)):
+            deduplicator.remember(batch_id)
+            deduplicator.record(len(rows), len(rows), duplicate_batch=True)
+            return {"status": "success", "processed": 0, "duplicates": len(rows), "duplicate_batch": True}
+        
+        fresh_rows = deduplicator.drop_duplicate_events(db, rows)
+        # Announce the batch to the recent event buffers so a concurrent seed cannot miss it
+        session_ids = set(row['session_id'] for row in fresh_rows)
+        recent_events.begin(session_ids)
+        try:
+            bulk_insert_events(db, fresh_rows)
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent writer stored some of these (session_id, seq) events after
+            # drop_duplicate_events looked; the next attempt sees and drops them
+            db.rollback()
+            recent_events.abort(session_ids)
+            deduplicator.counters.incr('seq_conflicts')
+            if attempt == MAX_RETRIES - 1:
+                raise
+        except Exception:
+            recent_events.abort(session_ids)
+            raise
+    recent_events.append(session_ids, fresh_rows)
+    feature_cache.invalidate(session_ids)
+    if batch_id:
+        deduplicator.remember(batch_id)
+    
+    duplicates = len(rows) - len(fresh_rows)
+    deduplicator.record(len(rows), duplicates)
+    logger.debug("Stored batch of %d events (%d duplicates)", len(fresh_rows), duplicates)
+    
+    # Events are durable; features and scores are computed by the pipeline,
+    # which sheds sessions rather than holding up ingest when it is saturated
+    for session_id in session_ids:
+        scoring_pipeline.submit(session_id)
+    
+    return {"status": "success", "processed": len(fresh_rows), "duplicates": duplicates}
+
+async def store_event_rows(db: Session, rows: List[Dict[str, Any]], batch_id: Optional[str] = None,
+                           wait_for_admission: bool = False) -> Dict[str, Any]:
+    """
+    Make a batch of event rows durable and acknowledge it.
+    Raises 429 if the batch is over the global or per-session ingest budget,
+    or with wait_for_admission waits until it is within budget.
+    With the segment log enabled the batch is appended and fsynced locally and
+    written to the database later by the flusher; otherwise it is written now.
+    """
+    if batch_id and deduplicator.seen_recently(batch_id):
+        deduplicator.record(len(rows), len(rows), duplicate_batch=True)
+        return {"status": "success", "processed": 0, "duplicates": len(rows), "duplicate_batch": True}
+    
+    session_counts: Dict[str, int] = {}
+    for row in rows:
+        session_counts[row['session_id']] = session_counts.get(row['session_id'], 0) + 1
+    wait = admission.admit(session_counts)
+    while wait is not None and wait_for_admission:
+        await asyncio.sleep(wait)
+        wait = admission.admit(session_counts)
+    if wait is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Ingest rate limit exceeded",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))}
+        )
+    
+    if segment_log is None:
+        return write_event_rows(db, rows, batch_id)
+    
+    try:
+        # Every logged batch needs an id so replaying a segment stays idempotent
+        seq = segment_log.append(batch_id or uuid.uuid4().hex, rows)
+    except SegmentLogFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    try:
+        await segment_log.wait_durable_async(seq, INGEST_DURABLE_TIMEOUT_SECONDS)
+    except SegmentLogError as e:
+        # The batch may still be stored; a retry with the same batch_id is deduplicated
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if batch_id:
+        deduplicator.remember(batch_id)
+    return {"status": "success", "processed": len(rows), "duplicates": 0}
+
+@ingest_router.post("/v1/ingest/events")
 async def ingest_events(batch: EventBatch, db: Session = Depends(get_db)):
     """Ingest a batch of telemetry events"""
     try:
-        logger.info(f"Received batch with {len(batch.events)} events")
-        for i, event in enumerate(batch.events):
-            logger.info(f"Processing event {i}: {event.etype} for session {event.session_id}")
-            db_event = DBEvent(
-                ts=datetime.fromtimestamp(event.ts / 1000),
-                session_id=event.session_id,
-                user_hash=event.user_hash,
-                screen=event.screen,
-                component_id=event.component_id,
-                etype=event.etype,
-                duration_ms=event.duration_ms,
-                delta=event.delta,
-                velocity=event.velocity,
-                accel=event.accel,
-                key_code=event.key_code,
-                input_len=event.input_len,
-                backspaces=event.backspaces,
-                meta=event.meta
-            )
-            db.add(db_event)
-        
-        db.commit()
-        logger.info("Successfully committed events to database")
-        
-        # Trigger feature extraction for each unique session
-        unique_sessions = set(event.session_id for event in batch.events)
-        for session_id in unique_sessions:
-            # Compute features and score in background
-            try:
-                success = compute_and_store_features(session_id)
-                if success:
-                    # Compute real-time score
-                    extractor = FeatureExtractor()
-                    features = extractor.extract_realtime_features(session_id)
-                    if features:
-                        score, confidence = score_features(features)
-                        
-                        # Send score via WebSocket if connected
-                        score_obj = InterestScore(
-                            score=score,
-                            confidence=confidence,
-                            timestamp=datetime.utcnow(),
-                            session_id=session_id
-                        )
-                        await manager.send_score_to_session(session_id, score_obj)
-                        
-            except Exception as e:
-                logger.error(f"Error processing session {session_id}: {e}")
-        
-        return {"status": "success", "processed": len(batch.events)}
+        return await store_event_rows(db, [event_to_row(event) for event in batch.events], batch.batch_id)
     
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+@ingest_router.post("/v1/ingest/columnar")
+async def ingest_columnar(request: Request, db: Session = Depends(get_db)):
+    """
+    Ingest a batch encoded in the columnar wire format (see wire_format.py).
+    The optional X-Batch-Id header plays the role of EventBatch.batch_id.
+    """
+    try:
+        rows = decode_columnar_batch(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        return await store_event_rows(db, rows, request.headers.get("x-batch-id"))
+    
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+# Validation errors reported per chunk of a streamed upload
+MAX_ERRORS_PER_CHUNK = 10
+
+@ingest_router.post("/v1/ingest/stream")
+async def ingest_stream(request: Request, db: Session = Depends(get_db)):
+    """
+    Ingest newline-delimited TelemetryEvent JSON read from the request stream.
+    Events are validated and written in chunks of MAX_EVENTS_PER_BATCH, so server
+    memory stays flat however large the upload is. Invalid lines are skipped and
+    reported with the chunk they belong to. If an X-Batch-Id header is sent, each
+    chunk is stored under "<batch id>:<chunk index>" so a re-sent upload is idempotent.
+    A chunk over the ingest budget waits until it is admitted; the rest of the
+    body is not read meanwhile, so the client is slowed instead of losing events.
+    """
+    batch_id = request.headers.get("x-batch-id")
+    chunks: List[Dict[str, Any]] = []
+    rows: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    rejected = 0
+    line_number = 0
+    first_line = 1
+    
+    async def flush_chunk():
+        nonlocal rows, errors, rejected, first_line
+        index = len(chunks)
+        result = {"chunk": index, "first_line": first_line, "last_line": line_number, "rejected": rejected}
+        try:
+            result.update(await store_event_rows(
+                db, rows, f"{batch_id}:{index}" if batch_id else None, wait_for_admission=True
+            ))
+        except HTTPException as e:
+            result.update({"status": "error", "processed": 0, "detail": e.detail})
+            if e.headers and "Retry-After" in e.headers:
+                result["retry_after"] = int(e.headers["Retry-After"])
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error storing stream chunk {index}: {e}")
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            result.update({"status": "error", "processed": 0, "detail": detail})
+        if errors:
+            result["errors"] = errors
+        chunks.append(result)
+        rows, errors, rejected, first_line = [], [], 0, line_number + 1
+    
+    async def handle_line(line: bytes):
+        nonlocal rejected
+        if not line.strip():
+            return
+        try:
+            rows.append(event_to_row(TelemetryEvent.model_validate_json(line)))
+        except (ValueError, OverflowError, OSError) as e:
+            # Validation errors, and timestamps event_to_row cannot convert
+            rejected += 1
+            if len(errors) < MAX_ERRORS_PER_CHUNK:
+                message = e.errors(include_url=False)[0]["msg"] if isinstance(e, ValidationError) else str(e)
+                errors.append({"line": line_number, "error": message})
+        if len(rows) >= MAX_EVENTS_PER_BATCH:
+            await flush_chunk()
+    
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            await handle_line(line)
+        if len(buffer) > MAX_NDJSON_LINE_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Line {line_number + 1} exceeds {MAX_NDJSON_LINE_BYTES} bytes"
+            )
+    
+    if buffer.strip():
+        line_number += 1
+        await handle_line(buffer)
+    if rows or rejected:
+        await flush_chunk()
+    
+    return {
+        "status": "success" if all(chunk.get("status") == "success" for chunk in chunks) else "partial",
+        "lines": line_number,
+        "processed": sum(chunk.get("processed", 0) for chunk in chunks),
+        "rejected": sum(chunk["rejected"] for chunk in chunks),
+        "chunks": chunks
+    }
+
+app.include_router(ingest_router)
+
 @app.get("/v1/score/{session_id}", response_model=InterestScore)
 async def get_score(session_id: str, db: Session = Depends(get_db)):
     """Get the latest interest score for a session"""
@@ -326,43 +629,54 @@ async def get_score(session_id: str, db: Session = Depends(get_db)):
             DBFeatures.session_id == session_id
         ).first()
         
-        if features_record and features_record.score is not None:
-            # Return stored score
+        model_version = get_model().model_version
+        if (features_record and features_record.score is not None
+                and features_record.model_version == model_version):
+            # Return the score stored by the model being served
             score = features_record.score
             confidence = features_record.conf or 0.6
         else:
-            # Compute score from features
-            extractor = FeatureExtractor()
-            features = extractor.extract_session_features(session_id)
+            # Compute score from whole-session features, off the event loop. They come
+            # from the online extractor, as the pipeline stores them, so a session's
+            # percentile features do not depend on which path stored them
+            summaries = await asyncio.to_thread(online_extractor.session_summaries_many, [session_id])
+            features, sketches = summaries[session_id]
             
             if features:
-                score, confidence = score_features(features)
+                scores, model_version = await compute_pool.scores_async({session_id: features})
+                score, confidence = scores[session_id]
                 
                 # Store the computed score
                 if features_record:
                     features_record.score = score
                     features_record.conf = confidence
+                    features_record.model_version = model_version
                 else:
                     features_record = DBFeatures(
                         session_id=session_id,
                         computed_at=datetime.utcnow(),
                         f=features,
+                        sketches=sketches,
                         score=score,
-                        conf=confidence
+                        conf=confidence,
+                        model_version=model_version
                     )
                     db.add(features_record)
+                    upsert_feature_vectors(db, {session_id: features})
                 
                 db.commit()
             else:
                 # Fallback to mock score
                 score = 50.0 + (hash(session_id) % 50)
                 confidence = 0.6 + (hash(session_id) % 40) / 100
+                model_version = None
         
         return InterestScore(
             score=score,
             confidence=confidence,
             timestamp=datetime.utcnow(),
-            session_id=session_id
+            session_id=session_id,
+            model_version=model_version
         )
     
     except ValueError:
@@ -374,7 +688,7 @@ async def get_score(session_id: str, db: Session = Depends(get_db)):
 @app.websocket("/v1/score/ws/{session_id}")
 async def websocket_score(websocket: WebSocket, session_id: str):
     """WebSocket endpoint for real-time score updates"""
-    await manager.connect(websocket, session_id)
+    await score_manager.connect(websocket, session_id)
     try:
         while True:
             # Wait for any message (keep connection alive)
@@ -390,7 +704,86 @@ async def websocket_score(websocket: WebSocket, session_id: str):
             await websocket.send_text(score.json())
     
     except WebSocketDisconnect:
-        manager.disconnect(websocket, session_id)
+        score_manager.disconnect(websocket, session_id)
+
+@app.websocket("/v1/ingest/ws/{session_id}")
+async def websocket_ingest(websocket: WebSocket, session_id: str):
+    """
+    Bidirectional telemetry channel for one session.
+    Clients send {"type": "events", "frame_id": ..., "events": [TelemetryEvent, ...]}
+    frames (or {"type": "ping"}). Frames are buffered and written together once
+    MAX_EVENTS_PER_BATCH events are pending or INGEST_WS_FLUSH_MS has passed, then
+    acknowledged with {"type": "ack", "frame_ids": [...], "processed": n, "duplicates": d}.
+    Score updates for the session arrive on the same socket as InterestScore JSON.
+    """
+    await websocket.accept()
+    score_manager.register(websocket, session_id)
+    ingest_channel.counters.incr('connections_opened')
+    buffer = IngestBuffer(MAX_EVENTS_PER_BATCH, INGEST_WS_FLUSH_MS / 1000)
+    
+    async def flush(send_ack: bool = True):
+        frame_ids, rows = buffer.drain()
+        db = SessionLocal()
+        try:
+            result = await store_event_rows(db, rows)
+            ingest_channel.counters.incr('flushes')
+            ingest_channel.counters.incr('events', len(rows))
+            reply = {"type": "ack", "frame_ids": frame_ids, "processed": result["processed"], "duplicates": result["duplicates"]}
+        except HTTPException as e:
+            # Over budget (429) or log full (503): the client resends these frames later
+            ingest_channel.counters.incr('throttled_flushes')
+            reply = {"type": "error", "frame_ids": frame_ids, "detail": e.detail,
+                     "retry_after": int((e.headers or {}).get("Retry-After", 1))}
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error storing telemetry frames for session {session_id}: {e}")
+            reply = {"type": "error", "frame_ids": frame_ids, "detail": "Failed to store events"}
+        finally:
+            db.close()
+        if send_ack:
+            await websocket.send_text(json.dumps(reply))
+    
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(websocket.receive_text(), buffer.time_until_flush())
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            
+            ingest_channel.counters.incr('frames')
+            frame_id = None
+            try:
+                frame = json.loads(data)
+                if not isinstance(frame, dict):
+                    raise ValueError("Frame must be a JSON object")
+                if frame.get("type") == "ping":
+                    await websocket.send_text(json.dumps({"type": "pong"}))
+                    continue
+                frame_id = frame.get("frame_id")
+                events = [TelemetryEvent.model_validate(event) for event in frame.get("events", [])]
+                if any(event.session_id != session_id for event in events):
+                    raise ValueError("Event session_id does not match the channel session")
+                rows = [event_to_row(event) for event in events]
+            except (ValueError, OverflowError, OSError) as e:
+                # Covers malformed JSON, pydantic validation errors and out-of-range timestamps
+                ingest_channel.counters.incr('rejected_frames')
+                await websocket.send_text(json.dumps({"type": "error", "frame_id": frame_id, "detail": str(e)}))
+                continue
+            
+            buffer.add(frame_id, rows)
+            if buffer.should_flush():
+                await flush()
+    
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Keep whatever was received, also when the handler failed; clients resend
+        # unacked frames and seq dedups them
+        if len(buffer):
+            await flush(send_ack=False)
+        score_manager.disconnect(websocket, session_id)
+        ingest_channel.counters.incr('connections_closed')
 
 @app.get("/v1/insights/{session_id}")
 async def get_insights(session_id: str, db: Session = Depends(get_db)):
@@ -468,11 +861,6 @@ async def signup(user_data: UserSignup):
         user_hash = hashlib.sha256(f"{user_data.email}_{user_data.name}_{datetime.utcnow()}".encode()).hexdigest()[:16]
         password_hash = hash_password(user_data.password)
         
-        print(f"🔍 Debug signup - user_hash: {user_hash}")
-        print(f"🔍 Debug signup - email: {user_data.email}")
-        print(f"🔍 Debug signup - password_hash: {password_hash}")
-        print(f"🔍 Debug signup - name: {user_data.name}")
-        
         # Insert the new user with explicit is_active value
         result = db.execute(text('''
             INSERT INTO users 
@@ -490,16 +878,15 @@ async def signup(user_data: UserSignup):
         
         # Explicitly commit the transaction before verification
         db.commit()
-        print(f"✅ Debug signup - User inserted and committed successfully")
+        logger.debug("Signup - user %s inserted and committed", user_hash)
         
         # Verify the user was actually saved with the correct data
         verification = db.execute(text('''
             SELECT user_hash, email, password_hash, name, is_active FROM users WHERE user_hash = :user_hash
         '''), {"user_hash": user_hash}).fetchone()
-        print(f"🔍 Debug signup - Verification query result: {verification}")
         
         if not verification:
-            print("❌ Debug signup - User not found after insert, transaction failed!")
+            logger.error("Signup - user %s not found after insert, transaction failed", user_hash)
             return AuthResponse(
                 success=False,
                 message="Failed to create account. Database transaction error."
@@ -521,7 +908,6 @@ async def signup(user_data: UserSignup):
         # Rollback on any error
         db.rollback()
         logging.error(f"Signup error: {e}")
-        print(f"❌ Debug signup - Exception occurred: {e}")
         return AuthResponse(
             success=False,
             message="Failed to create account. Please try again."
@@ -537,14 +923,10 @@ async def login(user_data: UserLogin):
     db = SessionLocal()
     
     try:
-        print(f"🔍 Debug login - email: {user_data.email}")
-        print(f"🔍 Debug login - password: {user_data.password}")
-        
         # First check if user exists at all (without is_active condition)
         user_check = db.execute(text('''
             SELECT user_hash, email, password_hash, name, is_active FROM users WHERE email = :email
         '''), {"email": user_data.email}).fetchone()
-        print(f"🔍 Debug login - user exists check: {user_check}")
         
         # Find active user by email
         user = db.execute(text('''
@@ -552,38 +934,29 @@ async def login(user_data: UserLogin):
             FROM users WHERE email = :email AND is_active = TRUE
         '''), {"email": user_data.email}).fetchone()
         
-        print(f"🔍 Debug login - active user found: {user is not None}")
-        if user:
-            print(f"🔍 Debug login - stored password_hash: {user.password_hash}")
-            
+        
         if not user:
             if user_check:
-                print("❌ Debug login - User exists but is not active")
+                logger.debug("Login - user %s exists but is not active", user_check.user_hash)
                 return AuthResponse(
                     success=False,
                     message="Account is not active. Please contact support."
                 )
             else:
-                print("❌ Debug login - User not found")
+                logger.debug("Login - no user for the given email")
                 return AuthResponse(
                     success=False,
                     message="Invalid email or password."
                 )
         
         # Verify password
-        hashed_input_password = hash_password(user_data.password)
-        print(f"🔍 Debug login - hashed input password: {hashed_input_password}")
-        print(f"🔍 Debug login - passwords match: {hashed_input_password == user.password_hash}")
-        
         if not verify_password(user_data.password, user.password_hash):
-            print("❌ Debug login - Password verification failed")
+            logger.debug("Login - password verification failed for user %s", user.user_hash)
             return AuthResponse(
                 success=False,
                 message="Invalid email or password."
             )
         
-        print("✅ Debug login - Password verification successful")
-        
         # Convert photos and interests from JSON strings
         photos = json.loads(user.photos) if user.photos else []
         interests = json.loads(user.interests) if user.interests else []
@@ -600,7 +973,7 @@ async def login(user_data: UserLogin):
             "is_guest": user.is_guest
         }
         
-        print(f"✅ Debug login - Returning successful login for user: {user.user_hash}")
+        logger.debug("Login - successful login for user %s", user.user_hash)
         
         return AuthResponse(
             success=True,
@@ -611,7 +984,6 @@ async def login(user_data: UserLogin):
         
     except Exception as e:
         logging.error(f"Login error: {e}")
-        print(f"❌ Debug login - Exception occurred: {e}")
         return AuthResponse(
             success=False,
             message="Failed to login. Please try again."
@@ -742,6 +1114,60 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+@app.get("/v1/metrics")
+async def get_metrics():
+    """Operational metrics for ingest and scoring"""
+    return metrics.snapshot()
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """Dependency of the endpoints that change the running service: X-Admin-Token must match ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin operations are disabled (ADMIN_TOKEN is not set)")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+class LogLevelUpdate(BaseModel):
+    level: str
+    logger: Optional[str] = None
+
+@app.get("/admin/logging")
+async def get_logging_config():
+    """Current log level and logging drop/suppression counters"""
+    return logging_setup.stats()
+
+@app.post("/admin/logging", dependencies=[Depends(require_admin_token)])
+async def set_logging_level(update: LogLevelUpdate):
+    """Change a logger's level at runtime (root logger by default)"""
+    try:
+        level = logging_setup.set_level(update.level, update.logger)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown log level: {update.level}")
+    return {"logger": update.logger or "root", "level": level}
+
+class ModelActivation(BaseModel):
+    version: str
+
+@app.get("/admin/model")
+async def get_model_config():
+    """Published model versions, the active one and the one this worker is serving"""
+    return {**model_registry.stats(), "available": model_registry.versions()}
+
+@app.post("/admin/model", dependencies=[Depends(require_admin_token)])
+async def activate_model(activation: ModelActivation):
+    """
+    Serve another published model version. It is loaded in a thread while the
+    current model keeps serving, then swapped in; other worker processes
+    follow through the registry's ACTIVE file.
+    """
+    try:
+        model = await asyncio.to_thread(model_registry.activate, activation.version)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {activation.version}")
+    except Exception as e:
+        logger.error(f"Error activating model version {activation.version}: {e}")
+        raise HTTPException(status_code=500, detail="Model version failed to load")
+    return {"model_version": model.model_version}
+
 # Connection Request Models
 class ConnectionRequest(BaseModel):
     from_user_hash: str
@@ -774,7 +1200,7 @@ async def send_connection_request(request: ConnectionRequest, db: Session = Depe
         '''))
         
         # Check if request already exists
-        logger.info(f"🔍 Checking for existing request: {request.from_user_hash} → {request.to_user_hash}")
+        logger.debug("🔍 Checking for existing request: %s → %s", request.from_user_hash, request.to_user_hash)
         existing = db.execute(text('''
             SELECT id, status, created_at FROM connection_requests 
             WHERE from_user_hash = :from_user AND to_user_hash = :to_user
@@ -814,7 +1240,7 @@ async def send_connection_request(request: ConnectionRequest, db: Session = Depe
 async def get_connection_requests(user_hash: str, db: Session = Depends(get_db)):
     """Get pending connection requests for a user"""
     try:
-        logger.info(f"🔍 Getting connection requests for user: {user_hash}")
+        logger.debug("🔍 Getting connection requests for user: %s", user_hash)
         
         # Create connection requests table if it doesn't exist
         db.execute(text('''
@@ -852,7 +1278,7 @@ async def get_connection_requests(user_hash: str, db: Session = Depends(get_db))
                 "created_at": req.created_at
             })
         
-        logger.info(f"📋 Found {len(request_list)} connection requests for {user_hash}")
+        logger.debug("📋 Found %d connection requests for %s", len(request_list), user_hash)
         return {"requests": request_list, "count": len(request_list)}
         
     except Exception as e:
@@ -863,7 +1289,7 @@ async def get_connection_requests(user_hash: str, db: Session = Depends(get_db))
 async def get_sent_connection_requests(user_hash: str, db: Session = Depends(get_db)):
     """Get connection requests sent by a user"""
     try:
-        logger.info(f"🔍 Getting sent connection requests for user: {user_hash}")
+        logger.debug("🔍 Getting sent connection requests for user: %s", user_hash)
         
         # Create connection requests table if it doesn't exist
         db.execute(text('''
@@ -902,7 +1328,7 @@ async def get_sent_connection_requests(user_hash: str, db: Session = Depends(get
                 "created_at": req.created_at
             })
         
-        logger.info(f"📋 Found {len(request_list)} sent connection requests for {user_hash}")
+        logger.debug("📋 Found %d sent connection requests for %s", len(request_list), user_hash)
         return {"requests": request_list, "count": len(request_list)}
         
     except Exception as e:
@@ -1026,7 +1452,7 @@ async def get_user_matches(user_hash: str, db: Session = Depends(get_db)):
 async def discover_users(user_hash: str, refresh: bool = False, db: Session = Depends(get_db)):
     """Get users for discovery, with optional refresh mode to show all users again"""
     try:
-        logger.info(f"🔍 Discovering users for: {user_hash} (refresh={refresh})")
+        logger.debug("🔍 Discovering users for: %s (refresh=%s)", user_hash, refresh)
         
         # Create tables if they don't exist
         db.execute(text('''
@@ -1055,7 +1481,7 @@ async def discover_users(user_hash: str, refresh: bool = False, db: Session = De
         
         if refresh:
             # Refresh mode: Show all users except current user (no filtering)
-            logger.info(f"🔄 Refresh mode: showing all users for {user_hash}")
+            logger.debug("🔄 Refresh mode: showing all users for %s", user_hash)
             users = db.execute(text('''
                 SELECT u.user_hash, u.name, u.age, u.bio, u.location, u.photos, u.interests
                 FROM users u
@@ -1065,31 +1491,20 @@ async def discover_users(user_hash: str, refresh: bool = False, db: Session = De
             '''), {"current_user": user_hash}).fetchall()
         else:
             # Normal mode: Filter out swiped users and connection requests
-            # Check how many users this user has already swiped on
-            swiped_count = db.execute(text('''
-                SELECT COUNT(*) as count FROM swipes WHERE from_user_hash = :current_user
-            '''), {"current_user": user_hash}).fetchone()
-            
-            # Check how many connection requests this user has sent
-            requests_count = db.execute(text('''
-                SELECT COUNT(*) as count FROM connection_requests WHERE from_user_hash = :current_user
-            '''), {"current_user": user_hash}).fetchone()
-            
-            logger.info(f"📊 User {user_hash} has swiped on {swiped_count.count if swiped_count else 0} users")
-            logger.info(f"📊 User {user_hash} has sent {requests_count.count if requests_count else 0} connection requests")
-            
-            # Debug: Get users excluded by connection requests
-            excluded_by_requests = db.execute(text('''
-                SELECT to_user_hash FROM connection_requests WHERE from_user_hash = :current_user
-            '''), {"current_user": user_hash}).fetchall()
-            
-            # Debug: Get users excluded by swipes  
-            excluded_by_swipes = db.execute(text('''
-                SELECT to_user_hash FROM swipes WHERE from_user_hash = :current_user
-            '''), {"current_user": user_hash}).fetchall()
-            
-            logger.info(f"🚫 Users excluded by requests: {[r.to_user_hash for r in excluded_by_requests]}")
-            logger.info(f"🚫 Users excluded by swipes: {[s.to_user_hash for s in excluded_by_swipes]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                # Debug only: these queries exist purely for the log lines below
+                excluded_by_requests = db.execute(text('''
+                    SELECT to_user_hash FROM connection_requests WHERE from_user_hash = :current_user
+                '''), {"current_user": user_hash}).fetchall()
+                
+                excluded_by_swipes = db.execute(text('''
+                    SELECT to_user_hash FROM swipes WHERE from_user_hash = :current_user
+                '''), {"current_user": user_hash}).fetchall()
+                
+                logger.debug("📊 User %s has swiped on %d users and sent %d connection requests",
+                             user_hash, len(excluded_by_swipes), len(excluded_by_requests))
+                logger.debug("🚫 Users excluded by requests: %s", [r.to_user_hash for r in excluded_by_requests])
+                logger.debug("🚫 Users excluded by swipes: %s", [s.to_user_hash for s in excluded_by_swipes])
             
             # Get users excluding current user, users with existing connection requests, and already swiped users
             users = db.execute(text('''
@@ -1106,7 +1521,7 @@ async def discover_users(user_hash: str, refresh: bool = False, db: Session = De
                 LIMIT 20
             '''), {"current_user": user_hash}).fetchall()
         
-        logger.info(f"✅ Found {len(users)} discoverable users for {user_hash}")
+        logger.debug("✅ Found %d discoverable users for %s", len(users), user_hash)
         
         user_list = []
         for user in users:
@@ -1304,7 +1719,7 @@ manager = ConnectionManager()
 async def send_message(message: MessageRequest, db: Session = Depends(get_db)):
     """Send a message between matched users"""
     try:
-        logger.info(f"💬 Sending message: {message.from_user_hash} → {message.to_user_hash}")
+        logger.debug("💬 Sending message: %s → %s", message.from_user_hash, message.to_user_hash)
         
         # Create messages table if it doesn't exist
         db.execute(text('''
@@ -1399,7 +1814,7 @@ async def send_message(message: MessageRequest, db: Session = Depends(get_db)):
         # Send to receiver if they're connected
         await manager.send_personal_message(json.dumps(message_data), message.to_user_hash)
         
-        logger.info(f"✅ Message sent successfully: {message_id}")
+        logger.debug("✅ Message sent successfully: %s", message_id)
         return {"success": True, "message_id": message_id, "conversation_id": conversation_id}
         
     except HTTPException:
@@ -1413,7 +1828,7 @@ async def send_message(message: MessageRequest, db: Session = Depends(get_db)):
 async def get_messages(conversation_id: str, user_hash: str, db: Session = Depends(get_db)):
     """Get messages for a conversation"""
     try:
-        logger.info(f"📨 Getting messages for conversation {conversation_id}, user {user_hash}")
+        logger.debug("📨 Getting messages for conversation %s, user %s", conversation_id, user_hash)
         
         # Extract participant hashes from the conversation_id string
         user_hashes = conversation_id.split('_')
@@ -1448,7 +1863,7 @@ async def get_messages(conversation_id: str, user_hash: str, db: Session = Depen
             ORDER BY created_at ASC
         '''), {"conv_id": db_conversation_id}).fetchall()
         
-        logger.info(f"✅ Found {len(messages)} messages for conversation {db_conversation_id}")
+        logger.debug("✅ Found %d messages for conversation %s", len(messages), db_conversation_id)
         
         return [dict(row._mapping) for row in messages]
         
@@ -1492,7 +1907,7 @@ async def submit_reveal_answers(payload: RevealAnswers, db: Session = Depends(ge
 async def get_behavior_state(session_id: str):
     try:
         extractor = FeatureExtractor()
-        feats = extractor.extract_realtime_features(session_id)
+        feats = (await extractor.extract_features_many_async([session_id], window_minutes=2, pool=compute_pool))[session_id]
         if not feats:
             return {"state": "unknown", "confidence": 0.4}
 
@@ -1529,7 +1944,7 @@ async def get_conversations(user_hash: str, db: Session = Depends(get_db)):
     Get all conversations for a user, including the latest message and participants' details.
     """
     try:
-        logger.info(f"🔍 Fetching conversations for user {user_hash}")
+        logger.debug("🔍 Fetching conversations for user %s", user_hash)
         
         # This query is complex. It joins conversations, messages, and users tables.
         # It uses a subquery with ROW_NUMBER() to get only the latest message for each conversation.
@@ -1587,7 +2002,7 @@ async def get_conversations(user_hash: str, db: Session = Depends(get_db)):
                 }
             })
             
-        logger.info(f"✅ Found {len(response_data)} conversations for user {user_hash}")
+        logger.debug("✅ Found %d conversations for user %s", len(response_data), user_hash)
         return response_data
 
     except Exception as e:
@@ -1673,7 +2088,9 @@ async def websocket_chat(websocket: WebSocket, conversation_id: str, db: Session
             while True:
                 # Keep connection alive and handle any incoming messages
                 data = await websocket.receive_text()
-                logger.info(f"💬 WebSocket message from {user_hash}: {data}")
+                # Message bodies are never logged; frame sizes only, sampled
+                logger.debug("💬 WebSocket frame from %s (%d bytes)", user_hash, len(data),
+                             extra={"sample": 0.1})
                 
                 # Parse incoming message (could be ping/pong or message events)
                 try:
@@ -0,0 +1,65 @@
+import os
+import resource
+import threading
+from typing import Any, Callable, Dict
+
+class Counters:
+    """Thread-safe named counters and running observations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, float] = {}
+        self._observations: Dict[str, list] = {}  # name -> [count, total, max]
+
+    def incr(self, name: str, amount: float = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + amount
+
+    def observe(self, name: str, value: float):
+        """Record a sample (latency, size, ratio...) for avg/max reporting"""
+        with self._lock:
+            obs = self._observations.setdefault(name, [0, 0.0, 0.0])
+            obs[0] += 1
+            obs[1] += value
+            obs[2] = max(obs[2], value)
+
+    def get(self, name: str) -> float:
+        with self._lock:
+            return self._counts.get(name, 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            result = dict(self._counts)
+            for name, (count, total, peak) in self._observations.items():
+                result[f'{name}_avg'] = total / count if count else 0.0
+                result[f'{name}_max'] = peak
+            return result
+
+def process_memory() -> Dict[str, int]:
+    """
+    This process's resident memory. pss_bytes (Linux) splits pages shared with
+    other processes, e.g. a memory-mapped model, between them.
+    """
+    stats = {'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+    try:
+        with open("/proc/self/statm") as f:
+            stats['rss_bytes'] = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    stats['pss_bytes'] = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    return stats
+
+# Registered metric sources, reported together by /v1/metrics
+_sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+def register_source(name: str, source: Callable[[], Dict[str, Any]]):
+    """Register a callable that returns a dict of metrics for one component"""
+    _sources[name] = source
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Collect metrics from every registered source"""
+    return {name: source() for name, source in list(_sources.items())}
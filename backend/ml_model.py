@@ -7,16 +7,34 @@ from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.calibration import CalibratedClassifierCV
 import joblib
 import logging
-from typing import Dict, Tuple, Optional
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Tuple, Optional, Union
 from datetime import datetime
 import json
 
+from config import FOREST_PREDICTOR, MODEL_PATH, MODEL_REGISTRY_DIR, MODEL_REGISTRY_POLL_SECONDS
+from feature_cache import feature_cache
+from feature_kernel import FEATURE_NAMES
+from forest_predictor import FlatForest
+from model_registry import ModelRegistry
+
 logger = logging.getLogger(__name__)
 
+# Random rows (in scaled units) on which an exported forest must match sklearn
+PARITY_ROWS = 512
+
+MODEL_FILE = os.path.join(MODEL_PATH, "interest_score_model.joblib")
+
+def flat_export_dir(filepath: str) -> str:
+    """Directory holding the memory-mappable FlatForest export saved with a model file"""
+    return os.path.splitext(filepath)[0] + ".flat"
+
 class InterestScoreModel:
     """Machine learning model for predicting interest scores from behavioral features"""
     
-    def __init__(self):
+    def __init__(self, predictor: str = FOREST_PREDICTOR):
         self.model = RandomForestRegressor(
             n_estimators=100,
             max_depth=10,
@@ -24,142 +42,196 @@ class InterestScoreModel:
             n_jobs=-1
         )
         self.scaler = StandardScaler()
-        self.feature_names = None
         self.is_trained = False
         self.model_version = "1.0"
+        self._leaf_table = None  # (model, leaf values, tree offsets) for _tree_predictions
+        # "flat" exports the trained forest to forest_predictor.FlatForest; "sklearn" predicts with sklearn
+        self.predictor = predictor
+        self._flat_forest: Optional[FlatForest] = None
+        self._forest_path: Optional[str] = None  # joblib file whose forest is loaded on demand
+        self.first_predict_seconds: Optional[float] = None
+        self._set_feature_names(FEATURE_NAMES)
+    
+    def _set_feature_names(self, feature_names: List[str]):
+        self.feature_names = list(feature_names)
+        # Column of each feature in the model input
+        self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
         
     def prepare_features(self, features_dict: Dict[str, float]) -> np.ndarray:
         """Convert feature dictionary to model input array"""
-        if self.feature_names is None:
-            # Define expected feature names (should match feature extractor)
-            self.feature_names = [
-                'scroll_count', 'tap_count', 'type_count', 'long_press_count', 'pause_count',
-                'scroll_ratio', 'tap_ratio', 'type_ratio', 'pause_ratio',
-                'total_events', 'session_duration_seconds', 'events_per_second',
-                'scroll_velocity_mean', 'scroll_velocity_std', 'scroll_velocity_max',
-                'scroll_accel_mean', 'scroll_accel_std', 'scroll_direction_changes',
-                'scroll_burst_count', 'typing_speed_chars_per_min', 'backspace_ratio',
-                'typing_burst_count', 'inter_key_interval_mean', 'inter_key_interval_std',
-                'typing_rhythm_entropy', 'tap_frequency', 'tap_interval_mean',
-                'tap_interval_std', 'rapid_tap_sequences', 'temporal_regularity',
-                'activity_density', 'pause_duration_mean', 'pause_duration_max',
-                'long_pause_count'
-            ]
-        
-        # Create feature vector with default values
-        feature_vector = np.zeros(len(self.feature_names))
-        
-        for i, feature_name in enumerate(self.feature_names):
-            if feature_name in features_dict:
-                feature_vector[i] = features_dict[feature_name]
+        return self.prepare_features_many([features_dict])
+    
+    def prepare_features_many(self, features_list: List[Dict[str, float]]) -> np.ndarray:
+        """Model input matrix, one row per feature dictionary; missing and NaN features are 0"""
+        X = np.zeros((len(features_list), len(self.feature_names)))
+        index = self._feature_index
+        for row, features_dict in zip(X, features_list):
+            for name, value in features_dict.items():
+                column = index.get(name)
+                if column is not None:
+                    row[column] = value
         
         # Handle NaN values
-        feature_vector = np.nan_to_num(feature_vector, nan=0.0, posinf=0.0, neginf=0.0)
-        
-        return feature_vector.reshape(1, -1)
+        return np.nan_to_num(X, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
     
     def predict_score(self, features_dict: Dict[str, float]) -> Tuple[float, float]:
         """
         Predict interest score and confidence
         Returns: (score, confidence)
         """
+        scores, confidences = self.predict_many([features_dict])
+        return float(scores[0]), float(confidences[0])
+    
+    def predict_many(self, features: Union[List[Dict[str, float]], np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict interest scores and confidences for many sessions at once.
+        `features` is a list of feature dictionaries or a prebuilt matrix with
+        columns in feature_names order (e.g. from feature_store.load_feature_vectors).
+        Returns: (scores, confidences) arrays
+        """
+        if isinstance(features, np.ndarray):
+            X = np.nan_to_num(np.asarray(features, dtype=np.float64).reshape(-1, len(self.feature_names)),
+                              nan=0.0, posinf=0.0, neginf=0.0)
+        else:
+            X = self.prepare_features_many(features)
+        if not len(X):
+            return np.empty(0), np.empty(0)
+        
         if not self.is_trained:
-            # Return mock score for demo
-            return self._generate_mock_score(features_dict)
+            # Return mock scores for demo
+            return self._generate_mock_scores(X)
         
+        if self.first_predict_seconds is None:
+            start = time.perf_counter()
+            result = self._predict_trained(X)
+            self.first_predict_seconds = time.perf_counter() - start
+            return result
+        return self._predict_trained(X)
+    
+    def _predict_trained(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
         try:
-            # Prepare features
-            X = self.prepare_features(features_dict)
-            
-            # Scale features
-            X_scaled = self.scaler.transform(X)
+            if self._flat_forest is not None:
+                # Exported forest: plain NumPy, no per-call validation or thread dispatch
+                tree_mean, tree_variance = self._flat_forest.predict(X)
+            else:
+                # Scale features
+                X_scaled = self.scaler.transform(X)
+                
+                try:
+                    # Every tree's prediction for every row, from one pass over the forest
+                    tree_predictions = self._tree_predictions(X_scaled)
+                except Exception as e:
+                    logger.warning(f"Error calculating confidence: {e}")
+                    return np.clip(self.model.predict(X_scaled), 0, 100), np.full(len(X), 0.6)  # Default confidence
+                tree_mean, tree_variance = tree_predictions.mean(axis=0), np.var(tree_predictions, axis=0)
             
-            # Predict score (0-100)
-            raw_score = self.model.predict(X_scaled)[0]
-            score = np.clip(raw_score, 0, 100)
+            # Predict scores (0-100); the forest predicts the mean of its trees
+            scores = np.clip(tree_mean, 0, 100)
             
             # Calculate confidence based on model uncertainty
-            confidence = self._calculate_confidence(X_scaled, score)
+            confidences = self._calculate_confidences(tree_variance)
             
-            return float(score), float(confidence)
+            return scores, confidences
             
         except Exception as e:
-            logger.error(f"Error predicting score: {e}")
-            return self._generate_mock_score(features_dict)
+            logger.error(f"Error predicting scores: {e}")
+            return self._generate_mock_scores(X)
     
-    def _generate_mock_score(self, features_dict: Dict[str, float]) -> Tuple[float, float]:
-        """Generate a realistic mock score for demo purposes"""
+    def _generate_mock_scores(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Generate realistic mock scores for demo purposes, one per row of X"""
+        
+        def column(name: str) -> np.ndarray:
+            index = self._feature_index.get(name)
+            return X[:, index] if index is not None else np.zeros(len(X))
         
         # Base score around 50
         base_score = 50.0
         
         # Adjust based on activity level
-        total_events = features_dict.get('total_events', 0)
-        events_per_second = features_dict.get('events_per_second', 0)
+        total_events = column('total_events')
+        events_per_second = column('events_per_second')
         
         # More activity = higher score (up to a point)
-        activity_boost = min(total_events * 0.5, 20)
-        frequency_boost = min(events_per_second * 10, 15)
+        activity_boost = np.minimum(total_events * 0.5, 20)
+        frequency_boost = np.minimum(events_per_second * 10, 15)
         
         # Typing activity indicates engagement
-        typing_speed = features_dict.get('typing_speed_chars_per_min', 0)
-        typing_boost = min(typing_speed * 0.1, 10)
+        typing_speed = column('typing_speed_chars_per_min')
+        typing_boost = np.minimum(typing_speed * 0.1, 10)
         
         # Scroll activity
-        scroll_velocity = features_dict.get('scroll_velocity_mean', 0)
-        scroll_boost = min(scroll_velocity * 0.05, 8)
+        scroll_velocity = column('scroll_velocity_mean')
+        scroll_boost = np.minimum(scroll_velocity * 0.05, 8)
         
         # Pauses might indicate consideration (moderate boost)
-        pause_count = features_dict.get('pause_count', 0)
-        pause_effect = min(pause_count * 2, 10) if pause_count < 5 else -5
+        pause_count = column('pause_count')
+        pause_effect = np.where(pause_count < 5, np.minimum(pause_count * 2, 10), -5)
         
         # Combine factors
-        score = base_score + activity_boost + frequency_boost + typing_boost + scroll_boost + pause_effect
+        scores = base_score + activity_boost + frequency_boost + typing_boost + scroll_boost + pause_effect
         
         # Add some randomness
-        score += np.random.normal(0, 5)
+        scores += np.random.normal(0, 5, len(X))
         
         # Clip to valid range
-        score = np.clip(score, 0, 100)
+        scores = np.clip(scores, 0, 100)
         
         # Confidence based on data quality
-        confidence = 0.6
-        if total_events > 10:
-            confidence += 0.1
-        if events_per_second > 0.1:
-            confidence += 0.1
-        if typing_speed > 10:
-            confidence += 0.1
-        if scroll_velocity > 1:
-            confidence += 0.1
+        confidences = (
+            0.6
+            + 0.1 * (total_events > 10)
+            + 0.1 * (events_per_second > 0.1)
+            + 0.1 * (typing_speed > 10)
+            + 0.1 * (scroll_velocity > 1)
+        )
         
-        confidence = np.clip(confidence, 0.3, 0.95)
+        confidences = np.clip(confidences, 0.3, 0.95)
         
-        return float(score), float(confidence)
+        return scores, confidences
     
-    def _calculate_confidence(self, X_scaled: np.ndarray, score: float) -> float:
-        """Calculate prediction confidence"""
-        # For RandomForest, we can use tree variance as uncertainty measure
+    def _tree_predictions(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Prediction of every tree for every row, shape (n_trees, n_rows)"""
+        values, offsets = self._leaf_values()
+        # apply() finds each row's leaf in every tree in one pass; the leaf ids
+        # index a flat table of all trees' node values
+        leaves = self.model.apply(X_scaled)
+        return values[leaves.T + offsets[:, None]]
+    
+    def _leaf_values(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Node values of all trees concatenated, and each tree's offset into them"""
+        if self._leaf_table is None or self._leaf_table[0] is not self.model:
+            trees = [estimator.tree_ for estimator in self.model.estimators_]
+            values = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+            offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+            self._leaf_table = (self.model, values, offsets)
+        return self._leaf_table[1], self._leaf_table[2]
+    
+    def _export_forest(self):
+        """Export the trained forest to a FlatForest if selected, keeping it only if it matches sklearn"""
+        self._flat_forest = None
+        if self.predictor != "flat" or not self.is_trained:
+            return
         try:
-            # Get predictions from all trees
-            tree_predictions = np.array([tree.predict(X_scaled)[0] for tree in self.model.estimators_])
-            
-            # Calculate variance across trees
-            prediction_variance = np.var(tree_predictions)
-            
-            # Convert variance to confidence (0-1)
-            # Lower variance = higher confidence
-            max_variance = 400  # Tunable parameter
-            confidence = 1.0 - min(prediction_variance / max_variance, 1.0)
-            
-            # Ensure minimum confidence
-            confidence = max(confidence, 0.3)
-            
-            return confidence
-            
+            flat = FlatForest.from_model(self.model, self.scaler)
+            probe = np.random.default_rng(0).normal(size=(PARITY_ROWS, len(self.feature_names)))
+            X = probe * self.scaler.scale_ + self.scaler.mean_
+            if not np.array_equal(flat.tree_predictions(X), self._tree_predictions(self.scaler.transform(X))):
+                logger.error("Exported forest does not match sklearn; predicting with sklearn")
+                return
+            self._flat_forest = flat
         except Exception as e:
-            logger.warning(f"Error calculating confidence: {e}")
-            return 0.6  # Default confidence
+            logger.error(f"Error exporting forest, predicting with sklearn: {e}")
+    
+    def _calculate_confidences(self, prediction_variance: np.ndarray) -> np.ndarray:
+        """Calculate prediction confidence for each row from the variance across trees"""
+        # For RandomForest, we can use tree variance as uncertainty measure
+        # Convert variance to confidence (0-1)
+        # Lower variance = higher confidence
+        max_variance = 400  # Tunable parameter
+        confidences = 1.0 - np.minimum(prediction_variance / max_variance, 1.0)
+        
+        # Ensure minimum confidence
+        return np.maximum(confidences, 0.3)
     
     def train_model(self, features_df: pd.DataFrame, scores: np.ndarray) -> Dict[str, float]:
         """
@@ -180,7 +252,9 @@ class InterestScoreModel:
             X_test_scaled = self.scaler.transform(X_test)
             
             # Train model
+            self._forest_path = None
             self.model.fit(X_train_scaled, y_train)
+            self._leaf_table = None
             
             # Evaluate
             train_pred = self.model.predict(X_train_scaled)
@@ -196,6 +270,7 @@ class InterestScoreModel:
             }
             
             self.is_trained = True
+            self._export_forest()
             logger.info(f"Model trained successfully: {metrics}")
             
             return metrics
@@ -205,7 +280,11 @@ class InterestScoreModel:
             raise
     
     def save_model(self, filepath: str):
-        """Save trained model to disk"""
+        """
+        Save trained model to disk, with the exported forest (if any) as
+        memory-mappable arrays in flat_export_dir(filepath)
+        """
+        self._ensure_forest()
         model_data = {
             'model': self.model,
             'scaler': self.scaler,
@@ -216,18 +295,41 @@ class InterestScoreModel:
         }
         
         joblib.dump(model_data, filepath)
+        
+        export_dir = flat_export_dir(filepath)
+        if self._flat_forest is not None:
+            self._flat_forest.save(export_dir, {
+                'feature_names': self.feature_names,
+                'is_trained': self.is_trained,
+                'model_version': self.model_version,
+                'saved_at': model_data['saved_at']
+            })
+        elif os.path.isdir(export_dir):
+            # Do not leave an export of a previous model next to this one
+            shutil.rmtree(export_dir)
         logger.info(f"Model saved to {filepath}")
     
-    def load_model(self, filepath: str):
-        """Load trained model from disk"""
+    def load_model(self, filepath: str, mmap: bool = True):
+        """
+        Load trained model from disk. With the flat predictor and an export
+        saved alongside, the memory-mapped export is all that is loaded (shared
+        by every process serving it); the sklearn forest is loaded only if
+        something needs it.
+        """
         try:
-            model_data = joblib.load(filepath)
+            if self.predictor == "flat" and self._load_export(filepath, mmap):
+                logger.info(f"Model loaded from {flat_export_dir(filepath)}")
+                return
+            
+            model_data = joblib.load(filepath, mmap_mode='r' if mmap else None)
             
             self.model = model_data['model']
             self.scaler = model_data['scaler']
-            self.feature_names = model_data['feature_names']
+            self._set_feature_names(model_data['feature_names'])
             self.is_trained = model_data['is_trained']
             self.model_version = model_data.get('model_version', '1.0')
+            self._leaf_table = None
+            self._export_forest()
             
             logger.info(f"Model loaded from {filepath}")
             
@@ -235,11 +337,46 @@ class InterestScoreModel:
             logger.error(f"Error loading model: {e}")
             raise
     
+    def _load_export(self, filepath: str, mmap: bool) -> bool:
+        """Load the FlatForest export saved with filepath; False if there is none or it is older"""
+        export_dir = flat_export_dir(filepath)
+        meta_path = os.path.join(export_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        if os.path.exists(filepath) and os.path.getmtime(filepath) > os.path.getmtime(meta_path):
+            logger.warning(f"Ignoring {export_dir}: older than {filepath}")
+            return False
+        self._flat_forest, meta = FlatForest.load(export_dir, mmap_mode='r' if mmap else None)
+        self._set_feature_names(meta['feature_names'])
+        self.is_trained = meta['is_trained']
+        self.model_version = meta.get('model_version', '1.0')
+        self._leaf_table = None
+        self._forest_path = filepath if os.path.exists(filepath) else None
+        return True
+    
+    def _ensure_forest(self):
+        """Load the sklearn forest and scaler skipped by a load from the flat export"""
+        if self._forest_path is not None:
+            model_data = joblib.load(self._forest_path)
+            self.model = model_data['model']
+            self.scaler = model_data['scaler']
+            self._forest_path = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """What is being served and how long the first prediction took"""
+        return {
+            'trained': self.is_trained,
+            'model_version': self.model_version,
+            'predictor': 'flat' if self._flat_forest is not None else 'sklearn',
+            'first_predict_seconds': self.first_predict_seconds
+        }
+    
     def get_feature_importance(self) -> Dict[str, float]:
         """Get feature importance scores"""
         if not self.is_trained:
             return {}
         
+        self._ensure_forest()
         importance_scores = self.model.feature_importances_
         
         return {
@@ -247,27 +384,76 @@ class InterestScoreModel:
             for feature, score in zip(self.feature_names, importance_scores)
         }
 
-# Global model instance
-_model_instance = None
+def _load_model_file(filepath: Optional[str], version: Optional[str]) -> InterestScoreModel:
+    """
+    Registry loader: the model saved at filepath, labelled with its registry
+    version. Without a file, the mock scorer, whose model_version is None.
+    """
+    model = InterestScoreModel()
+    if filepath is None:
+        model.model_version = None
+        return model
+    model.load_model(filepath)
+    if version is not None:
+        model.model_version = version
+    return model
 
-def get_model() -> InterestScoreModel:
-    """Get or create global model instance"""
-    global _model_instance
-    if _model_instance is None:
-        _model_instance = InterestScoreModel()
-        
-        # Try to load pre-trained model
-        try:
-            _model_instance.load_model('models/interest_score_model.joblib')
-        except:
-            logger.info("No pre-trained model found, using mock scoring")
-    
-    return _model_instance
+# Global model registry; its current model is the one being served
+model_registry = ModelRegistry(
+    MODEL_REGISTRY_DIR,
+    os.path.basename(MODEL_FILE),
+    _load_model_file,
+    legacy_path=MODEL_FILE,
+    poll_seconds=MODEL_REGISTRY_POLL_SECONDS
+)
+
+def get_model(version: Optional[str] = None) -> InterestScoreModel:
+    """
+    Get the model being served, loading it on first use. With version, switch
+    to that version first (compute pool workers follow the parent's version).
+    """
+    return model_registry.model(version)
+
+def score_features(features_dict: Dict[str, float], session_id: Optional[str] = None,
+                   window_minutes: Optional[int] = None) -> Tuple[float, float]:
+    """
+    Score behavioral features and return (score, confidence). With session_id
+    (and the window the features were extracted for) the score is cached with
+    the session's cached features and reused while they and the model are unchanged.
+    """
+    model = get_model()
+    if session_id is not None:
+        cached = feature_cache.score(session_id, window_minutes, features_dict, model.model_version)
+        if cached is not None:
+            return cached
+    result = model.predict_score(features_dict)
+    if session_id is not None:
+        feature_cache.store_score(session_id, window_minutes, features_dict, result, model.model_version)
+    return result
 
-def score_features(features_dict: Dict[str, float]) -> Tuple[float, float]:
-    """Score behavioral features and return (score, confidence)"""
+def score_features_many(features_by_session: Dict[str, Dict[str, float]],
+                        window_minutes: Optional[int] = None) -> Tuple[Dict[str, Tuple[float, float]], Optional[str]]:
+    """
+    score_features for several sessions: cached scores are reused and the rest
+    are scored with one predict_many call. Returns the scores and the version
+    of the model that computed them (None for the mock scorer).
+    """
+    # One model for the whole batch, even if another version is swapped in meanwhile
     model = get_model()
-    return model.predict_score(features_dict)
+    scores, missing = {}, []
+    for session_id, features_dict in features_by_session.items():
+        cached = feature_cache.score(session_id, window_minutes, features_dict, model.model_version)
+        if cached is None:
+            missing.append(session_id)
+        else:
+            scores[session_id] = cached
+    if missing:
+        predicted, confidences = model.predict_many([features_by_session[s] for s in missing])
+        for session_id, score, confidence in zip(missing, predicted.tolist(), confidences.tolist()):
+            scores[session_id] = (score, confidence)
+            feature_cache.store_score(session_id, window_minutes, features_by_session[session_id],
+                                      scores[session_id], model.model_version)
+    return scores, model.model_version
 
 if __name__ == "__main__":
     # Test the model with sample features
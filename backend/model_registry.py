@@ -0,0 +1,207 @@
+"""
+Versioned model registry with hot swap.
+
+Layout under root (config.MODEL_REGISTRY_DIR):
+
+    root/<version>/interest_score_model.joblib   saved by InterestScoreModel.save_model,
+    root/<version>/interest_score_model.flat/    with its memory-mappable export
+    root/ACTIVE                                  name of the version to serve
+
+The serving model is a single reference. A new version is loaded in the
+background (activate() from the admin endpoint, or the watcher thread noticing
+a new ACTIVE) and only then replaces the reference, so scoring never waits
+for a load. Callers take the reference once per prediction, so requests that
+are already scoring finish on the model they started with. Every process
+watches ACTIVE, so all workers of a deployment follow an activation within
+poll_seconds; compute pool workers load whichever version the parent asks for.
+
+Without ACTIVE the newest version (in name order) is served; without any
+version, the single legacy model file, or the mock scorer if there is none.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_FILE = "ACTIVE"
+
+class ModelRegistry:
+    def __init__(self, root: str, model_file: str, loader: Callable[[Optional[str], Optional[str]], Any],
+                 legacy_path: Optional[str] = None, poll_seconds: float = 5.0, keep_loaded: int = 2):
+        self.root = root
+        self.model_file = model_file    # artifact file name inside a version directory
+        self.loader = loader            # loader(path or None for the mock, version label) -> model
+        self.legacy_path = legacy_path
+        self.poll_seconds = poll_seconds
+        self.keep_loaded = keep_loaded  # recently replaced models kept for switching back
+        self._current = None
+        self._previous: OrderedDict = OrderedDict()  # version -> model
+        self._lock = threading.Lock()  # serializes loads and swaps, not predictions
+        self._failed_version: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.counters = Counters()
+
+    def versions(self) -> List[str]:
+        """Published versions in name order"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name for name in names
+            if not name.startswith('.') and os.path.isfile(os.path.join(self.root, name, self.model_file))
+        )
+
+    def active_version(self) -> Optional[str]:
+        """The version named by ACTIVE, else the newest, else None"""
+        try:
+            with open(os.path.join(self.root, ACTIVE_FILE)) as f:
+                version = f.read().strip()
+            if version:
+                return version
+        except FileNotFoundError:
+            pass
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def current(self):
+        """The serving model, loaded on first use"""
+        model = self._current
+        if model is None:
+            with self._lock:
+                if self._current is None:
+                    self._current = self._load(self.active_version(), fallback=True)
+                model = self._current
+        return model
+
+    def model(self, version: Optional[str] = None):
+        """The serving model, first switching to `version` if given and different"""
+        model = self.current()
+        if version is None or model.model_version == version:
+            return model
+        return self.swap(version)
+
+    def swap(self, version: Optional[str] = None):
+        """
+        Load `version` (default: the active one) and make it the serving model.
+        The current model serves until the new one is loaded, and keeps serving
+        if the load fails (the error is raised).
+        """
+        version = version or self.active_version()
+        with self._lock:
+            current = self._current
+            if current is not None and version is not None and current.model_version == version:
+                return current
+            try:
+                model = self._previous.pop(version, None) or self._load(version)
+            except Exception:
+                self.counters.incr('swap_failures')
+                raise
+            if current is not None:
+                self._previous[current.model_version] = current
+                while len(self._previous) > self.keep_loaded:
+                    self._previous.popitem(last=False)
+            self._current = model
+        self.counters.incr('swaps')
+        logger.info(f"Serving model version {model.model_version}")
+        return model
+
+    def activate(self, version: str):
+        """Serve `version` here now and, through ACTIVE, in every other process"""
+        if version not in self.versions():
+            raise KeyError(version)
+        model = self.swap(version)
+        self._write_active(version)
+        return model
+
+    def publish(self, model, version: str, activate: bool = False) -> str:
+        """Save a trained model as a new version; its directory appears complete or not at all"""
+        target = os.path.join(self.root, version)
+        if os.path.exists(target):
+            raise ValueError(f"Model version {version} already exists")
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{version}.", dir=self.root)
+        model.save_model(os.path.join(staging, self.model_file))
+        os.rename(staging, target)
+        if activate:
+            self.activate(version)
+        return target
+
+    def start_watching(self):
+        """Poll ACTIVE in a background thread and swap when it names another version"""
+        if self._watcher is None and self.poll_seconds > 0:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            current = self._current
+            version = self.active_version()
+            if current is None or version is None or version == current.model_version:
+                continue
+            if version == self._failed_version:
+                # Already failed to load; wait until ACTIVE names something else
+                continue
+            try:
+                self.swap(version)
+                self._failed_version = None
+            except Exception as e:
+                self._failed_version = version
+                logger.error(f"Error loading model version {version}; still serving {current.model_version}: {e}")
+
+    def _load(self, version: Optional[str], fallback: bool = False):
+        start = time.perf_counter()
+        if version is not None:
+            path = os.path.join(self.root, version, self.model_file)
+            if not os.path.isfile(path):
+                raise KeyError(version)
+        else:
+            path = self.legacy_path if self.legacy_path and os.path.isfile(self.legacy_path) else None
+        try:
+            model = self.loader(path, version)
+        except Exception as e:
+            if not fallback:
+                raise
+            logger.error(f"Error loading model {path}, using mock scoring: {e}")
+            model = self.loader(None, None)
+        if path is None:
+            logger.info("No pre-trained model found, using mock scoring")
+        self._load_seconds = time.perf_counter() - start
+        self.counters.incr('loads')
+        return model
+
+    def _write_active(self, version: str):
+        # Write a new file and rename it over the old one, so readers never see a partial name
+        path = os.path.join(self.root, ACTIVE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        stats['active_version'] = self.active_version()
+        stats['versions'] = len(self.versions())
+        model = self._current
+        stats['loaded'] = model is not None
+        if model is not None:
+            stats.update(model.stats())
+            stats['load_seconds'] = self._load_seconds
+        return stats
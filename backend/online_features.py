@@ -0,0 +1,483 @@
+"""
+Incremental per-session feature extraction.
+
+FeatureExtractor.extract_session_features re-reads and re-aggregates the whole
+session on every batch. OnlineFeatureExtractor instead keeps running aggregates
+per session (counts, Welford mean/variance, maxima, sign-change and burst
+counters) and only fetches events it has not applied yet, so each update costs
+O(new events). The feature dict matches
+FeatureExtractor._extract_features_from_df for the same events;
+tests/test_online_features.py checks the parity.
+
+Medians, the velocity p95 and the typing rhythm entropy come from KLL quantile
+sketches (quantile_sketch.py) instead of the full series, so a session's state
+stays O(sketch_k) however long it runs. They match the pandas values exactly
+until a series exceeds sketch_k values and are approximate (rank error about
+1% for the default k) beyond that.
+
+Events are applied in timestamp order. If a batch contains an event older than
+the last one applied (a late upload), the session is rebuilt from the database.
+
+Event ids are not a safe watermark on their own: with concurrent writers
+(PostgreSQL) a transaction holding a lower id can commit after a higher id has
+already been read. Each session therefore re-reads ids above safe_id and skips
+the ones it has applied; an id becomes safe commit_lag_seconds after it was
+first read, by which time every insert that took a lower id has committed or
+rolled back. A transaction that commits later than that is missed until the
+session is rebuilt (a late upload or eviction), so the drift is bounded by
+config.ONLINE_FEATURE_COMMIT_LAG_SECONDS.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import ExitStack
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, or_, select
+
+from feature_kernel import (
+    ETYPES, SCROLL_BURST_SECONDS, TYPING_BURST_SECONDS, RAPID_TAP_SECONDS, LONG_PAUSE_MS,
+    entropy_of_counts, rhythm_edges
+)
+from metrics import Counters
+from models import DBEvent, SessionLocal
+from quantile_sketch import DEFAULT_K, KLLSketch
+
+_FETCH_COLUMNS = (
+    DBEvent.id, DBEvent.ts, DBEvent.etype, DBEvent.duration_ms, DBEvent.delta,
+    DBEvent.velocity, DBEvent.accel, DBEvent.input_len, DBEvent.backspaces
+)
+
+class RunningStats:
+    """Welford running mean/variance plus max; std is NaN below two samples like pandas"""
+
+    __slots__ = ('n', 'mean', 'm2', 'max')
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        if x > self.max:
+            self.max = x
+
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+class SessionFeatureState:
+    """Running aggregates for one session, updated with events in timestamp order"""
+
+    def __init__(self, sketch_k: int = DEFAULT_K):
+        self.lock = threading.Lock()
+        self.sketch_k = sketch_k
+        self.reset()
+
+    def reset(self):
+        self.safe_id = 0  # every event at or below this id has been applied
+        self.applied_ids = set()  # applied events above safe_id, skipped when re-read
+        self.max_id = 0
+        self.seen: deque = deque()  # (time read, max_id then), oldest first
+        self.counts = dict.fromkeys(ETYPES, 0)
+        self.total = 0
+        self.first_ts: Optional[datetime] = None
+        self.last_ts: Optional[datetime] = None
+        self.intervals = RunningStats()
+
+        # SCROLL
+        self.velocity = RunningStats()
+        self.velocity_sketch = KLLSketch(self.sketch_k)
+        self.accel = RunningStats()
+        self.delta_count = 0
+        self.last_delta_sign: Optional[float] = None
+        self.direction_changes = 0
+        self.last_scroll_ts: Optional[datetime] = None
+        self.scroll_bursts = 0
+
+        # TYPE
+        self.first_type_ts: Optional[datetime] = None
+        self.last_type_ts: Optional[datetime] = None
+        self.key_intervals = RunningStats()
+        self.key_interval_sketch = KLLSketch(self.sketch_k)
+        self.typing_bursts = 0
+        self.backspaces = 0.0
+        self.input_len_max: Optional[float] = None
+        self.last_input_len: Optional[float] = None
+        self.chars_typed = 0.0
+
+        # TAP
+        self.first_tap_ts: Optional[datetime] = None
+        self.last_tap_ts: Optional[datetime] = None
+        self.tap_intervals = RunningStats()
+        self.tap_interval_sketch = KLLSketch(self.sketch_k)
+        self.rapid_taps = 0
+
+        # PAUSE
+        self.pause_durations = RunningStats()
+        self.pause_duration_sketch = KLLSketch(self.sketch_k)
+        self.long_pauses = 0
+
+    def update(self, events: Iterable[Any]):
+        """Apply events (objects with DBEvent attribute names) sorted by ts"""
+        for event in events:
+            ts = event.ts
+            etype = event.etype
+            if self.last_ts is not None:
+                self.intervals.add((ts - self.last_ts).total_seconds())
+            else:
+                self.first_ts = ts
+            self.last_ts = ts
+            self.total += 1
+            if etype in self.counts:
+                self.counts[etype] += 1
+            if event.id is not None:
+                self.applied_ids.add(event.id)
+                if event.id > self.max_id:
+                    self.max_id = event.id
+
+            if etype == 'SCROLL':
+                self._add_scroll(event, ts)
+            elif etype == 'TYPE':
+                self._add_type(event, ts)
+            elif etype == 'TAP':
+                self._add_tap(ts)
+            elif etype == 'PAUSE':
+                if not _is_missing(event.duration_ms):
+                    self.pause_durations.add(event.duration_ms)
+                    self.pause_duration_sketch.add(event.duration_ms)
+                    if event.duration_ms > LONG_PAUSE_MS:
+                        self.long_pauses += 1
+
+    def new_events(self, events: List[Any]) -> List[Any]:
+        """Fetched events not applied yet"""
+        return [event for event in events if event.id not in self.applied_ids]
+
+    def mark_read(self, read_at: float):
+        """Record that every id up to max_id had been allocated by read_at"""
+        if not self.seen or self.seen[-1][1] != self.max_id:
+            self.seen.append((read_at, self.max_id))
+
+    def watermark(self, settled_before: float) -> int:
+        """Advance safe_id to the ids read before settled_before and return it"""
+        advanced = False
+        while self.seen and self.seen[0][0] <= settled_before:
+            self.safe_id = max(self.safe_id, self.seen.popleft()[1])
+            advanced = True
+        if advanced:
+            self.applied_ids = {event_id for event_id in self.applied_ids if event_id > self.safe_id}
+        return self.safe_id
+
+    def _add_scroll(self, event, ts: datetime):
+        if not _is_missing(event.velocity):
+            self.velocity.add(event.velocity)
+            self.velocity_sketch.add(event.velocity)
+        if not _is_missing(event.accel):
+            self.accel.add(event.accel)
+        if not _is_missing(event.delta):
+            sign = float(np.sign(event.delta))
+            if self.last_delta_sign is not None and sign != self.last_delta_sign:
+                self.direction_changes += 1
+            self.last_delta_sign = sign
+            self.delta_count += 1
+        if self.last_scroll_ts is not None and (ts - self.last_scroll_ts).total_seconds() < SCROLL_BURST_SECONDS:
+            self.scroll_bursts += 1
+        self.last_scroll_ts = ts
+
+    def _add_type(self, event, ts: datetime):
+        if self.last_type_ts is not None:
+            interval = (ts - self.last_type_ts).total_seconds()
+            self.key_intervals.add(interval)
+            self.key_interval_sketch.add(interval)
+            if interval < TYPING_BURST_SECONDS:
+                self.typing_bursts += 1
+        else:
+            self.first_type_ts = ts
+        self.last_type_ts = ts
+
+        if not _is_missing(event.backspaces):
+            self.backspaces += event.backspaces
+        input_len = None if _is_missing(event.input_len) else event.input_len
+        if input_len is not None:
+            if self.input_len_max is None or input_len > self.input_len_max:
+                self.input_len_max = input_len
+            if self.last_input_len is not None:
+                self.chars_typed += input_len - self.last_input_len
+        self.last_input_len = input_len
+
+    def _add_tap(self, ts: datetime):
+        if self.last_tap_ts is not None:
+            interval = (ts - self.last_tap_ts).total_seconds()
+            self.tap_intervals.add(interval)
+            self.tap_interval_sketch.add(interval)
+            if interval < RAPID_TAP_SECONDS:
+                self.rapid_taps += 1
+        else:
+            self.first_tap_ts = ts
+        self.last_tap_ts = ts
+
+    def features(self) -> Dict[str, float]:
+        """Same keys and values as FeatureExtractor._extract_features_from_df"""
+        if self.total == 0:
+            return {}
+        features = {}
+        features.update(self._basic_features())
+        features.update(self._scroll_features())
+        features.update(self._typing_features())
+        features.update(self._tap_features())
+        features.update(self._temporal_features())
+        features.update(self._pause_features())
+        return features
+
+    def sketches(self) -> Dict[str, Dict[str, Any]]:
+        """Serialized quantile sketches, keyed by the feature name prefix they back"""
+        return {
+            'scroll_velocity': self.velocity_sketch.to_dict(),
+            'inter_key_interval': self.key_interval_sketch.to_dict(),
+            'tap_interval': self.tap_interval_sketch.to_dict(),
+            'pause_duration': self.pause_duration_sketch.to_dict()
+        }
+
+    def _basic_features(self) -> Dict[str, float]:
+        features = {}
+        for etype in ETYPES:
+            features[f'{etype.lower()}_count'] = self.counts[etype]
+            features[f'{etype.lower()}_ratio'] = self.counts[etype] / max(self.total, 1)
+        features['total_events'] = self.total
+        if self.total > 1:
+            duration_seconds = (self.last_ts - self.first_ts).total_seconds()
+            features['session_duration_seconds'] = duration_seconds
+            features['events_per_second'] = self.total / max(duration_seconds, 1)
+        else:
+            features['session_duration_seconds'] = 0
+            features['events_per_second'] = 0
+        return features
+
+    def _scroll_features(self) -> Dict[str, float]:
+        if self.counts['SCROLL'] == 0:
+            return {
+                'scroll_velocity_mean': 0,
+                'scroll_velocity_std': 0,
+                'scroll_velocity_max': 0,
+                'scroll_accel_mean': 0,
+                'scroll_accel_std': 0,
+                'scroll_direction_changes': 0,
+                'scroll_burst_count': 0
+            }
+        features = {}
+        if self.velocity.n:
+            features['scroll_velocity_mean'] = self.velocity.mean
+            features['scroll_velocity_std'] = self.velocity.std()
+            features['scroll_velocity_max'] = self.velocity.max
+            features['scroll_velocity_p95'] = self.velocity_sketch.quantile(0.95)
+        if self.accel.n:
+            features['scroll_accel_mean'] = self.accel.mean
+            features['scroll_accel_std'] = self.accel.std()
+            features['scroll_accel_max'] = self.accel.max
+        if self.delta_count > 1:
+            features['scroll_direction_changes'] = self.direction_changes
+        features['scroll_burst_count'] = self.scroll_bursts
+        return features
+
+    def _typing_features(self) -> Dict[str, float]:
+        type_count = self.counts['TYPE']
+        if type_count == 0:
+            return {
+                'typing_speed_chars_per_min': 0,
+                'backspace_ratio': 0,
+                'typing_burst_count': 0,
+                'inter_key_interval_mean': 0,
+                'inter_key_interval_std': 0,
+                'typing_rhythm_entropy': 0
+            }
+        features = {}
+        if self.key_intervals.n:
+            features['inter_key_interval_mean'] = self.key_intervals.mean
+            features['inter_key_interval_std'] = self.key_intervals.std()
+            features['inter_key_interval_median'] = self.key_interval_sketch.median()
+            features['typing_rhythm_entropy'] = self._rhythm_entropy()
+
+        total_chars = self.input_len_max if self.input_len_max is not None else math.nan
+        features['backspace_ratio'] = self.backspaces / max(total_chars + self.backspaces, 1)
+        features['total_backspaces'] = self.backspaces
+
+        if self.key_intervals.n:
+            features['typing_burst_count'] = self.typing_bursts
+        if type_count > 1:
+            duration_minutes = (self.last_type_ts - self.first_type_ts).total_seconds() / 60
+            features['typing_speed_chars_per_min'] = self.chars_typed / max(duration_minutes, 0.01)
+        return features
+
+    def _tap_features(self) -> Dict[str, float]:
+        tap_count = self.counts['TAP']
+        if tap_count == 0:
+            return {
+                'tap_frequency': 0,
+                'tap_interval_mean': 0,
+                'tap_interval_std': 0,
+                'rapid_tap_sequences': 0
+            }
+        features = {}
+        if self.tap_intervals.n:
+            features['tap_interval_mean'] = self.tap_intervals.mean
+            features['tap_interval_std'] = self.tap_intervals.std()
+            features['tap_interval_median'] = self.tap_interval_sketch.median()
+            features['rapid_tap_sequences'] = self.rapid_taps
+        if tap_count > 1:
+            duration_seconds = (self.last_tap_ts - self.first_tap_ts).total_seconds()
+            features['tap_frequency'] = tap_count / max(duration_seconds, 1)
+        return features
+
+    def _rhythm_entropy(self) -> float:
+        # Bin counts of pd.cut(intervals, bins=10) from the sketch's CDF at the bin edges
+        sketch = self.key_interval_sketch
+        edges = rhythm_edges(sketch.min, sketch.max)
+        return entropy_of_counts(np.diff(sketch.cdf(edges)))
+
+    def _temporal_features(self) -> Dict[str, float]:
+        if self.total < 2:
+            return {'temporal_regularity': 0, 'activity_density': 0}
+        cv = self.intervals.std() / max(self.intervals.mean, 0.001)
+        total_duration = (self.last_ts - self.first_ts).total_seconds() / 60
+        return {
+            'temporal_regularity': 1 / (1 + cv),
+            'activity_density': self.total / max(total_duration, 0.01)
+        }
+
+    def _pause_features(self) -> Dict[str, float]:
+        if self.counts['PAUSE'] == 0:
+            return {
+                'pause_count': 0,
+                'pause_duration_mean': 0,
+                'pause_duration_max': 0,
+                'long_pause_count': 0
+            }
+        durations = self.pause_durations
+        if not durations.n:
+            return {}
+        return {
+            'pause_count': durations.n,
+            'pause_duration_mean': durations.mean,
+            'pause_duration_std': durations.std(),
+            'pause_duration_max': durations.max,
+            'pause_duration_median': self.pause_duration_sketch.median(),
+            'long_pause_count': self.long_pauses,
+            'long_pause_ratio': self.long_pauses / durations.n
+        }
+
+class OnlineFeatureExtractor:
+    """
+    Keeps a SessionFeatureState per session (LRU, at most max_sessions) and
+    brings it up to date with the events stored since the last call.
+    """
+
+    def __init__(self, max_sessions: int = 10000, sketch_k: int = DEFAULT_K, commit_lag_seconds: float = 5.0):
+        self.max_sessions = max_sessions
+        self.sketch_k = sketch_k
+        self.commit_lag_seconds = commit_lag_seconds
+        self._states: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = Counters()
+
+    def session_features(self, session_id: str) -> Dict[str, float]:
+        return self.session_features_many([session_id])[session_id]
+
+    def session_features_many(self, session_ids: Iterable[str]) -> Dict[str, Dict[str, float]]:
+        """Bring several sessions up to date with one query for all their new events"""
+        return {
+            session_id: features for session_id, (features, _) in self.session_summaries_many(session_ids).items()
+        }
+
+    def session_summaries_many(
+        self, session_ids: Iterable[str]
+    ) -> Dict[str, Tuple[Dict[str, float], Dict[str, Dict[str, Any]]]]:
+        """Like session_features_many, with each session's serialized quantile sketches"""
+        states = {session_id: self._state(session_id) for session_id in dict.fromkeys(session_ids)}
+        with ExitStack() as stack:
+            # Lock in a fixed order so concurrent batches cannot deadlock
+            for session_id in sorted(states):
+                stack.enter_context(states[session_id].lock)
+
+            read_at = time.monotonic()
+            settled_before = read_at - self.commit_lag_seconds
+            db = SessionLocal()
+            try:
+                events = self._fetch(db, {
+                    session_id: state.watermark(settled_before) for session_id, state in states.items()
+                })
+                for session_id, state in states.items():
+                    fetched = len(events[session_id])
+                    events[session_id] = state.new_events(events[session_id])
+                    self.counters.incr('events_reread', fetched - len(events[session_id]))
+                late = [
+                    session_id for session_id, state in states.items()
+                    if events[session_id] and state.last_ts is not None and events[session_id][0].ts < state.last_ts
+                ]
+                if late:
+                    # Late events older than what was already applied: start those sessions over
+                    self.counters.incr('rebuilds', len(late))
+                    for session_id in late:
+                        states[session_id].reset()
+                    events.update(self._fetch(db, dict.fromkeys(late, 0)))
+            finally:
+                db.close()
+
+            summaries = {}
+            for session_id, state in states.items():
+                state.update(events[session_id])
+                state.mark_read(read_at)
+                self.counters.incr('events_applied', len(events[session_id]))
+                summaries[session_id] = (state.features(), state.sketches())
+            self.counters.incr('updates', len(states))
+            return summaries
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def _fetch(self, db, watermarks: Dict[str, int]) -> Dict[str, List[Any]]:
+        """Events above each session's safe id, grouped by session in ts order"""
+        rows = db.execute(
+            select(DBEvent.session_id, *_FETCH_COLUMNS)
+            .where(or_(*(
+                and_(DBEvent.session_id == session_id, DBEvent.id > after_id)
+                for session_id, after_id in watermarks.items()
+            )))
+            .order_by(DBEvent.session_id, DBEvent.ts, DBEvent.id)
+        ).all()
+        events: Dict[str, List[Any]] = {session_id: [] for session_id in watermarks}
+        for session_id, group in groupby(rows, key=lambda row: row.session_id):
+            events[session_id] = list(group)
+        return events
+
+    def _state(self, session_id: str) -> SessionFeatureState:
+        with self._lock:
+            state = self._states.get(session_id)
+            if state is not None:
+                self._states.move_to_end(session_id)
+                self.counters.incr('state_hits')
+                return state
+            self.counters.incr('state_misses')
+            state = self._states[session_id] = SessionFeatureState(self.sketch_k)
+            while len(self._states) > self.max_sessions:
+                self._states.popitem(last=False)
+                self.counters.incr('evictions')
+            return state
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        with self._lock:
+            stats['sessions'] = len(self._states)
+        return stats
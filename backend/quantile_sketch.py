@@ -0,0 +1,186 @@
+"""
+Mergeable quantile sketch for percentile features.
+
+KLLSketch is the KLL sketch (Karnin, Lang, Liberty 2016) in the compact form
+of Liberty's reference implementation: a stack of compactors, where level h
+holds items of weight 2**h. When the sketch is full, the lowest compactor over
+its capacity is sorted and every other item is promoted one level up.
+Capacities shrink geometrically (factor 2/3) below the top level, so memory is
+O(k) whatever the stream length.
+
+Error bounds: the sketch is exact until it holds more than k values (nothing
+has been compacted yet), so short sessions get the same medians and p95 as
+pandas. Beyond that, a returned quantile's rank is off by at most eps * n,
+where eps is O(1/k) with high probability; for k = 200 the measured worst case
+is about 1% of n (benchmarks/bench_quantile_sketch.py). Extremes (min, max)
+are tracked exactly. Merging two sketches gives the same guarantee as
+sketching the concatenated streams.
+
+Compaction picks the odd or even items with a coin derived from the stream
+length and level, so the same input always produces the same sketch.
+"""
+
+import math
+from typing import Any, Dict, Iterable, List
+
+import numpy as np
+
+DEFAULT_K = 200
+_CAPACITY_DECAY = 2 / 3
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_BULK_CHUNK_FACTOR = 16
+
+class KLLSketch:
+    """Streaming quantiles of float values in O(k) memory"""
+
+    __slots__ = ('k', 'n', 'min', 'max', 'levels', '_size', '_max_size')
+
+    def __init__(self, k: int = DEFAULT_K):
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.levels: List[List[float]] = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return int(math.ceil(self.k * _CAPACITY_DECAY ** depth)) + 1
+
+    def add(self, value: float):
+        self.n += 1
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.levels[0].append(value)
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update(self, values: Iterable[float]):
+        """Add many values; faster than add() for arrays"""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        start = 0
+        while start < len(values):
+            # Compacting a larger buffer at once is still a valid KLL compaction, and far fewer of them
+            end = start + max(self._max_size - self._size, _BULK_CHUNK_FACTOR * self.k)
+            chunk = values[start:end].tolist()
+            self.levels[0].extend(chunk)
+            self.n += len(chunk)
+            self._size += len(chunk)
+            start = end
+            while self._size >= self._max_size:
+                self._compress()
+
+    def merge(self, other: 'KLLSketch') -> 'KLLSketch':
+        """Fold other into this sketch (in place) and return self"""
+        if other.n == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self._grow()
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._size = sum(len(items) for items in self.levels)
+        while self._size >= self._max_size:
+            self._compress()
+        return self
+
+    def _grow(self):
+        self.levels.append([])
+        self._max_size = sum(self._capacity(level) for level in range(len(self.levels)))
+
+    def _compress(self):
+        for level, items in enumerate(self.levels):
+            if len(items) < self._capacity(level):
+                continue
+            if level + 1 == len(self.levels):
+                self._grow()
+            ordered = np.sort(np.asarray(items, dtype=np.float64))
+            odd = len(ordered) % 2
+            coin = (((self.n + level) * _GOLDEN) & _MASK64) >> 63
+            # The smallest item stays behind when the count is odd
+            self.levels[level + 1].extend(ordered[odd + coin::2].tolist())
+            self.levels[level] = ordered[:odd].tolist()
+            self._size = sum(len(level_items) for level_items in self.levels)
+            return
+
+    @property
+    def exact(self) -> bool:
+        """True while every value added is still held with weight 1"""
+        return not any(self.levels[1:])
+
+    def _weighted(self):
+        items = np.concatenate([np.asarray(level_items, dtype=np.float64) for level_items in self.levels])
+        weights = np.concatenate([
+            np.full(len(level_items), 1 << level, dtype=np.int64) for level, level_items in enumerate(self.levels)
+        ])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, q: float) -> float:
+        """q-quantile with linear interpolation between ranks, like pandas' quantile"""
+        if self.n == 0:
+            return math.nan
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        items, cumulative = self._weighted()
+        # Ranks the compacted stream stands for; linear interpolation as in np.quantile
+        position = q * (cumulative[-1] - 1)
+        lower = math.floor(position)
+        below = items[np.searchsorted(cumulative, lower, side='right')]
+        above = items[min(np.searchsorted(cumulative, lower + 1, side='right'), len(items) - 1)]
+        value = float(below + (above - below) * (position - lower))
+        return min(max(value, self.min), self.max)
+
+    def median(self) -> float:
+        if self.exact and self.n:
+            return float(np.median(self.levels[0]))
+        return self.quantile(0.5)
+
+    def cdf(self, values: Iterable[float]) -> np.ndarray:
+        """Estimated number of values <= each of values (exact while self.exact)"""
+        values = np.asarray(values, dtype=np.float64)
+        if self.n == 0:
+            return np.zeros(len(values), dtype=np.int64)
+        items, cumulative = self._weighted()
+        ranks = np.concatenate(([0], cumulative))[np.searchsorted(items, values, side='right')]
+        # The exact extremes pin the ends: below max at least one value is greater, from min on one is counted
+        ranks = np.where(values < self.max, np.minimum(ranks, self.n - 1), self.n)
+        return np.where(values < self.min, 0, np.maximum(ranks, 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable state; from_dict restores an equivalent sketch"""
+        return {
+            'k': self.k,
+            'n': self.n,
+            'min': self.min if self.n else None,
+            'max': self.max if self.n else None,
+            'levels': [list(level_items) for level_items in self.levels]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'KLLSketch':
+        sketch = cls(data['k'])
+        sketch.n = data['n']
+        if sketch.n:
+            sketch.min, sketch.max = data['min'], data['max']
+        sketch.levels = [list(level_items) for level_items in data['levels']] or [[]]
+        sketch._size = sum(len(level_items) for level_items in sketch.levels)
+        sketch._max_size = sum(sketch._capacity(level) for level in range(len(sketch.levels)))
+        return sketch
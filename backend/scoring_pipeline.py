@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from compute_pool import ComputePool
+from feature_extractor import FeatureExtractor, compute_and_store_features_many
+from metrics import Counters
+from ml_model import score_features_many
+
+logger = logging.getLogger(__name__)
+
+# Subscriber signature: async callback(session_id, score, confidence, model_version or None for mock scores)
+ScoreSubscriber = Callable[[str, float, float, Optional[str]], Awaitable[None]]
+
+class ScoringPipeline:
+    """
+    In-process work queue that computes features and scores off the request path.
+
+    Ingest submits session ids once their events are committed. A bounded pool of
+    feature workers takes up to batch_sessions queued sessions at a time,
+    recomputes their session and realtime features with one query each, then
+    hands them to a single scoring stage which scores up to batch_sessions of
+    them with one model call and pushes results to subscribers on the event loop. Both queues are bounded; work that does not fit is dropped and counted.
+
+    Once either queue holds shed_fraction * max_queue items the pipeline is
+    saturated and new sessions are shed (not queued) until it drains, so ingest
+    keeps storing events while scoring falls behind.
+
+    With a compute_pool the realtime feature kernel and model scoring run in its
+    worker processes, so they do not compete with the event loop for the GIL.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 1000, shed_fraction: float = 0.8,
+                 batch_sessions: int = 50, window_minutes: int = 2, compute_pool: Optional[ComputePool] = None):
+        self.workers = workers
+        self.compute_pool = compute_pool
+        self.max_queue = max_queue
+        self.batch_sessions = batch_sessions
+        self.window_minutes = window_minutes
+        self.shed_depth = max(1, int(max_queue * shed_fraction))
+        self._feature_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._score_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._pending: set = set()  # sessions waiting in the feature queue
+        self._pending_lock = threading.Lock()
+        self._subscribers: List[ScoreSubscriber] = []
+        self._threads: List[threading.Thread] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running = False
+        self.counters = Counters()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        """Start the worker threads; scores are delivered on `loop`"""
+        if self._running:
+            return
+        self._loop = loop
+        self._running = True
+        for i in range(self.workers):
+            self._spawn(self._feature_worker, f"feature-worker-{i}")
+        self._spawn(self._scoring_worker, "scoring-worker")
+        logger.info(f"Scoring pipeline started with {self.workers} feature workers")
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the workers; queued work that has not started is discarded"""
+        if not self._running:
+            return
+        self._running = False
+        for _ in range(self.workers):
+            self._feature_queue.put(None)
+        self._score_queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def subscribe(self, callback: ScoreSubscriber):
+        self._subscribers.append(callback)
+
+    def submit(self, session_id: str) -> bool:
+        """
+        Queue a session for feature and score computation.
+        Returns False if the work was shed or dropped because the pipeline is saturated.
+        """
+        with self._pending_lock:
+            if session_id in self._pending:
+                # Already queued; the worker will read the latest events anyway
+                self.counters.incr('coalesced')
+                return True
+            if self.saturated():
+                self.counters.incr('shed')
+                return False
+            try:
+                self._feature_queue.put_nowait((session_id, time.monotonic()))
+            except queue.Full:
+                self.counters.incr('dropped_features')
+                return False
+            self._pending.add(session_id)
+        self.counters.incr('submitted')
+        return True
+
+    def saturated(self) -> bool:
+        return max(self._feature_queue.qsize(), self._score_queue.qsize()) >= self.shed_depth
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        stats.update({
+            'running': self._running,
+            'saturated': self.saturated(),
+            'shed_depth': self.shed_depth,
+            'workers': self.workers,
+            'feature_queue_depth': self._feature_queue.qsize(),
+            'score_queue_depth': self._score_queue.qsize(),
+            'max_queue': self.max_queue
+        })
+        return stats
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _feature_worker(self):
+        while True:
+            item = self._feature_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_sessions:
+                try:
+                    item = self._feature_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._compute_batch(dict(batch))
+            if stopping:
+                return
+
+    def _compute_batch(self, enqueued: Dict[str, float]):
+        """Compute features for {session_id: enqueue time} and queue them for scoring"""
+        now = time.monotonic()
+        with self._pending_lock:
+            for session_id in enqueued:
+                self._pending.discard(session_id)
+        for enqueued_at in enqueued.values():
+            self.counters.observe('queue_lag_seconds', now - enqueued_at)
+        self.counters.observe('batch_sessions', len(enqueued))
+
+        try:
+            stored = compute_and_store_features_many(list(enqueued))
+            if not stored:
+                return
+            realtime = FeatureExtractor().extract_features_many(
+                stored, window_minutes=self.window_minutes, pool=self.compute_pool
+            )
+        except Exception as e:
+            self.counters.incr('failed', len(enqueued))
+            logger.error(f"Error computing features for sessions {list(enqueued)}: {e}")
+            return
+
+        for session_id, features in realtime.items():
+            if not features:
+                continue
+            try:
+                self._score_queue.put_nowait((session_id, features, enqueued[session_id]))
+            except queue.Full:
+                self.counters.incr('dropped_scores')
+
+    def _scoring_worker(self):
+        while True:
+            item = self._score_queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            while len(batch) < self.batch_sessions:
+                try:
+                    item = self._score_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._score_batch(batch)
+            if stopping:
+                return
+
+    def _score_batch(self, batch: List[Tuple[str, Dict[str, float], float]]):
+        """Score (session_id, features, enqueue time) items and publish the results"""
+        # A session queued twice is scored once, with its latest features
+        features, enqueued = {}, {}
+        for session_id, session_features, enqueued_at in batch:
+            features[session_id] = session_features
+            enqueued.setdefault(session_id, enqueued_at)
+        try:
+            if self.compute_pool is not None:
+                scores, model_version = self.compute_pool.scores(features, self.window_minutes)
+            else:
+                scores, model_version = score_features_many(features, self.window_minutes)
+        except Exception as e:
+            self.counters.incr('failed', len(features))
+            logger.error(f"Error scoring sessions {list(features)}: {e}")
+            return
+        now = time.monotonic()
+        for session_id, (score, confidence) in scores.items():
+            self.counters.incr('scored')
+            self.counters.observe('end_to_end_seconds', now - enqueued[session_id])
+            self._publish(session_id, score, confidence, model_version)
+
+    def _publish(self, session_id: str, score: float, confidence: float, model_version: Optional[str]):
+        if self._loop is None or self._loop.is_closed():
+            return
+        for callback in self._subscribers:
+            asyncio.run_coroutine_threadsafe(callback(session_id, score, confidence, model_version), self._loop)
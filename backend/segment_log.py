@@ -0,0 +1,431 @@
+"""
+Append-only segment log in front of the events table.
+
+Ingest appends each batch as one record to the active segment file and acks as
+soon as the record is fsynced; fsyncs are grouped, so concurrent appends share
+one disk flush. A syncer thread owns fsync and segment rotation, and a flusher
+thread drains sealed segments into the database through a caller-supplied
+write function, deleting each segment once every record in it is stored.
+
+Every process writes to its own subdirectory of `directory`, holding an
+exclusive flock on the LOCK file in it for as long as it runs. On start a
+process adopts the segments of subdirectories whose lock it can take (their
+owner has exited): it moves them into its own directory, replays them and
+removes the orphaned directory. Segments of live processes are never touched,
+so several workers can share one segment directory.
+
+Record layout: u32 payload length, u32 crc32 of payload, then a JSON payload
+{"batch_id": ..., "appended_at": ..., "rows": [...]}. A torn or corrupt tail
+(crash mid-write) ends the segment.
+
+Errors listed in `transient_errors` (e.g. a database outage) are retried with
+backoff indefinitely while ingest keeps appending. Any other error is retried a
+few times and then the record is moved to dead-letter.seg so one bad record
+cannot stall the log.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from metrics import Counters
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('<II')
+_SUFFIX = '.seg'
+_DEAD_LETTER = 'dead-letter.seg'
+_LOCK_FILE = 'LOCK'
+MAX_RECORD_ATTEMPTS = 3
+
+# write_batch(batch_id, rows) stores one record's rows; it must be idempotent per batch_id
+WriteBatch = Callable[[str, List[Dict[str, Any]]], None]
+
+class SegmentLogFull(Exception):
+    """Raised when the unflushed backlog exceeds its size limit"""
+
+class SegmentLogError(Exception):
+    """Raised when an appended record was not made durable (fsync failed or timed out)"""
+
+def _encode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    encoded = dict(row)
+    encoded['ts'] = row['ts'].isoformat()
+    return encoded
+
+def _decode_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    row['ts'] = datetime.fromisoformat(row['ts'])
+    return row
+
+def read_records(path: str, offset: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """Yield (end_offset, payload) for each intact record from offset onwards"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            length, crc = _HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                logger.warning(f"Truncated or corrupt record at offset {offset} in {path}")
+                return
+            offset += _HEADER.size + length
+            yield offset, payload
+
+class SegmentLog:
+    def __init__(self, directory: str, write_batch: WriteBatch, segment_bytes: int = 8 * 1024 * 1024,
+                 max_pending_bytes: int = 512 * 1024 * 1024, group_commit_ms: float = 2,
+                 flush_interval_ms: float = 500, transient_errors: Tuple[type, ...] = ()):
+        self.directory = directory
+        self.write_batch = write_batch
+        self.transient_errors = transient_errors
+        self.segment_bytes = segment_bytes
+        self.max_pending_bytes = max_pending_bytes
+        self.group_commit = group_commit_ms / 1000
+        self.flush_interval = flush_interval_ms / 1000
+
+        self._lock = threading.Lock()
+        self._synced = threading.Condition(self._lock)
+        self._sealed_ready = threading.Event()
+        self._sealed: deque = deque()  # (path, size) awaiting the flusher
+        self._file = None
+        self._path: Optional[str] = None
+        self._own_dir: Optional[str] = None  # this process's subdirectory of directory
+        self._lock_file = None  # holds the flock on _own_dir/LOCK
+        self._next_segment = 0
+        self._active_size = 0
+        self._active_opened_at = 0.0
+        self._write_seq = 0
+        self._synced_seq = 0
+        self._failed_seq = 0  # records up to this one were pending when an fsync failed
+        self._async_waiters: List[Tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._pending_bytes = 0
+        self._oldest_unflushed: deque = deque()  # append times of records appended by this process
+        self._running = False
+        self._threads: List[threading.Thread] = []
+        self.counters = Counters()
+
+    # Lifecycle
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._claim_directory()
+        adopted = self._adopt_orphans()
+        if adopted:
+            logger.info(f"Replaying {adopted} unflushed segments left in {self.directory}")
+            self._sealed_ready.set()
+
+        self._open_segment()
+        self._running = True
+        for target, name in ((self._syncer, "segment-syncer"), (self._flusher, "segment-flusher")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Seal the active segment and give the flusher `timeout` seconds to drain"""
+        if not self._running:
+            return
+        self._running = False
+        with self._lock:
+            self._synced.notify_all()
+        self._sealed_ready.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        with self._lock:
+            self._file.close()
+            if self._active_size == 0:
+                os.remove(self._path)
+            if not self._sealed and self._active_size == 0:
+                shutil.rmtree(self._own_dir, ignore_errors=True)
+        # Anything left is adopted by the next process to start
+        self._lock_file.close()
+        self._lock_file = None
+
+    def _claim_directory(self):
+        # Lock the directory under a hidden name, then publish it, so no other
+        # process can see it unlocked and take it for an orphan
+        staging = tempfile.mkdtemp(prefix=".proc-", dir=self.directory)
+        self._lock_file = open(os.path.join(staging, _LOCK_FILE), 'w')
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._own_dir = os.path.join(self.directory, os.path.basename(staging)[1:])
+        os.rename(staging, self._own_dir)
+
+    def _adopt_orphans(self) -> int:
+        """Move segments of exited processes into this process's directory and queue them"""
+        adopted = 0
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if name.startswith('.') or path == self._own_dir or not os.path.isdir(path):
+                continue
+            try:
+                lock_file = open(os.path.join(path, _LOCK_FILE))
+            except FileNotFoundError:
+                continue  # removed by another process adopting it
+            with lock_file:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # owner is alive
+                adopted += self._adopt_segments(path)
+                shutil.rmtree(path, ignore_errors=True)
+        # Segments written directly into directory by versions without per-process directories
+        return adopted + self._adopt_segments(self.directory)
+
+    def _adopt_segments(self, directory: str) -> int:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(_SUFFIX) and name != _DEAD_LETTER)
+        adopted = 0
+        for name in names:
+            path = os.path.join(self._own_dir, f"{self._next_segment:010d}{_SUFFIX}")
+            try:
+                os.replace(os.path.join(directory, name), path)
+            except FileNotFoundError:
+                continue  # adopted by another process starting at the same time
+            self._next_segment += 1
+            size = os.path.getsize(path)
+            self._sealed.append((path, size))
+            self._pending_bytes += size
+            adopted += 1
+        return adopted
+
+    # Appending
+
+    def append(self, batch_id: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        Append one batch and return its sequence number. The record is not
+        durable until wait_durable / wait_durable_async returns for that number.
+        """
+        appended_at = time.time()
+        payload = json.dumps({
+            'batch_id': batch_id,
+            'appended_at': appended_at,
+            'rows': [_encode_row(row) for row in rows]
+        }, separators=(',', ':')).encode('utf-8')
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock:
+            if self._pending_bytes + len(record) > self.max_pending_bytes:
+                self.counters.incr('rejected_full')
+                raise SegmentLogFull(f"Unflushed segment backlog exceeds {self.max_pending_bytes} bytes")
+            self._file.write(record)
+            self._active_size += len(record)
+            self._pending_bytes += len(record)
+            self._oldest_unflushed.append(appended_at)
+            self._write_seq += 1
+            seq = self._write_seq
+            self._synced.notify_all()
+
+        self.counters.incr('records_appended')
+        self.counters.incr('rows_appended', len(rows))
+        return seq
+
+    def wait_durable(self, seq: int, timeout: Optional[float] = None):
+        """Block until record seq is fsynced; SegmentLogError if its fsync failed or timeout passes"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._synced_seq < seq:
+                if seq <= self._failed_seq:
+                    raise SegmentLogError(f"Segment log fsync failed for record {seq}")
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.counters.incr('durable_timeouts')
+                    raise SegmentLogError(f"Record {seq} not durable after {timeout}s")
+                self._synced.wait(remaining)
+
+    async def wait_durable_async(self, seq: int, timeout: Optional[float] = None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (seq, loop, future)
+        with self._lock:
+            if self._synced_seq >= seq:
+                return
+            if seq <= self._failed_seq:
+                raise SegmentLogError(f"Segment log fsync failed for record {seq}")
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+            self.counters.incr('durable_timeouts')
+            raise SegmentLogError(f"Record {seq} not durable after {timeout}s")
+
+    # Background threads
+
+    def _syncer(self):
+        while True:
+            with self._lock:
+                if self._running and self._write_seq == self._synced_seq:
+                    self._synced.wait(self.flush_interval / 2)
+            if self._running and self.group_commit:
+                # Let concurrent appenders join this fsync
+                time.sleep(self.group_commit)
+            try:
+                self._sync()
+                self._maybe_rotate(force=not self._running)
+            except Exception as e:
+                self.counters.incr('sync_errors')
+                logger.error(f"Segment log sync failed: {e}")
+                self._fail_pending(e)
+                time.sleep(self.flush_interval)
+            if not self._running:
+                return
+
+    def _sync(self):
+        with self._lock:
+            target = self._write_seq
+            if target == self._synced_seq:
+                return
+            self._file.flush()
+            fd = self._file.fileno()
+            group = target - self._synced_seq
+
+        start = time.perf_counter()
+        os.fsync(fd)  # outside the lock so appends continue meanwhile
+        self.counters.incr('fsyncs')
+        self.counters.observe('fsync_seconds', time.perf_counter() - start)
+        self.counters.observe('records_per_fsync', group)
+        self._mark_synced(target)
+
+    def _mark_synced(self, target: int):
+        with self._lock:
+            self._synced_seq = max(self._synced_seq, target)
+            self._synced.notify_all()
+            ready = [w for w in self._async_waiters if w[0] <= self._synced_seq]
+            self._async_waiters = [w for w in self._async_waiters if w[0] > self._synced_seq]
+        for _, loop, future in ready:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def _fail_pending(self, error: Exception):
+        # Records appended so far may not be on disk: fail their waiters rather
+        # than ack them later; the records stay in the segment and are still flushed
+        with self._lock:
+            self._failed_seq = self._write_seq
+            self._synced.notify_all()
+            failed = [w for w in self._async_waiters if w[0] <= self._failed_seq]
+            self._async_waiters = [w for w in self._async_waiters if w[0] > self._failed_seq]
+        exception = SegmentLogError(f"Segment log fsync failed: {error}")
+        for _, loop, future in failed:
+            loop.call_soon_threadsafe(_reject, future, exception)
+
+    def _maybe_rotate(self, force: bool = False):
+        with self._lock:
+            if self._active_size == 0:
+                return
+            age = time.monotonic() - self._active_opened_at
+            if not force and self._active_size < self.segment_bytes and age < self.flush_interval:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._sealed.append((self._path, self._active_size))
+            target = self._write_seq
+            self._open_segment()
+        self._mark_synced(target)
+        self._sealed_ready.set()
+
+    def _open_segment(self):
+        self._path = os.path.join(self._own_dir, f"{self._next_segment:010d}{_SUFFIX}")
+        self._next_segment += 1
+        self._file = open(self._path, 'ab')
+        self._active_size = 0
+        self._active_opened_at = time.monotonic()
+
+    def _flusher(self):
+        offset = 0  # progress within the head segment, kept across retries
+        failures = 0
+        while True:
+            if not self._sealed:
+                if not self._running:
+                    return
+                self._sealed_ready.wait(self.flush_interval)
+                self._sealed_ready.clear()
+                continue
+
+            path, size = self._sealed[0]
+            try:
+                for end_offset, payload in read_records(path, offset):
+                    self._flush_record(payload, failures)
+                    self._record_flushed(end_offset - offset)
+                    offset = end_offset
+                    failures = 0
+            except Exception as e:
+                failures += 1
+                self.counters.incr('flush_errors')
+                logger.error(f"Flushing segment {path} failed (attempt {failures}): {e}")
+                if not self._running:
+                    return  # left on disk for replay at next start
+                time.sleep(min(5.0, 0.1 * 2 ** failures))
+                continue
+
+            os.remove(path)
+            with self._lock:
+                self._sealed.popleft()
+                # Anything past the last intact record (a torn tail) is discarded
+                self._pending_bytes -= max(0, size - offset)
+            offset = 0
+            self.counters.incr('segments_flushed')
+
+    def _flush_record(self, payload: bytes, failures: int):
+        record = json.loads(payload)
+        rows = [_decode_row(row) for row in record['rows']]
+        appended_at = record.get('appended_at')
+        try:
+            self.write_batch(record['batch_id'], rows)
+        except self.transient_errors:
+            raise
+        except Exception as e:
+            if failures + 1 < MAX_RECORD_ATTEMPTS:
+                raise
+            logger.error(f"Moving batch {record['batch_id']} to the dead-letter segment: {e}")
+            with open(os.path.join(self.directory, _DEAD_LETTER), 'ab') as f:
+                f.write(_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.counters.incr('dead_lettered')
+        else:
+            self.counters.incr('records_flushed')
+            self.counters.incr('rows_flushed', len(rows))
+            if appended_at is not None:
+                self.counters.observe('flush_lag_seconds', max(0.0, time.time() - appended_at))
+        # Dead-lettered records are out of the log too
+        if appended_at is not None:
+            with self._lock:
+                if self._oldest_unflushed and self._oldest_unflushed[0] == appended_at:
+                    self._oldest_unflushed.popleft()
+
+    def _record_flushed(self, nbytes: int):
+        with self._lock:
+            self._pending_bytes -= nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters.snapshot()
+        with self._lock:
+            stats.update({
+                'pending_bytes': self._pending_bytes,
+                'sealed_segments': len(self._sealed),
+                'active_segment_bytes': self._active_size,
+                'oldest_unflushed_age_seconds': (
+                    time.time() - self._oldest_unflushed[0] if self._oldest_unflushed else 0.0
+                )
+            })
+        return stats
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+def _reject(future: asyncio.Future, exception: Exception):
+    if not future.done():
+        future.set_exception(exception)
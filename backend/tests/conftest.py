@@ -0,0 +1,26 @@
+"""
+Tests run from backend/ (python -m pytest). Modules that import models need a
+database; point them at a throwaway SQLite file before anything imports it.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='thrizll_test_'), 'test.db')}"
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    monkeypatch = pytest.MonkeyPatch()
+    # Segment log and model files are relative to the working directory
+    monkeypatch.chdir(tmp_path_factory.mktemp("app"))
+    import main
+    with TestClient(main.app) as client:
+        yield client
+    monkeypatch.undo()
@@ -0,0 +1,34 @@
+import logging
+
+import pytest
+
+TOKEN = "test-admin-token"
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", TOKEN)
+
+def test_model_activation_is_disabled_without_a_configured_token(client, monkeypatch):
+    import main
+    monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+    response = client.post("/admin/model", json={"version": "v1"}, headers={"X-Admin-Token": ""})
+    assert response.status_code == 403
+
+def test_model_activation_requires_the_token(client, admin_token):
+    for headers in ({}, {"X-Admin-Token": "wrong"}):
+        assert client.post("/admin/model", json={"version": "v1"}, headers=headers).status_code == 401
+    # Authorized, then rejected because the test registry has no published versions
+    response = client.post("/admin/model", json={"version": "v1"}, headers={"X-Admin-Token": TOKEN})
+    assert response.status_code == 404
+
+def test_log_level_change_requires_the_token(client, admin_token):
+    level = logging.getLogger("admin_test").level
+    for headers in ({}, {"X-Admin-Token": "wrong"}):
+        response = client.post("/admin/logging", json={"level": "DEBUG", "logger": "admin_test"}, headers=headers)
+        assert response.status_code == 401
+    assert logging.getLogger("admin_test").level == level
+    response = client.post("/admin/logging", json={"level": "DEBUG", "logger": "admin_test"},
+                           headers={"X-Admin-Token": TOKEN})
+    assert response.status_code == 200 and response.json()["level"] == "DEBUG"
+    assert logging.getLogger("admin_test").level == logging.DEBUG
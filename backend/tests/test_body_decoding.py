@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+
+import pytest
+import zstandard
+from fastapi import HTTPException
+
+from body_decoding import DecodedRequest, _make_decoder
+from config import MAX_DECODED_BODY_BYTES
+
+CHUNK_BYTES = 64 * 1024
+
+def decode(body: bytes, encoding: str) -> bytes:
+    """Feed body to a DecodedRequest in CHUNK_BYTES chunks and return the decoded stream"""
+    chunks = [body[i:i + CHUNK_BYTES] for i in range(0, len(body), CHUNK_BYTES)] or [b'']
+    messages = [
+        {'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+        for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def read() -> bytes:
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/', 'query_string': b'',
+            'headers': [(b'content-encoding', encoding.encode())]
+        }
+        request = DecodedRequest(scope, receive)
+        output = bytearray()
+        async for piece in request.stream():
+            output += piece
+            # The decoder must never hand out much more than the limit
+            assert len(output) <= MAX_DECODED_BODY_BYTES + zstandard.DECOMPRESSION_RECOMMENDED_OUTPUT_SIZE
+        return bytes(output)
+
+    return asyncio.run(read())
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", gzip.compress),
+    ("zstd", lambda data: zstandard.ZstdCompressor().compress(data)),
+])
+def test_round_trip(encoding, compress):
+    body = b'{"events": []}' * 50000
+    assert decode(compress(body), encoding) == body
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", lambda data: gzip.compress(data, compresslevel=9)),
+    ("zstd", lambda data: zstandard.ZstdCompressor(level=19).compress(data)),
+])
+def test_decompression_bomb_is_rejected(encoding, compress):
+    bomb = compress(b'\0' * (MAX_DECODED_BODY_BYTES * 8))
+    # A few kilobytes of RLE blocks, fed to the decoder in one chunk
+    assert len(bomb) < CHUNK_BYTES * 16
+    with pytest.raises(HTTPException) as excinfo:
+        decode(bomb, encoding)
+    assert excinfo.value.status_code == 413
+
+@pytest.mark.parametrize("encoding, compress", [
+    ("gzip", lambda data: gzip.compress(data, compresslevel=9)),
+    ("zstd", lambda data: zstandard.ZstdCompressor(level=19).compress(data)),
+])
+def test_decoder_output_is_capped_per_call(encoding, compress):
+    # zstd RLE blocks expand a few compressed bytes to 128 MB; one call must stop near the cap
+    bomb = compress(b'\0' * (256 * 1024 * 1024))
+    output = _make_decoder(encoding).decompress(bomb, 1000)
+    assert 1000 <= len(output) <= zstandard.DECOMPRESSION_RECOMMENDED_OUTPUT_SIZE
+
+def test_corrupt_body_is_rejected():
+    with pytest.raises(HTTPException) as excinfo:
+        decode(b'not zstd at all', "zstd")
+    assert excinfo.value.status_code == 400
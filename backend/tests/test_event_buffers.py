@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from event_buffers import RecentEventBuffers
+from feature_kernel import rows_to_array
+
+SESSION = "buffer_session"
+
+class Database:
+    """Committed event rows; load() is what the seed query sees at the time it runs"""
+
+    def __init__(self):
+        self.rows = []
+        self.during_load = None  # ingest to run while the seed query is in progress
+
+    def commit(self, rows):
+        self.rows.extend(rows)
+
+    def load(self, session_ids):
+        snapshot = {
+            session_id: rows_to_array([row for row in self.rows if row['session_id'] == session_id])
+            for session_id in session_ids
+        }
+        if self.during_load is not None:
+            during, self.during_load = self.during_load, None
+            during()
+        return snapshot
+
+def event(seconds_ago: float):
+    return {'ts': datetime.utcnow() - timedelta(seconds=seconds_ago), 'session_id': SESSION, 'etype': 'TAP'}
+
+@pytest.fixture
+def setup():
+    buffers = RecentEventBuffers(window_minutes=2, max_events_per_session=1000, max_bytes=1024 * 1024)
+    database = Database()
+    database.commit([event(30), event(20)])
+    return buffers, database
+
+def window(buffers, database):
+    return buffers.windows([SESSION], datetime.utcnow() - timedelta(minutes=1), database.load)[SESSION]
+
+def ingest(buffers, database, rows):
+    buffers.begin([SESSION])
+    database.commit(rows)
+    buffers.append([SESSION], rows)
+
+def test_seed_is_installed_and_serves_later_appends(setup):
+    buffers, database = setup
+    assert len(window(buffers, database)) == 2
+    ingest(buffers, database, [event(1)])
+    database.load = None  # a hit must not query
+    assert len(window(buffers, database)) == 3
+    assert buffers.stats()['seeds'] == 1 and buffers.stats()['hits'] == 1
+
+def test_batch_committed_during_the_seed_query_is_not_lost(setup):
+    buffers, database = setup
+    # Committed and appended after the query read its snapshot, before the seed is installed
+    database.during_load = lambda: ingest(buffers, database, [event(10)])
+    assert len(window(buffers, database)) == 2
+    assert buffers.stats()['seeds_skipped'] == 1
+    # Installing the stale snapshot would have dropped the appended event
+    assert len(window(buffers, database)) == 3
+
+def test_batch_begun_during_the_seed_query_blocks_the_seed(setup):
+    buffers, database = setup
+    database.during_load = lambda: buffers.begin([SESSION])
+    window(buffers, database)
+    assert buffers.stats()['seeds_skipped'] == 1
+    database.commit([event(5)])
+    buffers.append([SESSION], [event(5)])
+    assert len(window(buffers, database)) == 3
+
+def test_batch_aborted_during_the_seed_query_blocks_the_seed(setup):
+    buffers, database = setup
+    def begin_and_abort():
+        buffers.begin([SESSION])
+        buffers.abort([SESSION])
+    database.during_load = begin_and_abort
+    window(buffers, database)
+    assert buffers.stats()['seeds_skipped'] == 1
+    # Nothing in flight any more: the next miss seeds
+    assert len(window(buffers, database)) == 2
+    assert buffers.stats()['seeds'] == 1
+
+def test_ring_begun_but_not_appended_is_not_seeded(setup):
+    buffers, database = setup
+    rows = [event(3)]
+    # begin() creates the ring; the batch commits, but append() has not run yet
+    buffers.begin([SESSION])
+    database.commit(rows)
+    assert len(window(buffers, database)) == 3
+    assert buffers.stats()['seeds_skipped'] == 1 and buffers.stats().get('seeds', 0) == 0
+    buffers.append([SESSION], rows)
+    # Never seeded, so the ring is not trusted and the read goes to the database again
+    assert len(window(buffers, database)) == 3
+    assert buffers.stats()['seeds'] == 1
+    ingest(buffers, database, [event(1)])
+    assert len(window(buffers, database)) == 4
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from datetime import datetime
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from event_writer import bulk_insert_events
+
+class FakeDriver:
+    """The DB-API exception hierarchy psycopg exposes"""
+    class Error(Exception):
+        pass
+
+    class DatabaseError(Error):
+        pass
+
+    class IntegrityError(DatabaseError):
+        pass
+
+    class UniqueViolation(IntegrityError):
+        pass
+
+    class OperationalError(DatabaseError):
+        pass
+
+def postgres_session(copy_error: Exception):
+    """A Session on a PostgreSQL bind whose COPY fails with copy_error"""
+    @contextmanager
+    def copy(statement):
+        raise copy_error
+        yield
+    cursor = mock.MagicMock()
+    cursor.__enter__.return_value.copy = copy
+    driver_connection = SimpleNamespace(cursor=lambda: cursor)
+    dialect = SimpleNamespace(name='postgresql', loaded_dbapi=FakeDriver, dbapi_exception_translation_map={})
+    return SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=dialect),
+        connection=lambda: SimpleNamespace(connection=SimpleNamespace(driver_connection=driver_connection))
+    )
+
+ROWS = [{'ts': datetime(2024, 1, 1), 'session_id': 'copy_session', 'user_hash': 'u', 'screen': 's',
+         'etype': 'TAP', 'seq': 1}]
+
+@pytest.mark.parametrize("driver_error, expected", [
+    (FakeDriver.UniqueViolation("duplicate key value violates unique constraint"), IntegrityError),
+    (FakeDriver.OperationalError("server closed the connection unexpectedly"), OperationalError),
+])
+def test_copy_errors_are_raised_as_sqlalchemy_errors(driver_error, expected):
+    with pytest.raises(expected) as raised:
+        bulk_insert_events(postgres_session(driver_error), ROWS)
+    assert raised.value.orig is driver_error
+
+def test_other_copy_errors_pass_through():
+    with pytest.raises(TypeError):
+        bulk_insert_events(postgres_session(TypeError("not a driver error")), ROWS)
@@ -0,0 +1,65 @@
+import math
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from feature_extractor import FeatureExtractor, convert_numpy_types
+from feature_kernel import compute_features, events_to_array
+
+ETYPES = ['SCROLL', 'TAP', 'TYPE', 'LONG_PRESS', 'PAUSE', 'FOCUS_CHANGE']
+COLUMNS = ('duration_ms', 'delta', 'velocity', 'accel', 'input_len', 'backspaces')
+
+def random_events(count: int, seed: int, etypes=ETYPES, missing: float = 0.1, max_gap_ms: int = 300):
+    """DBEvent-like objects in ts order; `missing` is the share of NULL measurements"""
+    rng = random.Random(seed)
+    ts, events = datetime(2024, 1, 1), []
+    for _ in range(count):
+        ts += timedelta(milliseconds=rng.randint(0, max_gap_ms))
+        event = dict.fromkeys(COLUMNS)
+        event.update(ts=ts, etype=rng.choice(etypes), screen='ChatScreen', component_id=None)
+        if event['etype'] == 'SCROLL':
+            event.update(delta=rng.uniform(-200, 200), velocity=rng.uniform(0, 3000), accel=rng.uniform(-50, 50))
+        elif event['etype'] == 'TYPE':
+            event.update(input_len=rng.randint(0, 200), backspaces=rng.choice([0, 0, 0, 1, 3]))
+        elif event['etype'] in ('PAUSE', 'LONG_PRESS'):
+            event.update(duration_ms=rng.randint(300, 5000))
+        for column in COLUMNS:
+            if event[column] is not None and rng.random() < missing:
+                event[column] = None
+        events.append(SimpleNamespace(**event))
+    return events
+
+def assert_kernel_matches_pandas(events):
+    expected = convert_numpy_types(FeatureExtractor(use_kernel=False, use_cache=False)._features_from_events(events))
+    actual = compute_features(events_to_array(events))
+    assert expected.keys() == actual.keys()
+    for key, value in expected.items():
+        if isinstance(value, float) and math.isnan(value):
+            assert math.isnan(actual[key]), key
+        else:
+            assert math.isclose(actual[key], value, rel_tol=1e-9, abs_tol=1e-12), key
+
+@pytest.mark.parametrize("seed", range(20))
+def test_kernel_matches_pandas_on_random_sessions(seed):
+    rng = random.Random(seed)
+    # Not every value missing: the pandas reference cannot diff an all-NULL column
+    assert_kernel_matches_pandas(random_events(
+        rng.choice([1, 2, 3, 10, 100, 2000]), seed,
+        etypes=rng.sample(ETYPES, rng.randint(1, len(ETYPES))),
+        missing=rng.choice([0.0, 0.1, 0.5])
+    ))
+
+@pytest.mark.parametrize("etype", ETYPES)
+def test_kernel_matches_pandas_on_single_type_sessions(etype):
+    assert_kernel_matches_pandas(random_events(50, seed=1, etypes=[etype]))
+
+def test_kernel_matches_pandas_with_identical_timestamps():
+    # Zero intervals everywhere: degenerate rhythm bins and zero durations
+    assert_kernel_matches_pandas(random_events(30, seed=2, max_gap_ms=0))
+
+def test_kernel_matches_pandas_with_unknown_etype():
+    events = random_events(40, seed=3)
+    events[5].etype = 'SWIPE'
+    assert_kernel_matches_pandas(events)
@@ -0,0 +1,36 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+from feature_kernel import FEATURE_NAMES
+from feature_store import backfill_feature_store, load_feature_vectors
+from models import Base, DBFeatures, SessionLocal, engine
+
+def test_backfill_fills_missing_rows_once():
+    Base.metadata.create_all(bind=engine)
+    documents = {
+        f"store_session_{i}": {name: float(i + j) for j, name in enumerate(FEATURE_NAMES)}
+        for i in range(5)
+    }
+    documents["store_session_0"]["tap_count"] = math.nan
+    del documents["store_session_1"]["pause_count"]
+    with engine.begin() as conn:
+        conn.execute(DBFeatures.__table__.insert(), [
+            {'session_id': session_id, 'computed_at': datetime.utcnow(), 'f': f}
+            for session_id, f in documents.items()
+        ])
+
+    assert backfill_feature_store(chunk_size=2) >= len(documents)
+    assert backfill_feature_store() == 0
+
+    db = SessionLocal()
+    try:
+        ids, vectors = load_feature_vectors(db, session_ids=list(documents))
+    finally:
+        db.close()
+    assert sorted(ids) == sorted(documents)
+    for session_id, vector in zip(ids, vectors):
+        expected = [documents[session_id].get(name, math.nan) for name in FEATURE_NAMES]
+        # Missing and non-finite features are stored as NULL and load as NaN
+        np.testing.assert_array_equal(vector, np.array(expected, dtype=np.float64))
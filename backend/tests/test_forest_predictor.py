@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from forest_predictor import FlatForest
+
+def training_data(seed: int, rows: int = 500, features: int = 6):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features)) * rng.uniform(0.001, 1000, size=features)
+    # Count-like columns: many ties, so thresholds fall halfway between integers
+    X[:, :2] = np.round(np.abs(X[:, :2]))
+    y = X[:, 0] - 2 * X[:, 2] + rng.normal(size=rows)
+    return X, y
+
+def fitted(seed: int, scaled: bool):
+    X, y = training_data(seed)
+    scaler = StandardScaler().fit(X) if scaled else None
+    forest = RandomForestRegressor(n_estimators=20, max_depth=8, random_state=seed)
+    forest.fit(scaler.transform(X) if scaled else X, y)
+    return X, forest, scaler
+
+def threshold_rows(forest, X: np.ndarray, seed: int) -> np.ndarray:
+    """Rows with one feature on, or one float32 step either side of, a split threshold"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for estimator in forest.estimators_[:5]:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left >= 0):
+            feature, threshold = tree.feature[node], tree.threshold[node]
+            as_float32 = np.float32(threshold)
+            for value in (
+                threshold, float(as_float32), threshold + abs(threshold) * 1e-12, threshold - abs(threshold) * 1e-12,
+                float(np.nextafter(as_float32, np.float32(np.inf))), float(np.nextafter(as_float32, np.float32(-np.inf)))
+            ):
+                row = X[rng.integers(len(X))].copy()
+                row[feature] = value
+                rows.append(row)
+    return np.array(rows)
+
+def sklearn_tree_predictions(forest, X_scaled: np.ndarray) -> np.ndarray:
+    return np.stack([estimator.predict(X_scaled) for estimator in forest.estimators_])
+
+@pytest.mark.parametrize("seed", range(3))
+def test_flat_forest_matches_sklearn_on_random_rows(seed):
+    X, forest, scaler = fitted(seed, scaled=True)
+    flat = FlatForest.from_model(forest, scaler)
+    probe = np.vstack([X, np.random.default_rng(seed + 10).normal(size=(500, X.shape[1])) * X.std(axis=0)])
+    X_scaled = scaler.transform(probe)
+    np.testing.assert_array_equal(flat.tree_predictions(probe), sklearn_tree_predictions(forest, X_scaled))
+    mean, variance = flat.predict(probe)
+    np.testing.assert_allclose(mean, forest.predict(X_scaled), rtol=1e-12)
+    np.testing.assert_allclose(variance, np.var(sklearn_tree_predictions(forest, X_scaled), axis=0), rtol=1e-12)
+
+def test_flat_forest_matches_sklearn_at_float32_thresholds():
+    # No scaler, so the edge values reach the comparisons unchanged
+    X, forest, _ = fitted(4, scaled=False)
+    flat = FlatForest.from_model(forest)
+    edges = threshold_rows(forest, X, seed=4)
+    np.testing.assert_array_equal(flat.tree_predictions(edges), sklearn_tree_predictions(forest, edges))
+
+def test_flat_forest_matches_sklearn_at_scaled_thresholds():
+    X, forest, scaler = fitted(5, scaled=True)
+    flat = FlatForest.from_model(forest, scaler)
+    # Unscaled rows whose scaled features land on (or next to) the thresholds
+    edges = threshold_rows(forest, scaler.transform(X), seed=5) * scaler.scale_ + scaler.mean_
+    np.testing.assert_array_equal(
+        flat.tree_predictions(edges), sklearn_tree_predictions(forest, scaler.transform(edges))
+    )
+
+def test_saved_flat_forest_predicts_the_same(tmp_path):
+    X, forest, scaler = fitted(6, scaled=True)
+    flat = FlatForest.from_model(forest, scaler)
+    flat.save(str(tmp_path), meta={'version': 'test'})
+    loaded, meta = FlatForest.load(str(tmp_path))
+    assert meta['version'] == 'test'
+    np.testing.assert_array_equal(loaded.tree_predictions(X), flat.tree_predictions(X))
@@ -0,0 +1,113 @@
+import json
+import time
+
+# Far beyond datetime's range: passes validation, fails converting to a row
+OUT_OF_RANGE_TS = 2 ** 62
+
+def event(session_id: str, seq: int, ts: int = None) -> dict:
+    return {
+        "ts": ts if ts is not None else int(time.time() * 1000) + seq,
+        "session_id": session_id,
+        "user_hash": "test_user",
+        "screen": "ChatScreen",
+        "etype": "TAP",
+        "seq": seq
+    }
+
+def stored_count(session_id: str) -> int:
+    from models import DBEvent, SessionLocal
+    db = SessionLocal()
+    try:
+        return db.query(DBEvent).filter(DBEvent.session_id == session_id).count()
+    finally:
+        db.close()
+
+def wait_for_count(session_id: str, expected: int, timeout: float = 10.0) -> int:
+    """Events reach the table through the segment log's flusher"""
+    deadline = time.monotonic() + timeout
+    while stored_count(session_id) < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return stored_count(session_id)
+
+def test_ws_frame_with_out_of_range_ts_is_rejected_alone(client):
+    session_id = "ws_bad_ts"
+    with client.websocket_connect(f"/v1/ingest/ws/{session_id}") as ws:
+        ws.send_text(json.dumps({"frame_id": 1, "events": [event(session_id, 1), event(session_id, 2)]}))
+        ws.send_text(json.dumps({"frame_id": 2, "events": [event(session_id, 3, ts=OUT_OF_RANGE_TS)]}))
+        reply = ws.receive_json()
+        assert reply["type"] == "error" and reply["frame_id"] == 2
+        # The socket stays usable and earlier frames are still stored and acked
+        ws.send_text(json.dumps({"frame_id": 3, "events": [event(session_id, 4)]}))
+        acked = []
+        while set(acked) != {1, 3}:
+            reply = ws.receive_json()
+            assert reply["type"] == "ack"
+            acked += reply["frame_ids"]
+    assert wait_for_count(session_id, 3) == 3
+
+def test_stream_line_with_out_of_range_ts_is_rejected_alone(client):
+    session_id = "stream_bad_ts"
+    lines = [event(session_id, i) for i in range(1, 151)]
+    lines[120] = event(session_id, 121, ts=OUT_OF_RANGE_TS)
+    body = "\n".join(json.dumps(line) for line in lines).encode()
+    response = client.post("/v1/ingest/stream", content=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["processed"] == 149 and result["rejected"] == 1
+    assert result["chunks"][-1]["errors"][0]["line"] == 121
+    assert wait_for_count(session_id, 149) == 149
+
+def test_stream_over_session_budget_is_slowed_not_dropped(client, monkeypatch):
+    import main
+    from admission import AdmissionController
+    # Five bucket's worth of events for one session
+    monkeypatch.setattr(main, "admission", AdmissionController(0, 0, session_rate=2000, session_burst=200))
+    session_id = "stream_backpressure"
+    body = "\n".join(json.dumps(event(session_id, i)) for i in range(1, 1001)).encode()
+    response = client.post("/v1/ingest/stream", content=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert result["status"] == "success" and result["processed"] == 1000
+    assert main.admission.stats()["rejected_batches"] > 0
+    assert wait_for_count(session_id, 1000) == 1000
+
+def test_columnar_ingest_deduplicates_by_seq(client):
+    from wire_format import CONTENT_TYPE, encode_columnar_batch
+    session_id = "columnar_seq"
+    payload = encode_columnar_batch([event(session_id, seq) for seq in range(1, 11)])
+    headers = {"content-type": CONTENT_TYPE}
+    first = client.post("/v1/ingest/columnar", content=payload, headers=headers).json()
+    assert first["processed"] == 10
+    assert wait_for_count(session_id, 10) == 10
+    # A resend without a batch id is deduplicated event by event
+    second = client.post("/v1/ingest/columnar", content=payload, headers=headers)
+    assert second.status_code == 200
+    time.sleep(1)
+    assert stored_count(session_id) == 10
+
+def test_concurrent_seq_conflict_is_deduplicated(client, monkeypatch):
+    import main
+    from event_writer import bulk_insert_events
+    from models import SessionLocal
+    session_id = "seq_race"
+    rows = [main.event_to_row(main.TelemetryEvent(**event(session_id, seq))) for seq in range(1, 6)]
+    original = main.deduplicator.drop_duplicate_events
+
+    def racing_drop(db, batch_rows):
+        # Another writer commits seq 3 after this batch checked for duplicates
+        fresh = original(db, batch_rows)
+        if stored_count(session_id) == 0:
+            other = SessionLocal()
+            bulk_insert_events(other, [rows[2]])
+            other.commit()
+            other.close()
+        return fresh
+
+    monkeypatch.setattr(main.deduplicator, "drop_duplicate_events", racing_drop)
+    db = SessionLocal()
+    try:
+        result = main.write_event_rows(db, rows)
+    finally:
+        db.close()
+    assert result["processed"] == 4 and result["duplicates"] == 1
+    assert stored_count(session_id) == 5
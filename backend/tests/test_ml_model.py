@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_kernel import FEATURE_NAMES
+from ml_model import InterestScoreModel
+
+def training_frame(rows: int, seed: int):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame(rng.lognormal(0, 1, size=(rows, len(FEATURE_NAMES))), columns=FEATURE_NAMES)
+    frame['tap_count'] = np.round(frame['tap_count'] * 10)
+    scores = np.clip(40 + frame['events_per_second'] * 5 + rng.normal(0, 15, rows), 0, 100)
+    return frame, scores.values
+
+def per_estimator_predict(model: InterestScoreModel, X: np.ndarray):
+    """Scores and confidences as computed before: forest.predict plus one predict per tree"""
+    X_scaled = model.scaler.transform(X)
+    scores = np.clip(model.model.predict(X_scaled), 0, 100)
+    tree_predictions = np.array([tree.predict(X_scaled) for tree in model.model.estimators_])
+    variance = np.var(tree_predictions, axis=0)
+    confidences = np.maximum(1.0 - np.minimum(variance / 400, 1.0), 0.3)
+    return scores, confidences
+
+@pytest.mark.parametrize("predictor", ["flat", "sklearn"])
+def test_confidences_match_the_per_estimator_computation(predictor):
+    model = InterestScoreModel(predictor)
+    model.train_model(*training_frame(600, seed=1))
+    assert (model._flat_forest is not None) == (predictor == "flat")
+
+    X = training_frame(500, seed=2)[0].values
+    scores, confidences = model.predict_many(X)
+    expected_scores, expected_confidences = per_estimator_predict(model, X)
+    np.testing.assert_array_equal(confidences, expected_confidences)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-12, atol=1e-12)
+    # The rows cover the formula's range, not only its floor and ceiling
+    assert np.any((confidences > 0.3) & (confidences < 1.0))
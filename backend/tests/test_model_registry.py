@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from model_registry import ACTIVE_FILE, ModelRegistry
+
+MODEL_FILE = "model.txt"
+
+class FakeModel:
+    """Saves and is loaded as its version label"""
+
+    def __init__(self, version):
+        self.model_version = version
+
+    def save_model(self, path):
+        with open(path, 'w') as f:
+            f.write(self.model_version or "")
+
+    def stats(self):
+        return {'model_version': self.model_version}
+
+class Loader:
+    """Registry loader counting loads; fail and gate make a version's load fail or block"""
+
+    def __init__(self):
+        self.loads = []
+        self.fail = set()
+        self.gate = {}  # version -> threading.Event the load waits for
+
+    def __call__(self, path, version):
+        if version in self.gate:
+            self.gate[version].wait(5)
+        if version in self.fail:
+            raise ValueError(f"corrupt model {version}")
+        self.loads.append(version)
+        if path is None:
+            return FakeModel(None)
+        with open(path) as f:
+            return FakeModel(f.read())
+
+@pytest.fixture
+def loader():
+    return Loader()
+
+def make_registry(root, loader, poll_seconds=0):
+    return ModelRegistry(str(root), MODEL_FILE, loader, poll_seconds=poll_seconds)
+
+def published(root, loader, versions=("v1", "v2", "v3")):
+    registry = make_registry(root, loader)
+    for version in versions:
+        registry.publish(FakeModel(version), version)
+    return registry
+
+def test_newest_version_is_served_without_active(tmp_path, loader):
+    registry = published(tmp_path, loader)
+    assert registry.versions() == ["v1", "v2", "v3"]
+    assert registry.current().model_version == "v3"
+    assert not (tmp_path / ACTIVE_FILE).exists()
+
+def test_empty_registry_serves_the_mock(tmp_path, loader):
+    assert make_registry(tmp_path / "missing", loader).current().model_version is None
+
+def test_activate_swaps_and_writes_active(tmp_path, loader):
+    registry = published(tmp_path, loader)
+    registry.current()
+    assert registry.activate("v1").model_version == "v1"
+    assert registry.current().model_version == "v1"
+    assert (tmp_path / ACTIVE_FILE).read_text() == "v1"
+    assert registry.active_version() == "v1"
+    with pytest.raises(KeyError):
+        registry.activate("v9")
+    assert registry.current().model_version == "v1"
+
+def test_rollback_reuses_the_replaced_model(tmp_path, loader):
+    registry = published(tmp_path, loader)
+    v3 = registry.current()
+    registry.activate("v2")
+    # Switching back to a recently replaced version does not load it again
+    assert registry.activate("v3") is v3
+    assert loader.loads == ["v3", "v2"]
+    assert (tmp_path / ACTIVE_FILE).read_text() == "v3"
+    assert registry.stats()['swaps'] == 2
+
+def test_failed_load_keeps_serving_the_current_model(tmp_path, loader):
+    registry = published(tmp_path, loader)
+    registry.activate("v1")
+    loader.fail.add("v2")
+    with pytest.raises(ValueError):
+        registry.activate("v2")
+    assert registry.current().model_version == "v1"
+    # ACTIVE is only written once the new version is serving
+    assert (tmp_path / ACTIVE_FILE).read_text() == "v1"
+    assert registry.stats()['swap_failures'] == 1
+
+def test_current_model_serves_while_the_next_one_loads(tmp_path, loader):
+    registry = published(tmp_path, loader)
+    v3 = registry.current()
+    loader.gate["v1"] = threading.Event()
+    activation = threading.Thread(target=registry.activate, args=("v1",))
+    activation.start()
+    try:
+        time.sleep(0.1)
+        assert registry.current() is v3
+        assert registry.model() is v3
+    finally:
+        loader.gate["v1"].set()
+        activation.join()
+    assert registry.current().model_version == "v1"
+
+def test_watcher_follows_another_process_activation(tmp_path, loader):
+    published(tmp_path, loader)
+    watching = make_registry(tmp_path, loader, poll_seconds=0.02)
+    assert watching.current().model_version == "v3"
+    watching.start_watching()
+    try:
+        # Another worker process activates through the shared ACTIVE file
+        make_registry(tmp_path, Loader()).activate("v2")
+        deadline = time.monotonic() + 5
+        while watching.current().model_version != "v2" and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert watching.current().model_version == "v2"
+
+        # A version that fails to load is not retried until ACTIVE changes again
+        loader.fail.add("v1")
+        (tmp_path / ACTIVE_FILE).write_text("v1")
+        time.sleep(0.2)
+        assert watching.current().model_version == "v2"
+        assert watching.stats()['swap_failures'] == 1
+    finally:
+        watching.stop_watching()
@@ -0,0 +1,107 @@
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from feature_extractor import FeatureExtractor, convert_numpy_types
+from models import Base, DBEvent, engine
+from online_features import OnlineFeatureExtractor
+
+ETYPES = ['SCROLL', 'TAP', 'TYPE', 'LONG_PRESS', 'PAUSE', 'FOCUS_CHANGE']
+
+def event_rows(session_id: str, count: int, start: datetime, seed: int, missing: float = 0.0):
+    """Event rows as the ingest path writes them, without ids; `missing` is the share of NULL measurements"""
+    rng = random.Random(seed)
+    ts, rows = start, []
+    for _ in range(count):
+        ts += timedelta(milliseconds=rng.randint(20, 300))
+        etype = rng.choice(ETYPES)
+        row = {
+            'ts': ts, 'session_id': session_id, 'user_hash': 'test_user', 'screen': 'ChatScreen',
+            'etype': etype, 'duration_ms': None, 'delta': None, 'velocity': None, 'accel': None,
+            'input_len': None, 'backspaces': None
+        }
+        if etype == 'SCROLL':
+            row.update(delta=rng.uniform(-200, 200), velocity=rng.uniform(0, 3000), accel=rng.uniform(-50, 50))
+        elif etype == 'TYPE':
+            row.update(input_len=rng.randint(0, 200), backspaces=1 if rng.random() < 0.05 else 0)
+        elif etype in ('PAUSE', 'LONG_PRESS'):
+            row.update(duration_ms=rng.randint(300, 5000))
+        for column in ('velocity', 'delta', 'input_len', 'duration_ms'):
+            if row[column] is not None and rng.random() < missing:
+                row[column] = None
+        rows.append(row)
+    return rows
+
+def store(rows):
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(DBEvent.__table__.insert(), rows)
+
+def assert_same_features(reference, online):
+    assert reference.keys() == online.keys()
+    for key, expected in reference.items():
+        if isinstance(expected, float) and math.isnan(expected):
+            assert math.isnan(online[key]), key
+        else:
+            assert math.isclose(online[key], expected, rel_tol=1e-9, abs_tol=1e-12), key
+
+@pytest.mark.parametrize("seed", range(6))
+def test_online_features_match_batch_extraction(seed):
+    session_id = f"online_parity_{seed}"
+    rng = random.Random(seed)
+    rows = event_rows(session_id, rng.randint(50, 600), datetime(2024, 2, 1), seed, missing=rng.choice([0.0, 0.2]))
+    # A late upload: older than everything else, so the session is rebuilt
+    late = event_rows(session_id, rng.randint(1, 20), datetime(2024, 1, 31), seed + 100)
+    # Sketches larger than any series here are exact, so every feature must match
+    online = OnlineFeatureExtractor(sketch_k=1024, commit_lag_seconds=0)
+    reference = FeatureExtractor(use_kernel=False, use_cache=False)
+    batches, i = [], 0
+    while i < len(rows):
+        size = rng.choice([1, 2, 7, 50, 200])
+        batches.append(rows[i:i + size])
+        i += size
+    batches.insert(rng.randint(1, len(batches)), late)
+    for batch in batches:
+        store(batch)
+        expected = convert_numpy_types(reference.extract_session_features(session_id))
+        assert_same_features(expected, online.session_features(session_id))
+    assert online.stats()['rebuilds'] >= 1
+
+def test_late_committed_lower_id_is_applied():
+    session_id = "online_commit_order"
+    rows = event_rows(session_id, 30, datetime(2024, 1, 1), seed=1)
+    # Ids are taken in insert order, but the transaction holding rows 10-19
+    # commits only after the later rows have been read
+    for i, row in enumerate(rows):
+        row['id'] = 1_000_000 + i
+    store(rows[:10] + rows[20:])
+    online = OnlineFeatureExtractor(commit_lag_seconds=60)
+    online.session_features(session_id)
+
+    store(rows[10:20])
+    assert online.session_features(session_id) == OnlineFeatureExtractor().session_features(session_id)
+    # The late rows are older than what was applied, so the session was rebuilt
+    assert online.stats()['rebuilds'] == 1
+
+def test_reread_events_are_not_applied_twice():
+    session_id = "online_reread"
+    rows = event_rows(session_id, 40, datetime(2024, 1, 2), seed=2)
+    online = OnlineFeatureExtractor(commit_lag_seconds=60)
+    for i in range(0, len(rows), 10):
+        store(rows[i:i + 10])
+        features = online.session_features(session_id)
+    assert features['total_events'] == len(rows)
+    assert features == OnlineFeatureExtractor().session_features(session_id)
+    assert online.stats()['events_reread'] == 10 + 20 + 30
+
+def test_settled_ids_are_not_reread():
+    session_id = "online_settled"
+    rows = event_rows(session_id, 20, datetime(2024, 1, 3), seed=3)
+    online = OnlineFeatureExtractor(commit_lag_seconds=0)
+    store(rows[:10])
+    online.session_features(session_id)
+    store(rows[10:])
+    assert online.session_features(session_id)['total_events'] == len(rows)
+    assert online.stats().get('events_reread', 0) == 0
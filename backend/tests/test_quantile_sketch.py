@@ -0,0 +1,96 @@
+import json
+import math
+
+import numpy as np
+import pytest
+
+from quantile_sketch import KLLSketch
+
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+MAX_RANK_ERROR = 0.02
+
+DISTRIBUTIONS = {
+    "velocity": lambda rng, n: rng.uniform(0, 3000, n),
+    "interval": lambda rng, n: rng.lognormal(-1.5, 1.0, n),
+    "pause": lambda rng, n: rng.integers(300, 5000, n).astype(float),
+}
+
+def rank_error(ordered: np.ndarray, value: float, q: float) -> float:
+    # Distance from q to the closest normalized rank the value could have (ties span a range)
+    low = np.searchsorted(ordered, value, side='left') / len(ordered)
+    high = np.searchsorted(ordered, value, side='right') / len(ordered)
+    return 0.0 if low <= q <= high else min(abs(q - low), abs(q - high))
+
+def sketch_of(values, k: int = 200) -> KLLSketch:
+    sketch = KLLSketch(k)
+    sketch.update(values)
+    return sketch
+
+def round_trip(sketch: KLLSketch) -> KLLSketch:
+    return KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+
+def assert_within_rank_error(sketch: KLLSketch, values: np.ndarray):
+    ordered = np.sort(values)
+    for q in QUANTILES:
+        assert rank_error(ordered, sketch.quantile(q), q) <= MAX_RANK_ERROR, q
+    assert sketch.min == ordered[0] and sketch.max == ordered[-1]
+
+def test_exact_up_to_k_values():
+    values = np.random.default_rng(1).lognormal(size=200)
+    sketch = KLLSketch(200)
+    for value in values:
+        sketch.add(value)
+    assert sketch.exact
+    for q in QUANTILES:
+        assert sketch.quantile(q) == np.quantile(values, q)
+    assert sketch.median() == np.median(values)
+    edges = np.quantile(values, [0.1, 0.5, 0.9])
+    np.testing.assert_array_equal(sketch.cdf(edges), [np.sum(values <= edge) for edge in edges])
+
+@pytest.mark.parametrize("distribution", sorted(DISTRIBUTIONS))
+@pytest.mark.parametrize("n", [1000, 100000])
+def test_rank_error_is_bounded(distribution, n):
+    values = DISTRIBUTIONS[distribution](np.random.default_rng(n), n)
+    streamed = KLLSketch(200)
+    for value in values[:5000]:
+        streamed.add(value)
+    streamed.update(values[5000:])
+    assert not streamed.exact and streamed.n == n
+    assert_within_rank_error(streamed, values)
+    assert_within_rank_error(sketch_of(values), values)
+
+@pytest.mark.parametrize("distribution", sorted(DISTRIBUTIONS))
+def test_merged_sketches_are_as_accurate_as_one(distribution):
+    values = DISTRIBUTIONS[distribution](np.random.default_rng(7), 50000)
+    merged = KLLSketch(200)
+    for part in np.array_split(values, 16):
+        merged.merge(round_trip(sketch_of(part)))
+    assert merged.n == len(values)
+    assert_within_rank_error(merged, values)
+
+def test_merging_small_sketches_stays_exact():
+    values = np.random.default_rng(3).uniform(size=150)
+    merged = sketch_of(values[:100]).merge(sketch_of(values[100:])).merge(KLLSketch(200))
+    assert merged.exact and merged.n == 150
+    assert merged.quantile(0.95) == np.quantile(values, 0.95)
+
+def test_round_trip_restores_an_equivalent_sketch():
+    rng = np.random.default_rng(5)
+    original = sketch_of(rng.uniform(0, 3000, 20000))
+    restored = round_trip(original)
+    assert restored.to_dict() == original.to_dict()
+    for q in QUANTILES:
+        assert restored.quantile(q) == original.quantile(q)
+    # Both keep compacting the same way afterwards
+    more = rng.uniform(0, 3000, 5000)
+    for sketch in (original, restored):
+        for value in more:
+            sketch.add(value)
+    assert restored.to_dict() == original.to_dict()
+
+def test_empty_sketch_round_trip():
+    restored = round_trip(KLLSketch(50))
+    assert restored.n == 0 and restored.k == 50
+    assert math.isnan(restored.quantile(0.5))
+    restored.add(2.0)
+    assert restored.median() == 2.0 and restored.min == restored.max == 2.0
@@ -0,0 +1,43 @@
+import random
+from datetime import datetime, timedelta
+
+from models import Base, DBEvent, DBFeatures, SessionLocal, engine
+
+def test_score_stores_the_same_features_as_the_pipeline(client):
+    from feature_extractor import online_extractor
+    from config import QUANTILE_SKETCH_K
+    session_id = "score_sketched"
+    rng = random.Random(1)
+    ts, rows = datetime.utcnow() - timedelta(hours=1), []
+    # More taps than the sketch holds, so its median is approximate
+    for _ in range(QUANTILE_SKETCH_K * 4):
+        ts += timedelta(milliseconds=rng.randint(20, 3000))
+        rows.append({'ts': ts, 'session_id': session_id, 'user_hash': 'test_user', 'screen': 'ChatScreen',
+                     'etype': 'TAP'})
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(DBEvent.__table__.insert(), rows)
+
+    response = client.get(f"/v1/score/{session_id}")
+    assert response.status_code == 200
+
+    db = SessionLocal()
+    try:
+        record = db.query(DBFeatures).filter(DBFeatures.session_id == session_id).one()
+    finally:
+        db.close()
+    assert record.sketches is not None
+    assert record.f == online_extractor.session_features(session_id)
+
+def test_mock_scores_report_no_model_version(client):
+    # No model is published in the test's working directory, so the mock scorer serves
+    rows = [{'ts': datetime.utcnow(), 'session_id': "score_mock", 'user_hash': 'test_user',
+             'screen': 'ChatScreen', 'etype': etype} for etype in ('TAP', 'SCROLL', 'TAP')]
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(DBEvent.__table__.insert(), rows)
+    for session_id in ("score_mock", "score_no_events"):
+        response = client.get(f"/v1/score/{session_id}")
+        assert response.status_code == 200
+        assert response.json()["model_version"] is None
+    assert client.get("/admin/model").json()["model_version"] is None
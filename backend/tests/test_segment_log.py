@@ -0,0 +1,131 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from segment_log import SegmentLog, read_records
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRANSIENT = (OperationalError, InterfaceError)
+
+def rows(batch: int, count: int = 3):
+    return [{'ts': datetime(2024, 1, 1, 0, 0, i), 'session_id': f"segment_{batch}", 'seq': i} for i in range(count)]
+
+def database_down():
+    return OperationalError("COPY events FROM STDIN", None, Exception("server closed the connection"))
+
+class Recorder:
+    """write_batch that stores batches, failing as told first"""
+
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})  # batch_id -> list of exceptions to raise in turn
+        self.batches = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, batch_id, batch_rows):
+        with self.lock:
+            pending = self.failures.get(batch_id)
+            if pending:
+                raise pending.pop(0) if isinstance(pending, list) else pending
+            self.batches[batch_id] = batch_rows
+
+def wait_until(condition, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+def make_log(directory, write_batch):
+    return SegmentLog(str(directory), write_batch, group_commit_ms=0, flush_interval_ms=50,
+                      transient_errors=TRANSIENT)
+
+def test_segments_of_a_killed_process_are_replayed(tmp_path):
+    # The child acks records but can never store them, then dies without stopping the log
+    child = subprocess.Popen([sys.executable, "-c", textwrap.dedent(f"""
+        import sys, time
+        sys.path.insert(0, {BACKEND!r})
+        from datetime import datetime
+        from sqlalchemy.exc import OperationalError
+        from segment_log import SegmentLog
+        def down(batch_id, rows):
+            raise OperationalError("COPY", None, Exception("down"))
+        log = SegmentLog({str(tmp_path)!r}, down, group_commit_ms=0, flush_interval_ms=50,
+                         transient_errors=(OperationalError,))
+        log.start()
+        for i in range(20):
+            log.wait_durable(log.append(f"crashed_{{i}}", [{{'ts': datetime(2024, 1, 1), 'session_id': 'crashed'}}]))
+        print("durable", flush=True)
+        time.sleep(60)
+    """)], stdout=subprocess.PIPE, text=True)
+    try:
+        assert child.stdout.readline().strip() == "durable"
+    finally:
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+
+    recorder = Recorder()
+    log = make_log(tmp_path, recorder)
+    log.start()
+    try:
+        assert wait_until(lambda: len(recorder.batches) == 20)
+    finally:
+        log.stop()
+    assert sorted(recorder.batches) == sorted(f"crashed_{i}" for i in range(20))
+    assert recorder.batches["crashed_0"][0]['ts'] == datetime(2024, 1, 1)
+    # The orphaned directory is gone, and so is the replaying process's own
+    assert os.listdir(tmp_path) == []
+
+def test_segments_of_a_live_process_are_left_alone(tmp_path):
+    stalled = make_log(tmp_path, Recorder({f"live_{i}": database_down() for i in range(5)}))
+    stalled.start()
+    try:
+        for i in range(5):
+            stalled.wait_durable(stalled.append(f"live_{i}", rows(i)))
+        recorder = Recorder()
+        other = make_log(tmp_path, recorder)
+        other.start()
+        try:
+            other.wait_durable(other.append("other", rows(99)))
+            assert wait_until(lambda: "other" in recorder.batches)
+            time.sleep(0.3)
+            assert list(recorder.batches) == ["other"]
+        finally:
+            other.stop()
+    finally:
+        # Still failing: its segments stay on disk for the next process
+        stalled.stop(timeout=0.5)
+
+    recorder = Recorder()
+    successor = make_log(tmp_path, recorder)
+    successor.start()
+    try:
+        assert wait_until(lambda: len(recorder.batches) == 5)
+    finally:
+        successor.stop()
+
+def test_transient_errors_are_retried_and_others_dead_lettered(tmp_path):
+    recorder = Recorder({
+        # More failures than a non-transient error is allowed, so only a retry stores it
+        "flaky": [database_down() for _ in range(3)],
+        "bad": ValueError("value out of range for column duration_ms"),
+    })
+    log = make_log(tmp_path, recorder)
+    log.start()
+    try:
+        for batch_id in ("flaky", "bad", "good"):
+            log.wait_durable(log.append(batch_id, rows(0)))
+        assert wait_until(lambda: "good" in recorder.batches)
+        stats = log.stats()
+    finally:
+        log.stop()
+
+    assert sorted(recorder.batches) == ["flaky", "good"]
+    assert stats['dead_lettered'] == 1 and stats['oldest_unflushed_age_seconds'] == 0.0
+    dead = [payload for _, payload in read_records(os.path.join(tmp_path, "dead-letter.seg"))]
+    assert len(dead) == 1 and b'"batch_id":"bad"' in dead[0]
@@ -0,0 +1,65 @@
+import struct
+import time
+import tracemalloc
+
+import pytest
+
+from wire_format import MAGIC, MAGIC_V1, decode_columnar_batch, encode_columnar_batch
+
+def events(count: int):
+    now = int(time.time() * 1000)
+    return [{
+        "ts": now + i,
+        "session_id": "wire_session",
+        "user_hash": "wire_user",
+        "screen": "ChatScreen",
+        "etype": "TYPE" if i % 2 else "SCROLL",
+        "component_id": "message-input" if i % 2 else None,
+        "velocity": None if i % 2 else 100.0 + i,
+        "input_len": i if i % 2 else None,
+        "seq": i + 1,
+        "meta": {"i": i} if i == 3 else None
+    } for i in range(count)]
+
+def test_round_trip_keeps_seq():
+    batch = events(10)
+    rows = decode_columnar_batch(encode_columnar_batch(batch))
+    assert [row["seq"] for row in rows] == [event["seq"] for event in batch]
+    assert [row["velocity"] for row in rows] == [event["velocity"] for event in batch]
+    assert [row["meta"] for row in rows] == [event["meta"] for event in batch]
+    assert all(row["ts"].microsecond // 1000 == event["ts"] % 1000 for row, event in zip(rows, batch))
+
+def test_missing_seq_decodes_as_none():
+    batch = events(4)
+    for event in batch:
+        del event["seq"]
+    assert [row["seq"] for row in decode_columnar_batch(encode_columnar_batch(batch))] == [None] * 4
+
+def test_version_1_payload_is_accepted_without_seq():
+    batch = events(4)
+    for event in batch:
+        del event["seq"]
+        event["meta"] = None
+    # Version 1 is version 2 without the seq column (the last numeric column, written as all-null)
+    payload = encode_columnar_batch(batch)
+    meta = struct.pack('<B', 0)
+    assert payload.endswith(struct.pack('<B', 0) + meta)
+    v1 = MAGIC_V1 + payload[4:-2] + meta
+    rows = decode_columnar_batch(v1)
+    assert len(rows) == 4 and all(row["seq"] is None for row in rows)
+
+def test_truncated_payload_is_rejected():
+    with pytest.raises(ValueError):
+        decode_columnar_batch(encode_columnar_batch(events(4))[:-3])
+
+def test_oversized_count_is_rejected_before_allocating():
+    # Header claiming 2^32 - 1 events, then all-null columns: 16 bytes of payload
+    payload = MAGIC + struct.pack('<IH', 2 ** 32 - 1, 0) + bytes(6)
+    tracemalloc.start()
+    try:
+        with pytest.raises(ValueError):
+            decode_columnar_batch(payload)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 1024 * 1024
@@ -0,0 +1,227 @@
+"""
+Compact columnar wire format for telemetry batches.
+
+A batch is encoded column by column instead of as a list of JSON objects, so
+shared strings (session_id, user_hash, screen...) are sent once and numeric
+fields are packed arrays. All integers are little-endian.
+
+    magic       4 bytes   b"TCB2" (b"TCB1": the same without the seq column)
+    count       u32       number of events
+    strings     u16 n, then n x (u16 length + utf-8 bytes)
+    string cols for each of STRING_COLUMNS:
+                u8 mode   0 = all null
+                          1 = constant, followed by one u16 string index
+                          2 = per event, followed by count x u16 (0xFFFF = null)
+    numeric cols for each of NUMERIC_COLUMNS:
+                u8 mode   0 = all null, 1 = count x dtype follows
+                          (null = NaN for floats, INT_NULL for ints)
+    meta        u8 mode   0 = absent, 1 = u32 length + JSON array of count objects
+"""
+
+import json
+import struct
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+MAGIC = b"TCB2"
+# Version 1 predates the seq column; still accepted, its events have no seq
+MAGIC_V1 = b"TCB1"
+CONTENT_TYPE = "application/x-telemetry-columnar"
+
+STRING_COLUMNS = ('session_id', 'user_hash', 'screen', 'component_id', 'etype', 'key_code')
+REQUIRED_STRING_COLUMNS = ('session_id', 'user_hash', 'screen', 'etype')
+
+NUMERIC_COLUMNS = (
+    ('ts', np.dtype('<i8')),
+    ('duration_ms', np.dtype('<i4')),
+    ('delta', np.dtype('<f8')),
+    ('velocity', np.dtype('<f8')),
+    ('accel', np.dtype('<f8')),
+    ('input_len', np.dtype('<i4')),
+    ('backspaces', np.dtype('<i4')),
+    ('seq', np.dtype('<i4')),  # per-session sequence number used for deduplication
+)
+
+INT_NULL = np.iinfo(np.int32).min
+STRING_NULL = 0xFFFF
+
+_MODE_NULL, _MODE_CONSTANT, _MODE_PER_EVENT = 0, 1, 2
+
+def encode_columnar_batch(events: List[Dict[str, Any]]) -> bytes:
+    """Encode a list of TelemetryEvent-shaped dicts into the columnar format"""
+    count = len(events)
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    string_sections = []
+    for column in STRING_COLUMNS:
+        values = [event.get(column) for event in events]
+        distinct = set(values)
+        if distinct <= {None}:
+            string_sections.append(struct.pack('<B', _MODE_NULL))
+        elif len(distinct) == 1:
+            string_sections.append(struct.pack('<BH', _MODE_CONSTANT, intern(values[0])))
+        else:
+            codes = np.array(
+                [STRING_NULL if value is None else intern(value) for value in values],
+                dtype='<u2'
+            )
+            string_sections.append(struct.pack('<B', _MODE_PER_EVENT) + codes.tobytes())
+
+    if len(strings) >= STRING_NULL:
+        raise ValueError("Too many distinct strings for one columnar batch")
+
+    numeric_sections = []
+    for column, dtype in NUMERIC_COLUMNS:
+        values = [event.get(column) for event in events]
+        if all(value is None for value in values):
+            numeric_sections.append(struct.pack('<B', _MODE_NULL))
+            continue
+        null = np.nan if dtype.kind == 'f' else INT_NULL
+        array = np.array([null if value is None else value for value in values], dtype=dtype)
+        numeric_sections.append(struct.pack('<B', _MODE_CONSTANT) + array.tobytes())
+
+    metas = [event.get('meta') for event in events]
+    if any(meta is not None for meta in metas):
+        payload = json.dumps(metas, separators=(',', ':')).encode('utf-8')
+        meta_section = struct.pack('<BI', _MODE_CONSTANT, len(payload)) + payload
+    else:
+        meta_section = struct.pack('<B', _MODE_NULL)
+
+    parts = [MAGIC, struct.pack('<IH', count, len(strings))]
+    for value in strings:
+        encoded = value.encode('utf-8')
+        parts.append(struct.pack('<H', len(encoded)) + encoded)
+    parts.extend(string_sections)
+    parts.extend(numeric_sections)
+    parts.append(meta_section)
+    return b''.join(parts)
+
+class _Reader:
+    """Bounds-checked cursor over the encoded payload"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        self._require(size)
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += size
+        return values
+
+    def take(self, size: int) -> bytes:
+        self._require(size)
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def array(self, dtype: np.dtype, count: int) -> np.ndarray:
+        self._require(dtype.itemsize * count)
+        array = np.frombuffer(self.data, dtype=dtype, count=count, offset=self.offset)
+        self.offset += dtype.itemsize * count
+        return array
+
+    def _require(self, size: int):
+        if self.offset + size > len(self.data):
+            raise ValueError("Truncated columnar batch")
+
+def decode_columnar_batch(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Decode a columnar batch straight into events-table row dicts
+    (the same shape event_writer.event_to_row produces).
+    Raises ValueError for malformed payloads.
+    """
+    reader = _Reader(data)
+    magic = reader.take(4)
+    if magic == MAGIC:
+        numeric_columns = NUMERIC_COLUMNS
+    elif magic == MAGIC_V1:
+        numeric_columns = tuple(column for column in NUMERIC_COLUMNS if column[0] != 'seq')
+    else:
+        raise ValueError("Not a columnar telemetry batch")
+
+    count, string_count = reader.unpack('<IH')
+    # ts is required, so every event takes at least its 8 bytes: reject an
+    # impossible count before building any count-sized column
+    if count * NUMERIC_COLUMNS[0][1].itemsize > len(data) - reader.offset:
+        raise ValueError("Truncated columnar batch")
+    strings = []
+    for _ in range(string_count):
+        (length,) = reader.unpack('<H')
+        strings.append(reader.take(length).decode('utf-8'))
+
+    columns: Dict[str, List[Any]] = {}
+    for column in STRING_COLUMNS:
+        (mode,) = reader.unpack('<B')
+        if mode == _MODE_NULL:
+            values = [None] * count
+        elif mode == _MODE_CONSTANT:
+            (code,) = reader.unpack('<H')
+            values = [_lookup(strings, code)] * count
+        elif mode == _MODE_PER_EVENT:
+            codes = reader.array(np.dtype('<u2'), count)
+            is_null = codes == STRING_NULL
+            if np.any(~is_null & (codes >= len(strings))):
+                raise ValueError("Invalid string index")
+            table = strings + [None]
+            values = [table[code] for code in np.where(is_null, len(strings), codes).tolist()]
+        else:
+            raise ValueError(f"Invalid mode for column {column}")
+        if column in REQUIRED_STRING_COLUMNS and any(value is None for value in values):
+            raise ValueError(f"Column {column} is required")
+        columns[column] = values
+
+    columns['seq'] = [None] * count
+    for column, dtype in numeric_columns:
+        (mode,) = reader.unpack('<B')
+        if mode == _MODE_NULL:
+            columns[column] = [None] * count
+            continue
+        if mode != _MODE_CONSTANT:
+            raise ValueError(f"Invalid mode for column {column}")
+        array = reader.array(dtype, count)
+        if dtype.kind == 'f':
+            values = array.astype(object)
+            values[np.isnan(array)] = None
+        else:
+            values = array.astype(object)
+            values[array == INT_NULL] = None
+        columns[column] = values.tolist()
+
+    if any(value is None for value in columns['ts']):
+        raise ValueError("Column ts is required")
+
+    (mode,) = reader.unpack('<B')
+    if mode == _MODE_CONSTANT:
+        (length,) = reader.unpack('<I')
+        metas = json.loads(reader.take(length).decode('utf-8'))
+        if not isinstance(metas, list) or len(metas) != count:
+            raise ValueError("Meta column length does not match event count")
+    elif mode == _MODE_NULL:
+        metas = [None] * count
+    else:
+        raise ValueError("Invalid mode for column meta")
+
+    if reader.offset != len(data):
+        raise ValueError("Trailing bytes after columnar batch")
+
+    columns['ts'] = [datetime.fromtimestamp(ts / 1000) for ts in columns['ts']]
+    columns['meta'] = metas
+
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+def _lookup(strings: List[str], code: int) -> str:
+    if code >= len(strings):
+        raise ValueError("Invalid string index")
+    return strings[code]